@@ -176,6 +176,9 @@ def restaurar_backup(archivo_backup):
             )
         print(f"  ✓ {len(datos.get('movimientos', []))} movimientos restaurados")
         
+        from core.resumenes import reconstruir_resumenes
+        reconstruir_resumenes()
+        
         # Restaurar alertas
         print("⚠️  Restaurando alertas...")
         for a_data in datos.get('alertas', []):
@@ -224,15 +224,78 @@ REST_FRAMEWORK = {
 }
 
 # Configuración de caché para mejorar performance
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'inventario-cache',
+# Con varios workers de gunicorn el caché debe ser compartido para que todos vean
+# las mismas métricas y las invalidaciones (core/invalidacion.py) lleguen a todos.
+# Valores: memoria (por proceso, desarrollo), redis (Redis/Valkey/KeyDB),
+# archivo (directorio local), sqlite (archivo SQLite local)
+CACHE_BACKEND = config('CACHE_BACKEND', default='memoria')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('CACHE_URL', default='redis://127.0.0.1:6379/1'),
+            'KEY_PREFIX': 'inventario',
+        }
+    }
+elif CACHE_BACKEND == 'archivo':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / 'cache')),
+            'KEY_PREFIX': 'inventario',
+            'OPTIONS': {
+                'MAX_ENTRIES': 1000
+            }
+        }
+    }
+elif CACHE_BACKEND == 'sqlite':
+    # Tabla de caché en una base SQLite propia, separada de la base principal
+    # Crear con: python manage.py createcachetable --database cache
+    DATABASES['cache'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': config('CACHE_SQLITE', default=str(BASE_DIR / 'cache.sqlite3')),
         'OPTIONS': {
-            'MAX_ENTRIES': 1000
+            'timeout': 5,
         }
     }
-}
+    DATABASE_ROUTERS = ['core.routers.RouterCache']
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_inventario',
+            'KEY_PREFIX': 'inventario',
+            'OPTIONS': {
+                'MAX_ENTRIES': 1000
+            }
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'inventario-cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 1000
+            }
+        }
+    }
+
+# Métricas del daemon de sondeo (poll_devices --daemon) para /api/metricas/: además del
+# caché se publican en este archivo, visible para los workers web del mismo host aunque
+# el caché sea por proceso (CACHE_BACKEND=memoria)
+SONDEO_METRICAS_ARCHIVO = config('SONDEO_METRICAS_ARCHIVO', default=str(BASE_DIR / 'logs' / 'sondeo_metricas.json'))
+
+# Tareas en segundo plano (core/tareas.py): importaciones y exportaciones grandes.
+# Por defecto las ejecuta el comando `python manage.py procesar_tareas` en procesos
+# aparte; con TAREAS_EN_PROCESO=True las ejecuta un pool de hilos del propio servidor.
+TAREAS_EN_PROCESO = config('TAREAS_EN_PROCESO', default=False, cast=bool)
+TAREAS_HILOS = config('TAREAS_HILOS', default=2, cast=int)
+
+# Libro de stock (core/libro_stock.py): con LIBRO_STOCK_ESTRICTO=True los movimientos son
+# de solo inserción (la API no los edita ni elimina) y todo cambio de stock se registra
+# como movimiento, de modo que el stock siempre se puede derivar del libro.
+LIBRO_STOCK_ESTRICTO = config('LIBRO_STOCK_ESTRICTO', default=False, cast=bool)
 
 # Configuración de logging
 LOGGING = {
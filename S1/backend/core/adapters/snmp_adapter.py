@@ -1,7 +1,19 @@
 """
 SNMP adapter para leer niveles de consumibles desde impresoras usando pysnmp.
-Función principal: read_supply(device, index=1) -> (value, max_value) o None si falla.
+Funciones principales:
+- read_supply(device, index=1) -> (value, max_value) o None si falla.
+- read_all_supplies(device) -> lista de consumibles (índice, descripción, nivel, capacidad)
+  obtenida con un solo recorrido GETBULK de prtMarkerSuppliesTable, o None si falla.
+
+Las consultas pasan por un `AdaptadorSnmp` compartido por el proceso, que reutiliza
+el SnmpEngine y cachea los objetos CommunityData/UdpTransportTarget por dispositivo,
+de modo que el costo de cada lectura sea el viaje de red y no la inicialización.
 """
+import os
+import threading
+import time
+from collections import deque
+
 from pysnmp.hlapi import (
     SnmpEngine,
     CommunityData,
@@ -10,41 +22,222 @@ from pysnmp.hlapi import (
     ObjectType,
     ObjectIdentity,
     getCmd,
+    bulkCmd,
+    nextCmd,
 )
 
+# Columnas de prtMarkerSuppliesTable (Printer-MIB, RFC 3805)
+OID_SUMINISTROS_DESCRIPCION = '1.3.6.1.2.1.43.11.1.1.6'
+OID_SUMINISTROS_CAPACIDAD = '1.3.6.1.2.1.43.11.1.1.8'
+OID_SUMINISTROS_NIVEL = '1.3.6.1.2.1.43.11.1.1.9'
+
+# Filas pedidas por GETBULK: cubre impresoras color (4-8 consumibles) en un solo viaje
+MAX_REPETICIONES = 16
+
+
+class AdaptadorSnmp:
+    """
+    Cliente SNMP reutilizable con caché de motor, credenciales y destinos
+
+    - SnmpEngine: uno por hilo del proceso (pysnmp no es thread-safe y el poller
+      consulta desde un pool de hilos), creado una sola vez y reutilizado
+    - CommunityData: cacheado por (ip, comunidad, versión)
+    - UdpTransportTarget: cacheado por (ip, timeout, reintentos)
+    - Latencia: se registra cada consulta para exponer estadísticas p50/p95/máx
+    """
+
+    def __init__(self, max_muestras=1000):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._comunidades = {}
+        self._transportes = {}
+        self._latencias = deque(maxlen=max_muestras)
+        self._consultas = 0
+        self._errores = 0
+        self._motores_creados = 0
+
+    def _motor(self):
+        """Retorna el SnmpEngine del hilo actual, creándolo la primera vez"""
+        motor = getattr(self._local, 'motor', None)
+        if motor is None:
+            motor = SnmpEngine()
+            self._local.motor = motor
+            with self._lock:
+                self._motores_creados += 1
+        return motor
+
+    def _comunidad(self, device):
+        community = device.comunidad_snmp or 'public'
+        version = str(device.version_snmp or '2c').strip()
+        clave = (str(device.ip), community, version)
+        with self._lock:
+            datos = self._comunidades.get(clave)
+            if datos is None:
+                mp_model = 0 if version == '1' else 1  # 0 -> SNMPv1, 1 -> SNMPv2c
+                datos = CommunityData(community, mpModel=mp_model)
+                self._comunidades[clave] = datos
+        return datos
+
+    def _transporte(self, ip, timeout, retries):
+        clave = (str(ip), timeout, retries)
+        with self._lock:
+            destino = self._transportes.get(clave)
+            if destino is None:
+                destino = UdpTransportTarget((str(ip), 161), timeout=timeout, retries=retries)
+                self._transportes[clave] = destino
+        return destino
+
+    def _registrar(self, inicio, exito):
+        latencia = time.perf_counter() - inicio
+        with self._lock:
+            self._consultas += 1
+            self._latencias.append(latencia)
+            if not exito:
+                self._errores += 1
+
+    def get(self, device, oids, timeout=2, retries=1):
+        """
+        Ejecuta un GET SNMP sobre una lista de OIDs
+
+        Returns:
+            Lista de valores enteros en el mismo orden de `oids`, o None si falla
+        """
+        inicio = time.perf_counter()
+        try:
+            iterator = getCmd(
+                self._motor(),
+                self._comunidad(device),
+                self._transporte(device.ip, timeout, retries),
+                ContextData(),
+                *[ObjectType(ObjectIdentity(oid)) for oid in oids],
+            )
+            errorIndication, errorStatus, errorIndex, varBinds = next(iterator)
+            if errorIndication or errorStatus:
+                self._registrar(inicio, False)
+                return None
+
+            # varBinds contiene tuplas (ObjectIdentity, value)
+            valores = [int(x[1]) for x in varBinds]
+            self._registrar(inicio, True)
+            return valores
+        except Exception:
+            self._registrar(inicio, False)
+            return None
+
+    def read_supply(self, device, index=1, timeout=2, retries=1):
+        """Lee prtMarkerSuppliesLevel y prtMarkerSuppliesMaxCapacity para un índice dado"""
+        # OIDs estándar (Printer-MIB): columna.hrDeviceIndex.prtMarkerSuppliesIndex
+        oid_supply = f'{OID_SUMINISTROS_NIVEL}.1.{index}'
+        oid_max = f'{OID_SUMINISTROS_CAPACIDAD}.1.{index}'
+
+        values = self.get(device, [oid_supply, oid_max], timeout=timeout, retries=retries)
+        if values and len(values) >= 2:
+            return values[0], values[1]
+        return None
+
+    def read_all_supplies(self, device, timeout=2, retries=1, max_repeticiones=MAX_REPETICIONES):
+        """
+        Lee todos los consumibles de la impresora recorriendo prtMarkerSuppliesTable
+
+        Usa GETBULK (SNMPv2c) para traer descripción, capacidad y nivel de hasta
+        `max_repeticiones` consumibles por viaje; en SNMPv1 recurre a GETNEXT.
+
+        Returns:
+            Lista de dicts con `indice`, `descripcion`, `nivel` y `capacidad`,
+            ordenada por índice, o None si la consulta falla
+        """
+        columnas = [
+            ObjectType(ObjectIdentity(OID_SUMINISTROS_DESCRIPCION)),
+            ObjectType(ObjectIdentity(OID_SUMINISTROS_CAPACIDAD)),
+            ObjectType(ObjectIdentity(OID_SUMINISTROS_NIVEL)),
+        ]
+        comunidad = self._comunidad(device)
+        inicio = time.perf_counter()
+        try:
+            if comunidad.mpModel == 0:
+                iterator = nextCmd(
+                    self._motor(), comunidad, self._transporte(device.ip, timeout, retries), ContextData(),
+                    *columnas, lexicographicMode=False,
+                )
+            else:
+                iterator = bulkCmd(
+                    self._motor(), comunidad, self._transporte(device.ip, timeout, retries), ContextData(),
+                    0, max_repeticiones, *columnas, lexicographicMode=False,
+                )
+
+            suministros = []
+            for errorIndication, errorStatus, errorIndex, varBinds in iterator:
+                if errorIndication or errorStatus:
+                    self._registrar(inicio, False)
+                    return None
+                descripcion, capacidad, nivel = varBinds
+                suministros.append({
+                    # El último sub-identificador es prtMarkerSuppliesIndex
+                    'indice': int(tuple(nivel[0])[-1]),
+                    'descripcion': str(descripcion[1]),
+                    'nivel': int(nivel[1]),
+                    'capacidad': int(capacidad[1]),
+                })
+            self._registrar(inicio, True)
+            return sorted(suministros, key=lambda s: s['indice'])
+        except Exception:
+            self._registrar(inicio, False)
+            return None
+
+    def estadisticas(self):
+        """Resumen de latencias de las últimas consultas (en milisegundos)"""
+        with self._lock:
+            muestras = sorted(self._latencias)
+            consultas = self._consultas
+            errores = self._errores
+            motores = self._motores_creados
+
+        def percentil(p):
+            if not muestras:
+                return 0
+            return round(muestras[min(len(muestras) - 1, int(len(muestras) * p))] * 1000, 2)
+
+        return {
+            'consultas': consultas,
+            'errores': errores,
+            'motores': motores,
+            'latencia_ms': {
+                'p50': percentil(0.50),
+                'p95': percentil(0.95),
+                'max': round(muestras[-1] * 1000, 2) if muestras else 0,
+                'promedio': round(sum(muestras) / len(muestras) * 1000, 2) if muestras else 0,
+            }
+        }
+
+
+_adaptador = None
+_adaptador_pid = None
+_adaptador_lock = threading.Lock()
+
+
+def obtener_adaptador():
+    """Retorna el adaptador compartido del proceso (se recrea tras un fork)"""
+    global _adaptador, _adaptador_pid
+    with _adaptador_lock:
+        if _adaptador is None or _adaptador_pid != os.getpid():
+            _adaptador = AdaptadorSnmp()
+            _adaptador_pid = os.getpid()
+        return _adaptador
+
 
 def read_supply(device, index=1, timeout=2, retries=1):
     """Lee prtMarkerSupplies y prtMarkerSuppliesMaxCapacity para un índice dado.
 
-    device: instancia del modelo Device con campos `ip`, `snmp_community`, `snmp_version`.
+    device: instancia del modelo Device con campos `ip`, `comunidad_snmp`, `version_snmp`.
     index: índice del supply en la impresora (1..n)
     Retorna tupla (value, max_value) como enteros o None en caso de error.
     """
-    # OIDs estándar (Printer-MIB)
-    oid_supply = f'1.3.6.1.2.1.43.11.1.1.6.{index}'
-    oid_max = f'1.3.6.1.2.1.43.11.1.1.8.{index}'
-
-    community = device.snmp_community or 'public'
-    try:
-        iterator = getCmd(
-            SnmpEngine(),
-            CommunityData(community, mpModel=1),  # mpModel=1 -> SNMPv2c; for v1 use 0
-            UdpTransportTarget((str(device.ip), 161), timeout=timeout, retries=retries),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid_supply)),
-            ObjectType(ObjectIdentity(oid_max)),
-        )
-
-        errorIndication, errorStatus, errorIndex, varBinds = next(iterator)
-        if errorIndication:
-            return None
-        if errorStatus:
-            return None
+    return obtener_adaptador().read_supply(device, index=index, timeout=timeout, retries=retries)
 
-        # varBinds contiene tuplas (ObjectIdentity, value)
-        values = [int(x[1]) for x in varBinds]
-        if len(values) >= 2:
-            return values[0], values[1]
-        return None
-    except Exception:
-        return None
+
+def read_all_supplies(device, timeout=2, retries=1):
+    """Lee todos los consumibles de la impresora en un recorrido GETBULK.
+
+    Retorna lista de dicts {indice, descripcion, nivel, capacidad} o None en caso de error.
+    """
+    return obtener_adaptador().read_all_supplies(device, timeout=timeout, retries=retries)
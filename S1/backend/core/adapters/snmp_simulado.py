@@ -0,0 +1,73 @@
+"""
+Agente SNMP simulado para pruebas y benchmarks del poller.
+Reproduce la interfaz de `snmp_adapter.read_supply` y `read_all_supplies` sin tráfico
+de red: cada IP responde con niveles configurables tras una latencia fija, y las IPs
+marcadas como caídas consumen el timeout completo antes de fallar, igual que una
+impresora apagada.
+"""
+import threading
+import time
+
+
+class AgenteSnmpSimulado:
+    """
+    Flota de impresoras falsas indexada por IP
+
+    Example:
+        >>> agente = AgenteSnmpSimulado(latencia=0.01, caidos={'10.0.0.5'})
+        >>> agente.fijar_nivel('10.0.0.1', 40, 100)
+        >>> agente.read_supply(device)
+        (40, 100)
+    """
+
+    def __init__(self, latencia=0.01, caidos=None, nivel_por_defecto=(100, 100)):
+        self.latencia = latencia
+        self.caidos = set(caidos or ())
+        self.nivel_por_defecto = nivel_por_defecto
+        self.niveles = {}
+        self.suministros = {}
+        self.consultas = 0
+        self._lock = threading.Lock()
+
+    def fijar_nivel(self, ip, valor, maximo=100):
+        """Define el nivel que reportará la impresora con la IP dada"""
+        self.niveles[str(ip)] = (valor, maximo)
+
+    def fijar_suministros(self, ip, suministros):
+        """Define la tabla completa de consumibles: lista de (descripcion, nivel, capacidad)"""
+        self.suministros[str(ip)] = [
+            {'indice': i, 'descripcion': descripcion, 'nivel': nivel, 'capacidad': capacidad}
+            for i, (descripcion, nivel, capacidad) in enumerate(suministros, start=1)
+        ]
+
+    def _responder(self, ip, timeout, retries):
+        """Simula el viaje de red; retorna False si la impresora no responde"""
+        with self._lock:
+            self.consultas += 1
+
+        if ip in self.caidos:
+            time.sleep(timeout * (retries + 1))
+            return False
+
+        time.sleep(self.latencia)
+        return True
+
+    def read_all_supplies(self, device, timeout=2, retries=1):
+        """Misma firma y semántica de retorno que `snmp_adapter.read_all_supplies`"""
+        ip = str(device.ip)
+        if not self._responder(ip, timeout, retries):
+            return None
+        if ip in self.suministros:
+            return [dict(s) for s in self.suministros[ip]]
+        valor, maximo = self.niveles.get(ip, self.nivel_por_defecto)
+        return [{'indice': 1, 'descripcion': 'Black Toner', 'nivel': valor, 'capacidad': maximo}]
+
+    def read_supply(self, device, index=1, timeout=2, retries=1):
+        """Misma firma y semántica de retorno que `snmp_adapter.read_supply`"""
+        ip = str(device.ip)
+        if not self._responder(ip, timeout, retries):
+            return None
+        if ip in self.suministros:
+            suministro = next((s for s in self.suministros[ip] if s['indice'] == index), None)
+            return (suministro['nivel'], suministro['capacidad']) if suministro else None
+        return self.niveles.get(ip, self.nivel_por_defecto)
@@ -0,0 +1,53 @@
+"""
+Sondeo concurrente de dispositivos.
+Ejecuta las lecturas (SNMP u otro protocolo) en un pool acotado de hilos para que
+un dispositivo lento o apagado no detenga el barrido completo.
+
+Las lecturas no tocan la base de datos: los resultados se entregan al hilo que
+llama a medida que terminan, y es ese hilo el que aplica los cambios en la BD.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+CONCURRENCIA_POR_DEFECTO = 16
+PLAZO_POR_DEFECTO = 5.0
+
+
+def _leer_con_plazo(lector, device, plazo):
+    """Ejecuta una lectura y la descarta si excede el plazo asignado al host"""
+    inicio = time.monotonic()
+    try:
+        resultado = lector(device, plazo)
+    except Exception:
+        return None
+    if time.monotonic() - inicio > plazo:
+        return None
+    return resultado
+
+
+def leer_en_paralelo(dispositivos, lector, concurrencia=CONCURRENCIA_POR_DEFECTO, plazo=PLAZO_POR_DEFECTO):
+    """
+    Lee un conjunto de dispositivos en paralelo y entrega los resultados según terminan.
+
+    Args:
+        dispositivos: Iterable de instancias Device
+        lector: Callable (device, plazo) -> lectura o None. Debe respetar el plazo
+            (por ejemplo, ajustando timeout/retries de SNMP)
+        concurrencia: Número máximo de lecturas simultáneas
+        plazo: Segundos máximos por dispositivo; lecturas más lentas cuentan como fallidas
+
+    Yields:
+        Tuplas (device, resultado) en orden de finalización
+    """
+    dispositivos = list(dispositivos)
+    if not dispositivos:
+        return
+
+    concurrencia = max(1, min(int(concurrencia), len(dispositivos)))
+    with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='sondeo') as pool:
+        futuros = {
+            pool.submit(_leer_con_plazo, lector, device, plazo): device
+            for device in dispositivos
+        }
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
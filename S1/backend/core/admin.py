@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import Producto, Movimiento, Alerta
-from .models import Device
+from .models import Device, SuministroDispositivo, Tarea
 
 
 @admin.register(Producto)
@@ -52,9 +52,26 @@ class AlertaAdmin(admin.ModelAdmin):
     estado_alerta.short_description = 'Estado'
 
 
+class SuministroDispositivoInline(admin.TabularInline):
+    model = SuministroDispositivo
+    extra = 0
+    fields = ['indice', 'descripcion', 'nivel', 'capacidad_maxima', 'producto', 'ultima_lectura']
+    readonly_fields = ['indice', 'descripcion', 'nivel', 'capacidad_maxima', 'ultima_lectura']
+
+
 @admin.register(Device)
 class DeviceAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'ip', 'marca', 'modelo', 'producto', 'activo', 'ultima_lectura']
+    list_display = ['nombre', 'ip', 'marca', 'modelo', 'producto', 'activo', 'intervalo_sondeo', 'ultima_lectura']
     list_filter = ['marca', 'activo']
     search_fields = ['nombre', 'ip', 'producto__nombre']
     ordering = ['-ultima_lectura']
+    inlines = [SuministroDispositivoInline]
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'estado', 'progreso', 'usuario', 'intentos', 'fecha_creacion', 'fecha_fin']
+    list_filter = ['tipo', 'estado']
+    search_fields = ['usuario', 'error']
+    ordering = ['-fecha_creacion']
+    readonly_fields = ['fecha_creacion', 'fecha_inicio', 'fecha_fin', 'latido', 'worker']
@@ -0,0 +1,94 @@
+"""
+Evaluación de alertas de stock por conjuntos.
+
+Una alerta está activa cuando el stock del producto es menor que su umbral. En lugar de
+leer cada alerta y guardarla por separado, el estado se corrige con un UPDATE
+condicional que solo toca las alertas cuyo estado cambia:
+
+    UPDATE core_alerta SET activa = (umbral > stock)
+    WHERE producto_id IN (...) AND activa <> (umbral > stock)
+
+- `evaluar_alertas_producto`: un producto con su stock ya conocido (camino de cada
+  movimiento, dentro del bloqueo de la fila)
+- `reevaluar_alertas`: cualquier conjunto de productos (o todos) en una sentencia, con
+  el stock leído de la propia tabla de productos; para lotes, importaciones y
+  reconciliaciones
+
+Los productos sin alertas reciben una por defecto (umbral UMBRAL_POR_DEFECTO) la primera
+vez que se evalúan, como hacía `Producto._verificar_alertas`.
+"""
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Subquery, Value, When
+from .invalidacion import emitir
+from .models import Alerta, Producto
+
+UMBRAL_POR_DEFECTO = 10
+
+
+def _activa_si(stock):
+    """Expresión booleana `umbral > stock` para el SET del UPDATE"""
+    return Case(When(umbral__gt=stock, then=Value(True)), default=Value(False), output_field=BooleanField())
+
+
+def _cambian(stock):
+    """Alertas cuyo estado actual no coincide con `umbral > stock`"""
+    return Q(activa=True, umbral__lte=stock) | Q(activa=False, umbral__gt=stock)
+
+
+def _crear_por_defecto(productos):
+    """Crea la alerta por defecto de los productos (id, stock) dados; retorna cuántas quedan activas"""
+    nuevas = [
+        Alerta(producto_id=producto_id, umbral=UMBRAL_POR_DEFECTO, activa=stock < UMBRAL_POR_DEFECTO)
+        for producto_id, stock in productos
+    ]
+    Alerta.objects.bulk_create(nuevas)
+    return sum(1 for alerta in nuevas if alerta.activa)
+
+
+def evaluar_alertas_producto(producto):
+    """
+    Ajusta las alertas de `producto` a su stock actual (`producto.stock`)
+
+    Una sola sentencia cuando alguna alerta cambia; si ninguna cambió se comprueba que
+    el producto tenga alertas para crear la de por defecto.
+
+    Returns:
+        Cantidad de alertas que cambiaron de estado (incluida la creada)
+    """
+    cambiaron = Alerta.objects.filter(_cambian(producto.stock), producto_id=producto.pk).update(
+        activa=_activa_si(producto.stock)
+    )
+    if not cambiaron and not Alerta.objects.filter(producto_id=producto.pk).exists():
+        cambiaron = _crear_por_defecto([(producto.pk, producto.stock)])
+    if cambiaron:
+        emitir('alertas')
+    return cambiaron
+
+
+def reevaluar_alertas(producto_ids=None, crear_faltantes=True):
+    """
+    Ajusta en una sentencia las alertas de `producto_ids` (todas si es None) al stock
+    guardado de cada producto
+
+    Args:
+        crear_faltantes: Crea la alerta por defecto de los productos que no tienen
+
+    Returns:
+        Cantidad de alertas que cambiaron de estado (incluidas las creadas)
+    """
+    if producto_ids is not None and not producto_ids:
+        return 0
+    stock = Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('stock')[:1])
+    alertas = Alerta.objects.all()
+    if producto_ids is not None:
+        alertas = alertas.filter(producto_id__in=producto_ids)
+    cambiaron = alertas.filter(_cambian(stock)).update(activa=_activa_si(stock))
+
+    if crear_faltantes:
+        sin_alertas = Producto.objects.exclude(Exists(Alerta.objects.filter(producto=OuterRef('pk'))))
+        if producto_ids is not None:
+            sin_alertas = sin_alertas.filter(pk__in=producto_ids)
+        cambiaron += _crear_por_defecto(sin_alertas.values_list('pk', 'stock'))
+
+    if cambiaron:
+        emitir('alertas')
+    return cambiaron
@@ -0,0 +1,169 @@
+"""
+Búsqueda de texto de productos con índice y orden por relevancia.
+
+Cada motor usa el índice que crea la migración 0014_busqueda_productos:
+- PostgreSQL: índice GIN sobre el tsvector ponderado de nombre/modelo (A), marca (B),
+  categoría (C) y descripción (D), más índices de trigramas (pg_trgm) sobre nombre,
+  marca y modelo para coincidencias parciales en códigos ("26X" encuentra "CF226X").
+  Relevancia: ts_rank + similitud de trigramas con el nombre
+- SQLite (desarrollo): tabla FTS5 de contenido externo sincronizada con triggers sobre
+  core_producto. Relevancia: bm25 con los mismos pesos por columna
+- Sin índice disponible: LIKE sobre los campos de búsqueda (comportamiento anterior)
+
+Los índices se mantienen en la propia base de datos (índice de expresión en PostgreSQL,
+triggers en SQLite), así que cualquier escritura de productos —API, admin, importación
+masiva o ORM directo— queda reflejada sin pasos adicionales. Todas las palabras de la
+búsqueda deben aparecer y la última puede estar incompleta (prefijo).
+"""
+import logging
+import operator
+import re
+from functools import reduce
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+logger = logging.getLogger(__name__)
+
+MAX_PALABRAS = 10
+CAMPOS_BUSQUEDA = ['nombre', 'marca', 'modelo', 'descripcion', 'categoria']
+
+# Debe coincidir exactamente con la expresión del índice GIN de la migración
+VECTOR_PG = (
+    "setweight(to_tsvector('spanish'::regconfig, nombre::text), 'A') || "
+    "setweight(to_tsvector('spanish'::regconfig, modelo::text), 'A') || "
+    "setweight(to_tsvector('spanish'::regconfig, marca::text), 'B') || "
+    "setweight(to_tsvector('spanish'::regconfig, categoria::text), 'C') || "
+    "setweight(to_tsvector('spanish'::regconfig, descripcion), 'D')"
+)
+COLUMNAS_TRIGRAMA = ('nombre', 'marca', 'modelo')
+TABLA_FTS = 'core_producto_fts'
+TRIGGERS_FTS = ('core_producto_fts_ai', 'core_producto_fts_ad', 'core_producto_fts_au')
+PESOS_FTS = '10.0, 4.0, 10.0, 2.0, 1.0'  # nombre, marca, modelo, categoria, descripcion
+
+_motores = {}
+
+
+def palabras(texto):
+    """Palabras de la búsqueda sin signos (la sintaxis de tsquery/FTS5 no llega al motor)"""
+    return re.findall(r'\w+', texto.lower())[:MAX_PALABRAS]
+
+
+def motor(using='default'):
+    """
+    Índice de búsqueda disponible en la conexión (se consulta una vez por proceso)
+
+    Returns:
+        'postgresql', 'postgresql_trgm', 'fts5' o None si no hay índice
+    """
+    if using not in _motores:
+        _motores[using] = _detectar_motor(connections[using])
+    return _motores[using]
+
+
+def _detectar_motor(conexion):
+    try:
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'postgresql':
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                return 'postgresql_trgm' if cursor.fetchone() else 'postgresql'
+            if conexion.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = 'core_producto')",
+                    [TABLA_FTS]
+                )
+                existentes = {fila[0] for fila in cursor.fetchall()}
+                if TABLA_FTS not in existentes:
+                    return None
+                if not set(TRIGGERS_FTS) <= existentes:
+                    # Una migración que reconstruye core_producto en SQLite borra sus triggers
+                    logger.warning("Índice FTS5 de productos sin triggers de sincronización: se usa LIKE")
+                    return None
+                return 'fts5'
+    except Exception as e:
+        logger.warning(f"No se pudo detectar el índice de búsqueda: {str(e)}")
+    return None
+
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _buscar_postgresql(queryset, terminos, texto, trigramas):
+    consulta = ' & '.join(f'{termino}:*' for termino in terminos)
+    condicion = f"({VECTOR_PG}) @@ to_tsquery('spanish'::regconfig, %s)"
+    params = [consulta]
+    relevancia = f"ts_rank({VECTOR_PG}, to_tsquery('spanish'::regconfig, %s))"
+    params_relevancia = [consulta]
+    if trigramas:
+        # UPPER(columna) LIKE UPPER(patrón) es la forma de icontains y usa los índices gin_trgm_ops
+        patron = f'%{_escapar_like(texto)}%'
+        for columna in COLUMNAS_TRIGRAMA:
+            condicion += f' OR UPPER({columna}::text) LIKE UPPER(%s)'
+            params.append(patron)
+        relevancia += ' + similarity(UPPER(nombre::text), UPPER(%s))'
+        params_relevancia.append(texto)
+    return queryset.filter(RawSQL(f'({condicion})', params, output_field=BooleanField())).annotate(
+        relevancia=RawSQL(relevancia, params_relevancia, output_field=FloatField())
+    )
+
+
+def _buscar_fts5(queryset, terminos):
+    consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+    tabla = queryset.model._meta.db_table
+    condicion = f'"{tabla}"."id" IN (SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s)'
+    # bm25 es menor mientras más relevante: se invierte para ordenar de mayor a menor
+    relevancia = (
+        f'(SELECT -bm25({TABLA_FTS}, {PESOS_FTS}) FROM {TABLA_FTS} '
+        f'WHERE {TABLA_FTS} MATCH %s AND rowid = "{tabla}"."id")'
+    )
+    return queryset.filter(RawSQL(condicion, [consulta], output_field=BooleanField())).annotate(
+        relevancia=RawSQL(relevancia, [consulta], output_field=FloatField())
+    )
+
+
+def _buscar_like(queryset, terminos, campos):
+    for termino in terminos:
+        queryset = queryset.filter(reduce(operator.or_, (Q(**{f'{campo}__icontains': termino}) for campo in campos)))
+    return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+def buscar_productos(queryset, texto, campos=None):
+    """
+    Filtra `queryset` (de Producto) por el texto buscado y anota `relevancia`
+
+    Args:
+        campos: Campos para el LIKE cuando no hay índice (por defecto CAMPOS_BUSQUEDA)
+
+    Returns:
+        QuerySet filtrado con la anotación `relevancia` (mayor es más relevante); sin
+        ordenar por ella para que el llamador decida el orden
+    """
+    terminos = palabras(texto)
+    if not terminos:
+        return queryset
+    indice = motor(queryset.db)
+    if indice == 'fts5':
+        return _buscar_fts5(queryset, terminos)
+    if indice in ('postgresql', 'postgresql_trgm'):
+        return _buscar_postgresql(queryset, terminos, texto.strip(), indice == 'postgresql_trgm')
+    return _buscar_like(queryset, terminos, campos or CAMPOS_BUSQUEDA)
+
+
+class BusquedaProductosFilter(BaseFilterBackend):
+    """
+    Reemplazo de SearchFilter para productos (mismo parámetro `search`) que usa el índice
+    de texto. Sin `ordering` explícito ordena por relevancia; debe ir después de
+    OrderingFilter en `filter_backends` para poder reemplazar el orden por defecto.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.search_param, '')
+        if not palabras(texto):
+            return queryset
+        queryset = buscar_productos(queryset, texto, getattr(view, 'search_fields', None))
+        if not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-relevancia', '-fecha_creacion', '-id')
+        return queryset
@@ -0,0 +1,129 @@
+"""
+Caché protegido contra estampidas para endpoints costosos.
+
+`obtener_o_calcular` combina tres técnicas sobre el backend de caché configurado:
+- Single-flight: un candado (`cache.add`) garantiza que solo un worker recalcula
+  cada clave a la vez; el resto no golpea la base de datos
+- Recálculo anticipado probabilístico (XFetch): antes de vencer, cada lectura tiene
+  una probabilidad creciente de recalcular, proporcional a lo que tarda el cálculo,
+  para que la expiración no sorprenda a todos los workers a la vez
+- Stale-while-revalidate: vencido el TTL la entrada se conserva `gracia` segundos
+  más y se sirve mientras otro worker la recalcula
+
+Las invalidaciones por escritura (core/invalidacion.py) eliminan la entrada y su
+generación. Cada recálculo lee la generación antes de `calcular()` y solo guarda si
+sigue siendo la misma, de modo que un recálculo que leyó datos anteriores a la
+escritura no vuelve a cachear el valor previo. El candado es propio de cada generación:
+tras una invalidación el siguiente lector recalcula sin esperar al recálculo obsoleto.
+
+El backend de caché no ofrece comparar y eliminar atómico: el candado solo se elimina
+si el cálculo terminó antes de su vencimiento (nadie más pudo tomarlo); si no, vence solo.
+"""
+import logging
+import math
+import random
+import time
+import uuid
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TTL_POR_DEFECTO = 300
+BETA = 1.0  # > 1 adelanta más el recálculo, < 1 lo retrasa
+ESPERA_MAXIMA = 5.0  # segundos que una lectura sin valor espera a otro worker
+INTERVALO_ESPERA = 0.05
+MARGEN_CANDADO = 0.5  # segundos antes del vencimiento del candado en que ya no se elimina
+
+
+def _clave_candado(clave, generacion):
+    return f'{clave}:recalculando:{generacion}'
+
+
+def clave_generacion(clave):
+    """Clave con la generación de `clave`; la invalidación la elimina junto con la entrada"""
+    return f'{clave}:generacion'
+
+
+def _generacion(clave):
+    """Generación vigente de `clave` (la crea si una invalidación la eliminó)"""
+    cache.add(clave_generacion(clave), uuid.uuid4().hex, timeout=None)
+    return cache.get(clave_generacion(clave))
+
+
+def _leer(clave):
+    """Lee la entrada (valor, expira, duración); descarta formatos ajenos a este módulo"""
+    entrada = cache.get(clave)
+    if isinstance(entrada, tuple) and len(entrada) == 3:
+        return entrada
+    return None
+
+
+def _vigente(entrada, ahora, beta):
+    """XFetch: la entrada sigue vigente salvo que el sorteo adelante su recálculo"""
+    _, expira, duracion = entrada
+    return ahora - duracion * beta * math.log(random.random() or 1e-12) < expira
+
+
+def _calcular_y_guardar(clave, calcular, ttl, gracia, generacion):
+    inicio = time.monotonic()
+    valor = calcular()
+    duracion = time.monotonic() - inicio
+    if generacion is None or cache.get(clave_generacion(clave)) != generacion:
+        logger.info(f"Caché '{clave}' invalidado durante el recálculo, no se guarda")
+        return valor
+    cache.set(clave, (valor, time.time() + ttl, duracion), ttl + gracia)
+    # Una invalidación entre la verificación y el set quedaría pisada: se deshace el set
+    if cache.get(clave_generacion(clave)) != generacion:
+        cache.delete(clave)
+    logger.info(f"Caché '{clave}' recalculado en {duracion * 1000:.1f} ms")
+    return valor
+
+
+def obtener_o_calcular(clave, calcular, ttl=TTL_POR_DEFECTO, gracia=None, forzar=False,
+                       beta=BETA, espera_maxima=ESPERA_MAXIMA):
+    """
+    Obtiene `clave` del caché o la recalcula con `calcular()` sin estampidas
+
+    Args:
+        clave: Clave de caché
+        calcular: Función sin argumentos que produce el valor (serializable)
+        ttl: Segundos de vigencia del valor
+        gracia: Segundos adicionales en que el valor vencido puede servirse mientras
+            otro worker lo recalcula (por defecto igual a `ttl`)
+        forzar: Recalcular aunque el valor esté vigente; si otro worker ya está
+            recalculando se devuelve el valor actual en lugar de duplicar el trabajo
+
+    Returns:
+        El valor cacheado o recién calculado
+    """
+    gracia = ttl if gracia is None else gracia
+    entrada = _leer(clave)
+    if entrada is not None and not forzar and _vigente(entrada, time.time(), beta):
+        return entrada[0]
+
+    vigencia_candado = max(1, int(espera_maxima * 2))
+    limite = time.monotonic() + espera_maxima
+    while True:
+        generacion = _generacion(clave)
+        candado = _clave_candado(clave, generacion)
+        if cache.add(candado, True, timeout=vigencia_candado):
+            tomado = time.monotonic()
+            try:
+                return _calcular_y_guardar(clave, calcular, ttl, gracia, generacion)
+            finally:
+                if time.monotonic() - tomado < vigencia_candado - MARGEN_CANDADO:
+                    cache.delete(candado)
+
+        # Otro worker está recalculando: servir el valor anterior si existe
+        if entrada is not None:
+            logger.debug(f"Caché '{clave}' servido vencido mientras se recalcula")
+            return entrada[0]
+
+        # Sin valor que servir: esperar el resultado del otro worker
+        if time.monotonic() >= limite:
+            logger.warning(f"Espera agotada por el recálculo de '{clave}', calculando sin candado")
+            return _calcular_y_guardar(clave, calcular, ttl, gracia, generacion)
+        time.sleep(INTERVALO_ESPERA)
+        entrada = _leer(clave)
+        if entrada is not None:
+            return entrada[0]
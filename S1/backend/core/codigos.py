@@ -0,0 +1,95 @@
+"""
+Índice en memoria de códigos de barras para las estaciones de escaneo.
+
+Cada worker mantiene un LRU `codigo_barras -> datos del producto (id, nombre, precio)`
+para responder `GET /api/productos/por_codigo/<codigo>/` sin pasar por filtros ni
+serializers. El stock no se guarda: cambia con cada movimiento, así que se lee siempre
+por clave primaria (una consulta por índice, sin recorrer códigos de barras).
+
+Como el LRU es local a cada proceso, su vigencia se valida con CLAVE_VERSION_CODIGOS
+en el caché compartido, renovada por el evento 'productos' de core/invalidacion.py al
+confirmar la transacción: altas, cambios y bajas de productos pueden reasignar códigos
+o cambiar nombre y precio, así que al cambiar se descarta el LRU completo.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from django.core.cache import cache
+from .invalidacion import CLAVE_VERSION_CODIGOS
+from .models import Producto
+
+CAPACIDAD = 10000
+CAMPOS = ('id', 'nombre', 'codigo_barras', 'stock', 'precio')
+
+
+def _version_codigos():
+    version = cache.get(CLAVE_VERSION_CODIGOS)
+    if version is None:
+        cache.add(CLAVE_VERSION_CODIGOS, uuid.uuid4().hex, None)
+        version = cache.get(CLAVE_VERSION_CODIGOS)
+    return version
+
+
+class IndiceCodigos:
+    """LRU de códigos de barras con la vigencia descrita en el módulo (seguro entre hilos)"""
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self._version_codigos = None
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def limpiar(self):
+        with self._candado:
+            self._entradas.clear()
+
+    def buscar(self, codigo):
+        """
+        Datos del producto con `codigo` (dict con CAMPOS), o None si no existe
+
+        Los códigos inexistentes no se guardan: un producto nuevo con ese código
+        debe encontrarse en el siguiente escaneo aunque su evento no haya llegado.
+        """
+        codigo = (codigo or '').strip()
+        if not codigo:
+            return None
+        version_codigos = _version_codigos()
+        with self._candado:
+            if version_codigos != self._version_codigos:
+                self._entradas.clear()
+                self._version_codigos = version_codigos
+            entrada = self._entradas.get(codigo)
+            if entrada is not None:
+                self._entradas.move_to_end(codigo)
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+
+        if entrada is not None:
+            # Producto conocido: solo el stock se lee, por clave primaria
+            stock = Producto.objects.filter(pk=entrada['id']).values_list('stock', flat=True).first()
+            datos = None if stock is None else {**entrada, 'stock': stock}
+        else:
+            datos = Producto.objects.filter(codigo_barras=codigo).values(*CAMPOS).first()
+
+        with self._candado:
+            if datos is None:
+                self._entradas.pop(codigo, None)
+            elif entrada is None and self._version_codigos == version_codigos:
+                self._entradas[codigo] = {campo: valor for campo, valor in datos.items() if campo != 'stock'}
+                while len(self._entradas) > self.capacidad:
+                    self._entradas.popitem(last=False)
+        return datos
+
+
+indice = IndiceCodigos()
+
+
+def buscar_por_codigo(codigo):
+    """Datos del producto con `codigo` desde el índice del worker (ver IndiceCodigos.buscar)"""
+    return indice.buscar(codigo)
@@ -0,0 +1,123 @@
+"""
+Conteo de filas para las respuestas paginadas.
+
+`contar_aproximado` es el proveedor de conteos de la paginación por número de página:
+- Consultas sin filtros en PostgreSQL: `pg_class.reltuples` (estadística de la tabla,
+  sin recorrerla)
+- Consultas filtradas en PostgreSQL: filas estimadas por el planificador (EXPLAIN)
+- Si la estimación es menor que `UMBRAL_EXACTO` (o el motor no es PostgreSQL) se hace
+  el COUNT(*) exacto, que en conjuntos chicos es barato
+Los totales desde `UMBRAL_CACHE` filas se cachean por firma de la consulta (SQL y
+parámetros, es decir, por combinación de filtros) junto con una versión que se renueva
+con cada evento de escritura (ver invalidacion.CLAVE_VERSION_CONTEOS). Los conjuntos
+chicos se cuentan siempre: el COUNT(*) es barato y el total se mantiene exacto aunque
+la escritura no pase por los eventos (admin, ORM directo).
+
+En la paginación por cursor el parámetro `conteo` elige el modo:
+- exacto: COUNT(*) sobre la consulta filtrada
+- estimado: el mismo criterio de `contar_aproximado`
+- ninguno: no se cuenta y la respuesta trae `count: null`
+"""
+import hashlib
+import json
+import logging
+import uuid
+from django.core.cache import cache
+from django.db import connections
+from .invalidacion import CLAVE_VERSION_CONTEOS
+
+logger = logging.getLogger(__name__)
+
+MODOS_CONTEO = ('exacto', 'estimado', 'ninguno')
+UMBRAL_EXACTO = 50000
+UMBRAL_CACHE = 1000
+TTL_CONTEO = 300
+
+
+def estimar(queryset):
+    """Filas que el planificador espera para la consulta (PostgreSQL) o COUNT(*) en otros motores"""
+    conexion = connections[queryset.db]
+    if conexion.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with conexion.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def filas_tabla(modelo, using='default'):
+    """
+    Filas de la tabla según las estadísticas de PostgreSQL (pg_class.reltuples)
+
+    Returns:
+        Entero, o None si el motor no es PostgreSQL o la tabla nunca se analizó
+    """
+    conexion = connections[using]
+    if conexion.vendor != 'postgresql':
+        return None
+    with conexion.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [modelo._meta.db_table])
+        fila = cursor.fetchone()
+    if fila is None or fila[0] < 0:
+        return None
+    return int(fila[0])
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION_CONTEOS)
+    if version is None:
+        cache.add(CLAVE_VERSION_CONTEOS, uuid.uuid4().hex, None)
+        version = cache.get(CLAVE_VERSION_CONTEOS)
+    return version
+
+
+def _firma(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    return hashlib.sha1(f'{queryset.db}|{sql}|{params!r}'.encode('utf-8')).hexdigest()
+
+
+def contar_aproximado(queryset, umbral_exacto=UMBRAL_EXACTO, ttl=TTL_CONTEO):
+    """
+    Conteo para paginación: exacto en conjuntos chicos, estimado en los grandes
+
+    Returns:
+        Tupla (total, exacto)
+    """
+    clave = f'conteo:{queryset.model._meta.label_lower}:{_version()}:{_firma(queryset)}'
+    guardado = cache.get(clave)
+    if guardado is not None:
+        return tuple(guardado)
+
+    estimado = None
+    try:
+        if not queryset.query.where:
+            estimado = filas_tabla(queryset.model, queryset.db)
+        elif connections[queryset.db].vendor == 'postgresql':
+            estimado = estimar(queryset)
+    except Exception as e:
+        logger.warning(f"No se pudo estimar el conteo de {queryset.model.__name__}: {str(e)}")
+
+    if estimado is not None and estimado >= umbral_exacto:
+        resultado = (estimado, False)
+    else:
+        resultado = (queryset.count(), True)
+    if resultado[0] >= UMBRAL_CACHE:
+        cache.set(clave, resultado, ttl)
+    return resultado
+
+
+def contar(queryset, modo='exacto'):
+    """
+    Cuenta las filas de `queryset` según `modo` (ver MODOS_CONTEO)
+
+    Returns:
+        Entero, o None con el modo 'ninguno'
+    """
+    if modo == 'ninguno':
+        return None
+    if modo == 'estimado':
+        return contar_aproximado(queryset)[0]
+    return queryset.count()
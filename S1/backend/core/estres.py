@@ -0,0 +1,293 @@
+"""
+Prueba de estrés de concurrencia sobre los movimientos de stock.
+
+`ejecutar_estres` crea productos de prueba y lanza N hilos (o procesos) que ejecutan una
+mezcla aleatoria de `registrar_entrada`, `registrar_salida` y `ajustar_stock` contra la
+base de datos configurada (SQLite o PostgreSQL). Reporta:
+- rendimiento (operaciones por segundo) y latencias p50/p95/p99, total y por operación
+- esperas por bloqueo: reintentos por "database is locked" (SQLite) o errores de
+  serialización/bloqueo, y en PostgreSQL los backends esperando un lock (pg_locks) que
+  observa un hilo monitor
+- deadlocks detectados por la base (cada uno se reintenta)
+- invariantes al terminar: el stock de cada producto es igual a la suma de sus
+  movimientos (entradas - salidas) y nunca es negativo (también se muestrea durante
+  la corrida)
+
+Los productos de prueba parten en stock 0 y reciben su stock inicial como una entrada,
+de modo que la invariante se verifica contra todos sus movimientos. Se eliminan al
+terminar salvo que se pida conservarlos.
+"""
+import logging
+import math
+import multiprocessing
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import django
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import Case, IntegerField, Sum, When
+from .invalidacion import emitir
+from .models import Movimiento, Producto
+
+logger = logging.getLogger(__name__)
+
+OPERACIONES = ('entrada', 'salida', 'ajuste')
+MEZCLA_POR_DEFECTO = (45, 45, 10)  # porcentaje de entrada, salida y ajuste
+MAX_REINTENTOS = 50
+PREFIJO_PRODUCTOS = 'Estrés concurrencia'
+INTERVALO_MONITOR = 0.05
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por rango más cercano; None si no hay valores"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def _es_deadlock(error):
+    return 'deadlock' in str(error).lower()
+
+
+def _es_bloqueo(error):
+    texto = str(error).lower()
+    return 'locked' in texto or 'could not serialize' in texto or 'lock timeout' in texto
+
+
+def _operar(producto, operacion, rng):
+    if operacion == 'entrada':
+        producto.registrar_entrada(rng.randint(1, 5), 'Estrés: entrada', usuario='estres')
+    elif operacion == 'salida':
+        producto.registrar_salida(rng.randint(1, 5), 'Estrés: salida', usuario='estres')
+    else:
+        producto.ajustar_stock(rng.randint(0, 30), 'Estrés: ajuste', usuario='estres')
+
+
+def trabajador(ids, operaciones, mezcla, semilla):
+    """
+    Ejecuta `operaciones` movimientos aleatorios sobre los productos `ids`
+
+    Returns:
+        Dict con latencias por operación (segundos) y contadores de rechazos,
+        reintentos por bloqueo, deadlocks y errores
+    """
+    rng = random.Random(semilla)
+    resultado = {
+        'latencias': defaultdict(list), 'rechazadas': 0, 'esperas_bloqueo': 0, 'deadlocks': 0, 'errores': 0
+    }
+    close_old_connections()
+    try:
+        for _ in range(operaciones):
+            operacion = rng.choices(OPERACIONES, weights=mezcla)[0]
+            producto = Producto(pk=rng.choice(ids), nombre=PREFIJO_PRODUCTOS)
+            inicio = time.perf_counter()
+            for intento in range(MAX_REINTENTOS):
+                try:
+                    # Solo se usa el id: los movimientos trabajan sobre el stock guardado
+                    _operar(producto, operacion, rng)
+                    break
+                except ValueError:
+                    resultado['rechazadas'] += 1
+                    break
+                except OperationalError as e:
+                    if _es_deadlock(e):
+                        resultado['deadlocks'] += 1
+                    elif _es_bloqueo(e):
+                        resultado['esperas_bloqueo'] += 1
+                    else:
+                        raise
+                    time.sleep(min(0.001 * 2 ** intento, 0.05) * rng.random())
+            else:
+                resultado['errores'] += 1
+                continue
+            resultado['latencias'][operacion].append(time.perf_counter() - inicio)
+    except Exception as e:
+        logger.error(f"Trabajador de estrés detenido: {str(e)}", exc_info=True)
+        resultado['errores'] += 1
+    finally:
+        connection.close()
+    resultado['latencias'] = dict(resultado['latencias'])
+    return resultado
+
+
+class _Monitor(threading.Thread):
+    """Muestrea durante la corrida el stock negativo y (en PostgreSQL) los locks en espera"""
+
+    def __init__(self, ids):
+        super().__init__(daemon=True)
+        self.ids = ids
+        self.detener = threading.Event()
+        self.stock_negativo = False
+        self.muestras = 0
+        self.muestras_con_espera = 0
+        self.max_en_espera = 0
+
+    def run(self):
+        close_old_connections()
+        try:
+            while not self.detener.wait(INTERVALO_MONITOR):
+                try:
+                    self._muestrear()
+                except OperationalError:
+                    pass  # SQLite ocupado por los escritores: se salta la muestra
+        finally:
+            connection.close()
+
+    def _muestrear(self):
+        self.muestras += 1
+        if Producto.objects.filter(pk__in=self.ids, stock__lt=0).exists():
+            self.stock_negativo = True
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                en_espera = cursor.fetchone()[0]
+            if en_espera:
+                self.muestras_con_espera += 1
+                self.max_en_espera = max(self.max_en_espera, en_espera)
+
+
+def _deadlocks_postgresql():
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()')
+        return cursor.fetchone()[0]
+
+
+def crear_productos(cantidad, stock_inicial):
+    """Crea los productos de prueba con su stock inicial registrado como entrada"""
+    ids = []
+    for i in range(cantidad):
+        producto = Producto.objects.create(nombre=f'{PREFIJO_PRODUCTOS} {i}', precio=1000, stock=0)
+        if stock_inicial:
+            producto.registrar_entrada(stock_inicial, 'Estrés: carga inicial', usuario='estres')
+        ids.append(producto.pk)
+    return ids
+
+
+def verificar_invariantes(ids):
+    """
+    Compara el stock de cada producto con la suma de sus movimientos
+
+    Returns:
+        Dict con `stock_igual_movimientos`, `stock_no_negativo` y `diferencias`
+        (producto, stock, suma de movimientos) de los productos que no cuadran
+    """
+    sumas = dict(
+        Movimiento.objects.filter(producto_id__in=ids).values('producto_id').annotate(
+            neto=Sum(Case(
+                When(tipo='ENTRADA', then='cantidad'), default=0, output_field=IntegerField()
+            )) - Sum(Case(
+                When(tipo='SALIDA', then='cantidad'), default=0, output_field=IntegerField()
+            ))
+        ).values_list('producto_id', 'neto')
+    )
+    stocks = dict(Producto.objects.filter(pk__in=ids).values_list('pk', 'stock'))
+    diferencias = [
+        {'producto': pk, 'stock': stock, 'movimientos': sumas.get(pk, 0)}
+        for pk, stock in stocks.items() if stock != sumas.get(pk, 0)
+    ]
+    return {
+        'stock_igual_movimientos': not diferencias,
+        'stock_no_negativo': all(stock >= 0 for stock in stocks.values()),
+        'diferencias': diferencias,
+    }
+
+
+def _resumen_latencias(latencias):
+    return {
+        'cantidad': len(latencias),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2) if latencias else None,
+    }
+
+
+def ejecutar_estres(hilos=8, operaciones=100, productos=5, stock_inicial=20, mezcla=MEZCLA_POR_DEFECTO,
+                    procesos=False, semilla=None, conservar=False):
+    """
+    Corre la prueba de estrés y retorna el reporte
+
+    Args:
+        hilos: Trabajadores concurrentes (hilos, o procesos con `procesos=True`)
+        operaciones: Operaciones por trabajador
+        productos: Productos de prueba sobre los que compiten los trabajadores (menos
+            productos = más contención)
+        mezcla: Pesos de entrada, salida y ajuste
+        conservar: No eliminar los productos de prueba al terminar
+
+    Returns:
+        Dict con motor, duración, rendimiento, latencias, contadores e invariantes
+    """
+    semilla = semilla if semilla is not None else random.randrange(2 ** 32)
+    ids = crear_productos(productos, stock_inicial)
+    deadlocks_antes = _deadlocks_postgresql()
+    monitor = _Monitor(ids)
+    monitor.start()
+
+    argumentos = [(ids, operaciones, mezcla, semilla + i) for i in range(hilos)]
+    inicio = time.perf_counter()
+    try:
+        if procesos:
+            # spawn: los procesos parten sin heredar las conexiones abiertas del padre; el
+            # inicializador configura Django antes de recibir `trabajador` (que importa modelos)
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=hilos, mp_context=contexto, initializer=django.setup) as pool:
+                resultados = list(pool.map(trabajador, *zip(*argumentos)))
+        else:
+            with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='estres') as pool:
+                resultados = list(pool.map(trabajador, *zip(*argumentos)))
+        duracion = time.perf_counter() - inicio
+    finally:
+        monitor.detener.set()
+        monitor.join()
+
+    latencias = defaultdict(list)
+    for resultado in resultados:
+        for operacion, valores in resultado['latencias'].items():
+            latencias[operacion].extend(valores)
+    todas = [valor for valores in latencias.values() for valor in valores]
+    deadlocks_despues = _deadlocks_postgresql()
+
+    invariantes = verificar_invariantes(ids)
+    invariantes['stock_no_negativo'] = invariantes['stock_no_negativo'] and not monitor.stock_negativo
+    reporte = {
+        'motor': connection.vendor,
+        'modo': 'procesos' if procesos else 'hilos',
+        'trabajadores': hilos,
+        'productos': productos,
+        'semilla': semilla,
+        'operaciones': len(todas),
+        'duracion_s': round(duracion, 3),
+        'operaciones_por_segundo': round(len(todas) / duracion, 1) if duracion else None,
+        'latencias': _resumen_latencias(todas),
+        'latencias_por_operacion': {op: _resumen_latencias(latencias.get(op, [])) for op in OPERACIONES},
+        'rechazadas_stock_insuficiente': sum(r['rechazadas'] for r in resultados),
+        'esperas_bloqueo': sum(r['esperas_bloqueo'] for r in resultados),
+        'deadlocks': sum(r['deadlocks'] for r in resultados),
+        'errores': sum(r['errores'] for r in resultados),
+        'locks_en_espera': {
+            'muestras': monitor.muestras,
+            'muestras_con_espera': monitor.muestras_con_espera,
+            'maximo': monitor.max_en_espera,
+        } if connection.vendor == 'postgresql' else None,
+        'deadlocks_postgresql': (
+            deadlocks_despues - deadlocks_antes if deadlocks_antes is not None else None
+        ),
+        'invariantes': invariantes,
+    }
+
+    if not conservar:
+        with transaction.atomic():
+            Producto.objects.filter(pk__in=ids).delete()
+            emitir('productos')
+    logger.info(
+        f"Estrés de stock - {reporte['operaciones']} operaciones en {reporte['duracion_s']}s "
+        f"({reporte['operaciones_por_segundo']} op/s), p95: {reporte['latencias']['p95_ms']} ms, "
+        f"Deadlocks: {reporte['deadlocks']}, Invariantes: "
+        f"{invariantes['stock_igual_movimientos'] and invariantes['stock_no_negativo']}"
+    )
+    return reporte
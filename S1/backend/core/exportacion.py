@@ -0,0 +1,170 @@
+"""
+Exportación CSV en streaming.
+
+Las filas se leen con `values_list().iterator()` (cursor del lado del servidor en
+PostgreSQL) y se escriben en bloques a un StreamingHttpResponse: la memoria usada
+no depende de la cantidad de filas y el primer byte sale antes de terminar la consulta.
+"""
+import csv
+from datetime import datetime
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FILAS_POR_BLOQUE = 500
+TAMANO_CURSOR = 2000
+
+ENCABEZADO_PRODUCTOS = ['ID', 'Nombre', 'Marca', 'Modelo', 'Categoría', 'Stock', 'Precio', 'Descripción', 'Fecha Creación']
+ENCABEZADO_MOVIMIENTOS = ['ID', 'Producto', 'Tipo', 'Cantidad', 'Fecha', 'Descripción']
+ENCABEZADO_REPORTE = ['REPORTE DE INVENTARIO']
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def formateador_fecha_local(zona=None):
+    """
+    Retorna una función que formatea datetimes UTC como 'YYYY-MM-DD HH:MM:SS' en hora local
+
+    El desfase horario se calcula una vez por hora UTC distinta y se reutiliza
+    (los cambios de horario ocurren en horas exactas), evitando una conversión de
+    zona horaria completa por fila.
+    """
+    zona = zona or timezone.get_current_timezone()
+    desfases = {}
+
+    def formatear(fecha):
+        if fecha is None:
+            return ''
+        hora = (fecha.year, fecha.month, fecha.day, fecha.hour)
+        desfase = desfases.get(hora)
+        if desfase is None:
+            desfase = desfases[hora] = fecha.astimezone(zona).utcoffset()
+        return str((fecha + desfase).replace(tzinfo=None))[:19]
+
+    return formatear
+
+
+def generar_csv(encabezado, filas, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Genera el CSV en bloques de texto (con BOM UTF-8 para Excel)"""
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(encabezado)
+    bloque = []
+    for fila in filas:
+        bloque.append(escritor.writerow(fila))
+        if len(bloque) >= filas_por_bloque:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def respuesta_csv(prefijo, encabezado, filas):
+    """
+    StreamingHttpResponse con un CSV descargable
+
+    Args:
+        prefijo: Inicio del nombre de archivo (se agrega fecha y hora)
+        encabezado: Lista de títulos de columna
+        filas: Iterable de filas (idealmente perezoso, p. ej. un generador sobre iterator())
+    """
+    response = StreamingHttpResponse(generar_csv(encabezado, filas), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{prefijo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
+    return response
+
+
+def filas_productos(queryset):
+    """Filas del CSV de productos leídas con un cursor y sin instanciar modelos"""
+    formatear = formateador_fecha_local()
+    for (id_, nombre, marca, modelo, categoria, stock, precio, descripcion,
+         fecha_creacion) in queryset.values_list(
+            'id', 'nombre', 'marca', 'modelo', 'categoria', 'stock', 'precio', 'descripcion', 'fecha_creacion'
+    ).iterator(chunk_size=TAMANO_CURSOR):
+        yield [id_, nombre, marca, modelo, categoria, stock, precio, descripcion, formatear(fecha_creacion)]
+
+
+def filas_movimientos(queryset):
+    """Filas del CSV de movimientos (el nombre del producto viene del JOIN)"""
+    formatear = formateador_fecha_local()
+    for id_, producto, tipo, cantidad, fecha, descripcion in queryset.values_list(
+        'id', 'producto__nombre', 'tipo', 'cantidad', 'fecha', 'descripcion'
+    ).iterator(chunk_size=TAMANO_CURSOR):
+        yield [id_, producto, tipo, cantidad, formatear(fecha), descripcion]
+
+
+def productos_reporte(parametros):
+    """Productos del reporte de inventario según categoria, fecha_desde y fecha_hasta"""
+    from .models import Producto
+
+    categoria = parametros.get('categoria')
+    fecha_desde = parametros.get('fecha_desde')
+    fecha_hasta = parametros.get('fecha_hasta')
+
+    productos = Producto.objects.all()
+    if categoria and categoria != 'todas':
+        productos = productos.filter(categoria=categoria)
+    if fecha_desde:
+        productos = productos.filter(fecha_creacion__gte=fecha_desde)
+    if fecha_hasta:
+        productos = productos.filter(fecha_creacion__lte=fecha_hasta + ' 23:59:59')
+    return productos.order_by('categoria', 'nombre')
+
+
+def filas_reporte(parametros, al_avanzar=None):
+    """
+    Filas del reporte de inventario (después de ENCABEZADO_REPORTE): detalle por
+    producto leído con un cursor, resumen y, sin filtro de categoría, el análisis por categoría
+
+    Args:
+        al_avanzar: Función opcional llamada por cada producto escrito
+    """
+    from django.db.models import Count, F, Sum
+    from .models import Producto
+
+    categoria = parametros.get('categoria')
+    filtrado = bool(categoria and categoria != 'todas')
+
+    yield ['Generado:', datetime.now().strftime('%d/%m/%Y %H:%M:%S')]
+    yield ['Categoría:', categoria if filtrado else 'Todas']
+    yield []
+    yield ['ID', 'Nombre', 'Marca', 'Modelo', 'Categoría', 'Stock', 'Precio Unit.', 'Valor Total', 'Estado Stock']
+
+    total_productos = 0
+    stock_total = 0
+    valor_total = 0
+    for id_, nombre, marca, modelo, categoria_producto, stock, precio in productos_reporte(parametros).values_list(
+        'id', 'nombre', 'marca', 'modelo', 'categoria', 'stock', 'precio'
+    ).iterator(chunk_size=TAMANO_CURSOR):
+        valor_producto = float(precio) * stock
+        if stock <= 5:
+            estado = 'CRÍTICO'
+        elif stock <= 10:
+            estado = 'BAJO'
+        else:
+            estado = 'NORMAL'
+        yield [id_, nombre, marca, modelo, categoria_producto, stock, f"${precio:,.0f}", f"${valor_producto:,.0f}", estado]
+        total_productos += 1
+        stock_total += stock
+        valor_total += valor_producto
+        if al_avanzar:
+            al_avanzar()
+
+    yield []
+    yield ['RESUMEN']
+    yield ['Total Productos:', total_productos]
+    yield ['Stock Total:', stock_total]
+    yield ['Valor Total Inventario:', f"${valor_total:,.0f}"]
+
+    if not filtrado:
+        yield []
+        yield ['ANÁLISIS POR CATEGORÍA']
+        yield ['Categoría', 'Cantidad Productos', 'Stock Total', 'Valor Total']
+        for cat in Producto.objects.values('categoria').annotate(
+            cantidad=Count('id'),
+            stock_total=Sum('stock'),
+            valor=Sum(F('stock') * F('precio'))
+        ).order_by('-valor'):
+            yield [cat['categoria'], cat['cantidad'], cat['stock_total'], f"${cat['valor']:,.0f}"]
@@ -0,0 +1,381 @@
+"""
+Importación masiva de productos desde CSV.
+
+El archivo se recorre con el módulo csv en bloques de `TAMANO_BLOQUE` filas. Por bloque
+se hace una sola consulta para precargar los productos existentes (por código de barras
+y por nombre+marca+modelo), y luego las escrituras van con bulk_create/bulk_update.
+Todo el archivo se aplica en una transacción (o una por bloque, en las tareas en
+segundo plano); las filas inválidas se informan por número de línea y no detienen
+la importación.
+
+Los archivos grandes en disco (`importar_ruta`) se dividen en rangos de bytes que se
+parsean y validan en paralelo en un ProcessPoolExecutor; el proceso principal es el
+único escritor y aplica los resultados en el orden del archivo.
+
+Formato: nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras
+"""
+import csv
+import io
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.serializers import ValidationError
+from .alertas import reevaluar_alertas
+from .libro_stock import abrir_saldos, modo_estricto, registrar_diferencias
+from .models import Producto
+from .validators import validar_stock, validar_precio, validar_codigo_barras
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE = 2000
+TAMANO_LOTE_BD = 500
+CAMPOS_ACTUALIZABLES = ['stock', 'precio', 'descripcion']
+PRECIO_MAXIMO = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+TAMANO_RANGO = 4 * 1024 * 1024  # bytes de CSV que parsea cada proceso por vez
+UMBRAL_PARALELO = 8 * 1024 * 1024  # archivos más chicos no justifican levantar el pool
+LECTURA_DIVISION = 1024 * 1024
+DESCRIPCION_IMPORTACION = 'Importación CSV'
+
+
+def _texto(partes, indice, campo):
+    valor = partes[indice].strip() if len(partes) > indice else ''
+    maximo = Producto._meta.get_field(campo).max_length
+    if maximo and len(valor) > maximo:
+        raise ValueError(f'{campo} supera {maximo} caracteres')
+    return valor
+
+
+def _validar(validador, valor):
+    try:
+        return validador(valor)
+    except ValidationError as e:
+        raise ValueError(str(e.detail[0]))
+
+
+def parsear_fila(partes):
+    """
+    Convierte una fila del CSV en los datos de un producto, con los mismos
+    validadores de stock, precio y código de barras que la API
+
+    Raises:
+        ValueError: Con el motivo si la fila no es válida
+    """
+    if len(partes) < 5:
+        raise ValueError('formato incorrecto (faltan campos)')
+
+    stock = _validar(validar_stock, partes[4].strip()) if partes[4].strip() else 0
+    texto_precio = partes[5].strip() if len(partes) > 5 else ''
+    precio = Decimal('0')
+    if texto_precio:
+        try:
+            precio = _validar(validar_precio, texto_precio).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise ValueError(f"precio inválido: '{texto_precio}'")
+        if precio > PRECIO_MAXIMO:
+            raise ValueError(f"precio fuera de rango: '{texto_precio}'")
+
+    codigo_barras = _texto(partes, 7, 'codigo_barras')
+    return {
+        'nombre': _texto(partes, 0, 'nombre'),
+        'marca': _texto(partes, 1, 'marca'),
+        'modelo': _texto(partes, 2, 'modelo'),
+        'categoria': _texto(partes, 3, 'categoria'),
+        'stock': stock,
+        'precio': precio,
+        'descripcion': partes[6].strip() if len(partes) > 6 else '',
+        'codigo_barras': _validar(validar_codigo_barras, codigo_barras) or None,
+    }
+
+
+def _agregar_fila(partes, linea, filas, errores):
+    """Parsea una fila numerada y la agrega a `filas` o su motivo a `errores` (ignora vacías)"""
+    if not any(parte.strip() for parte in partes):
+        return
+    try:
+        filas.append((linea, parsear_fila(partes)))
+    except Exception as e:
+        errores.append(f'Línea {linea}: {str(e)}')
+
+
+def leer_bloques(archivo, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Recorre un archivo CSV binario sin cargarlo completo en memoria
+
+    Yields:
+        Tuplas (filas, errores, posicion): filas es una lista de (línea, datos) válidos,
+        errores los mensajes de las filas inválidas del bloque y posicion los bytes
+        leídos del archivo hasta ese bloque (aproximado, para informar avance)
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        lector = csv.reader(texto)
+        next(lector, None)  # cabecera
+        filas, errores = [], []
+        for partes in lector:
+            _agregar_fila(partes, lector.line_num, filas, errores)
+            if len(filas) + len(errores) >= tamano_bloque:
+                yield filas, errores, archivo.tell()
+                filas, errores = [], []
+        if filas or errores:
+            yield filas, errores, archivo.tell()
+    finally:
+        # No cerrar el archivo subido al descartar el wrapper
+        texto.detach()
+
+
+class _Bloque:
+    """Aplica un bloque de filas contra los productos existentes precargados"""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.por_codigo = {}
+        self.por_clave = {}
+        self.nuevos = []
+        self.modificados = {}
+        self.stock_anterior = {}
+        self.creados = 0
+        self.actualizados = 0
+
+    @staticmethod
+    def _clave(datos):
+        if datos['nombre'] and datos['marca'] and datos['modelo']:
+            return (datos['nombre'], datos['marca'], datos['modelo'])
+        return None
+
+    def precargar(self):
+        """Una consulta: productos que coinciden por código o por nombre+marca+modelo"""
+        codigos = {datos['codigo_barras'] for _, datos in self.filas if datos['codigo_barras']}
+        claves = {clave for clave in (self._clave(datos) for _, datos in self.filas) if clave}
+        condicion = Q(codigo_barras__in=codigos)
+        if claves:
+            condicion |= Q(
+                nombre__in={c[0] for c in claves},
+                marca__in={c[1] for c in claves},
+                modelo__in={c[2] for c in claves},
+            )
+        # Igual que `.first()` con el orden por defecto: gana el más reciente
+        for producto in Producto.objects.filter(condicion).order_by('-fecha_creacion'):
+            if producto.codigo_barras:
+                self.por_codigo.setdefault(producto.codigo_barras, producto)
+            self.por_clave.setdefault((producto.nombre, producto.marca, producto.modelo), producto)
+
+    def _existente(self, datos):
+        producto = self.por_codigo.get(datos['codigo_barras']) if datos['codigo_barras'] else None
+        clave = self._clave(datos)
+        if producto is None and clave:
+            producto = self.por_clave.get(clave)
+        return producto
+
+    def procesar(self):
+        for _, datos in self.filas:
+            producto = self._existente(datos)
+            if producto is not None:
+                if producto.pk:
+                    self.stock_anterior.setdefault(producto.pk, producto.stock)
+                producto.stock = datos['stock']
+                producto.precio = datos['precio']
+                if datos['descripcion']:
+                    producto.descripcion = datos['descripcion']
+                if producto.pk:
+                    self.modificados[producto.pk] = producto
+                self.actualizados += 1
+                continue
+
+            producto = Producto(**datos)
+            self.nuevos.append(producto)
+            # Una fila posterior del mismo archivo actualiza este producto en lugar de duplicarlo
+            if datos['codigo_barras']:
+                self.por_codigo[datos['codigo_barras']] = producto
+            clave = self._clave(datos)
+            if clave:
+                self.por_clave.setdefault(clave, producto)
+            self.creados += 1
+
+    def guardar(self):
+        Producto.objects.bulk_create(self.nuevos, batch_size=TAMANO_LOTE_BD)
+        # bulk_create no pasa por Producto.save: el saldo de apertura se escribe aquí
+        abrir_saldos(self.nuevos)
+        Producto.objects.bulk_update(list(self.modificados.values()), CAMPOS_ACTUALIZABLES, batch_size=TAMANO_LOTE_BD)
+        # El stock importado puede cruzar umbrales: un UPDATE corrige las alertas del bloque
+        reevaluar_alertas(list(self.modificados), crear_faltantes=False)
+        if modo_estricto():
+            # Libro de stock de solo inserción: cada cambio de stock queda como movimiento
+            registrar_diferencias(
+                [(pk, self.stock_anterior[pk], p.stock) for pk, p in self.modificados.items()],
+                DESCRIPCION_IMPORTACION
+            )
+
+
+def _aplicar(bloques, al_avanzar=None, atomico=True):
+    """Único escritor: aplica en orden los bloques parseados (ver importar_productos)"""
+    from .invalidacion import emitir
+
+    creados = actualizados = 0
+    errores = []
+    with transaction.atomic() if atomico else nullcontext():
+        for filas, errores_bloque, posicion in bloques:
+            errores.extend(errores_bloque)
+            if filas:
+                with transaction.atomic(savepoint=False):
+                    bloque = _Bloque(filas)
+                    bloque.precargar()
+                    bloque.procesar()
+                    bloque.guardar()
+                creados += bloque.creados
+                actualizados += bloque.actualizados
+            if al_avanzar:
+                al_avanzar(posicion)
+        if creados or actualizados:
+            emitir('productos')
+
+    logger.info(
+        f"Importación CSV - Creados: {creados}, Actualizados: {actualizados}, Errores: {len(errores)}"
+    )
+    return {
+        'creados': creados,
+        'actualizados': actualizados,
+        'errores': errores,
+        'total_procesados': creados + actualizados
+    }
+
+
+def importar_productos(archivo, tamano_bloque=TAMANO_BLOQUE, al_avanzar=None, atomico=True):
+    """
+    Importa productos desde un CSV (archivo binario abierto)
+
+    Args:
+        al_avanzar: Función opcional llamada después de cada bloque con los bytes
+            leídos hasta el momento (p. ej. para informar el avance de una tarea)
+        atomico: Con False cada bloque se confirma por separado: el avance queda visible
+            para otras conexiones y no se mantiene una transacción larga (tareas en
+            segundo plano); un fallo deja aplicados los bloques anteriores
+
+    Returns:
+        Dict con `creados`, `actualizados`, `errores` (por línea) y `total_procesados`
+    """
+    return _aplicar(leer_bloques(archivo, tamano_bloque), al_avanzar, atomico)
+
+
+# ========== Importación paralela ==========
+
+def dividir_en_rangos(archivo, tamano_rango=TAMANO_RANGO):
+    """
+    Divide un CSV binario en rangos de bytes que empiezan en un límite de registro
+
+    Un salto de línea separa registros solo si la cantidad de comillas anteriores es
+    par (fuera de un campo entre comillas), de modo que los campos con saltos de línea
+    no se cortan. El recorrido solo cuenta bytes, sin decodificar ni parsear.
+
+    Returns:
+        Lista de tuplas (inicio, fin, lineas_previas); el primer rango empieza después
+        de la cabecera y `lineas_previas` permite numerar las líneas como el lector secuencial
+    """
+    archivo.seek(0)
+    cortes = []  # (posición tras el salto de línea, saltos de línea hasta ahí)
+    objetivo = paridad = lineas = posicion = 0
+    while True:
+        bloque = archivo.read(LECTURA_DIVISION)
+        if not bloque:
+            break
+        contado = 0
+        i = max(0, objetivo - posicion)
+        while i < len(bloque):
+            salto = bloque.find(b'\n', i)
+            if salto < 0:
+                break
+            paridad ^= bloque.count(b'"', contado, salto) & 1
+            contado = salto
+            if paridad:
+                i = salto + 1
+                continue
+            cortes.append((posicion + salto + 1, lineas + bloque.count(b'\n', 0, salto + 1)))
+            objetivo = posicion + salto + 1 + tamano_rango
+            i = objetivo - posicion
+        paridad ^= bloque.count(b'"', contado) & 1
+        lineas += bloque.count(b'\n')
+        posicion += len(bloque)
+
+    rangos = []
+    for indice, (inicio, lineas_previas) in enumerate(cortes):
+        fin = cortes[indice + 1][0] if indice + 1 < len(cortes) else posicion
+        if fin > inicio:
+            rangos.append((inicio, fin, lineas_previas))
+    return rangos
+
+
+def procesar_rango(ruta, inicio, fin, lineas_previas):
+    """
+    Parsea y valida un rango de bytes del CSV (se ejecuta en un proceso del pool;
+    no toca la base de datos)
+
+    Returns:
+        Tupla (filas, errores) como en leer_bloques
+    """
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        texto = archivo.read(fin - inicio).decode('utf-8')
+    filas, errores = [], []
+    lector = csv.reader(io.StringIO(texto, newline=''))
+    for partes in lector:
+        _agregar_fila(partes, lineas_previas + lector.line_num, filas, errores)
+    return filas, errores
+
+
+def _inicializar_proceso():
+    # Con el método spawn (Windows/macOS) el proceso hijo arranca sin Django configurado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def leer_bloques_paralelo(ruta, procesos, tamano_bloque=TAMANO_BLOQUE, tamano_rango=TAMANO_RANGO):
+    """
+    Como leer_bloques, pero los rangos del archivo se parsean en un pool de procesos.
+    Se mantienen a lo más 2 rangos por proceso en vuelo para acotar la memoria, y los
+    resultados se entregan en el orden del archivo.
+    """
+    with open(ruta, 'rb') as archivo:
+        rangos = iter(dividir_en_rangos(archivo, tamano_rango))
+
+    pool = ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso)
+    try:
+        en_vuelo = deque()
+        for rango in rangos:
+            en_vuelo.append((rango[1], pool.submit(procesar_rango, ruta, *rango)))
+            if len(en_vuelo) >= procesos * 2:
+                break
+        while en_vuelo:
+            fin, futuro = en_vuelo.popleft()
+            filas, errores = futuro.result()
+            rango = next(rangos, None)
+            if rango is not None:
+                en_vuelo.append((rango[1], pool.submit(procesar_rango, ruta, *rango)))
+            if errores:
+                yield [], errores, fin
+            for i in range(0, len(filas), tamano_bloque):
+                yield filas[i:i + tamano_bloque], [], fin
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def importar_ruta(ruta, procesos=None, tamano_bloque=TAMANO_BLOQUE, al_avanzar=None, atomico=True,
+                  tamano_rango=TAMANO_RANGO, umbral_paralelo=UMBRAL_PARALELO):
+    """
+    Importa productos desde un CSV en disco. Si el archivo supera `umbral_paralelo`
+    bytes y hay más de un proceso disponible, el parseo y la validación se reparten
+    en `procesos` procesos (por defecto, uno por núcleo); la escritura es la misma
+    que en importar_productos.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    if procesos > 1 and os.path.getsize(ruta) > umbral_paralelo:
+        logger.info(f"Importación CSV en paralelo - {procesos} procesos, archivo: {ruta}")
+        bloques = leer_bloques_paralelo(ruta, procesos, tamano_bloque, tamano_rango)
+        return _aplicar(bloques, al_avanzar, atomico)
+    with open(ruta, 'rb') as archivo:
+        return importar_productos(archivo, tamano_bloque, al_avanzar, atomico)
@@ -0,0 +1,54 @@
+"""
+Invalidación de caché dirigida por eventos de escritura.
+
+Las operaciones que modifican el inventario emiten un evento (`emitir('stock')`,
+`emitir('alertas')`) y aquí se traduce a las claves de caché afectadas, que se
+eliminan del backend compartido cuando la transacción confirma, junto con su
+generación (core/cache_protegido.py). Así ningún worker sirve datos anteriores a la
+escritura y un recálculo concurrente que leyó el estado previo al commit no lo
+vuelve a cachear.
+"""
+import logging
+from django.core.cache import cache
+from django.db import transaction
+from .cache_protegido import clave_generacion
+
+logger = logging.getLogger(__name__)
+
+CLAVE_DASHBOARD = 'metricas_dashboard'
+CLAVE_ALERTAS_ACTIVAS = 'alertas_activas'
+CLAVE_ESTADISTICAS = 'estadisticas_inventario'
+# Versión de los conteos de paginación cacheados (core/conteo.py): al borrarla, todos
+# los conteos guardados con la versión anterior quedan obsoletos
+CLAVE_VERSION_CONTEOS = 'conteos_version'
+# Versión del índice de códigos de barras de cada worker (core/codigos.py)
+CLAVE_VERSION_CODIGOS = 'codigos_version'
+
+# Evento -> claves de caché cuyo contenido depende de lo que cambió. Las alertas activas
+# cacheadas incluyen nombre, categoría y stock del producto (AlertaSerializer): también
+# dependen de los eventos 'stock' y 'productos'
+CLAVES_POR_EVENTO = {
+    'stock': (CLAVE_DASHBOARD, CLAVE_ESTADISTICAS, CLAVE_VERSION_CONTEOS, CLAVE_ALERTAS_ACTIVAS),
+    'alertas': (CLAVE_ALERTAS_ACTIVAS, CLAVE_DASHBOARD, CLAVE_VERSION_CONTEOS),
+    'productos': (
+        CLAVE_DASHBOARD, CLAVE_ESTADISTICAS, CLAVE_VERSION_CONTEOS, CLAVE_VERSION_CODIGOS, CLAVE_ALERTAS_ACTIVAS
+    ),
+}
+
+
+def _invalidar(evento, claves):
+    try:
+        cache.delete_many([*claves, *(clave_generacion(clave) for clave in claves)])
+        logger.debug(f"Caché invalidado por evento '{evento}': {', '.join(claves)}")
+    except Exception as e:
+        # Un backend caído no debe romper la escritura ya confirmada; el TTL acota el desfase
+        logger.error(f"Error al invalidar caché por evento '{evento}': {str(e)}")
+
+
+def emitir(evento):
+    """
+    Registra un evento de escritura; las claves afectadas se eliminan al confirmar
+    la transacción en curso (o de inmediato si no hay transacción abierta)
+    """
+    claves = CLAVES_POR_EVENTO[evento]
+    transaction.on_commit(lambda: _invalidar(evento, claves))
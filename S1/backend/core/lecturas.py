@@ -0,0 +1,251 @@
+"""
+Procesamiento incremental de lecturas de consumibles.
+Mantiene en memoria la última lectura de cada dispositivo (respaldada por la tabla
+SuministroDispositivo), descarta las lecturas que no cambiaron y escribe los cambios
+reales de un barrido completo en una sola transacción con operaciones bulk.
+
+`ultima_lectura` de dispositivos y consumibles se escribe en el barrido solo para los
+dispositivos con cambios; la de los demás se guarda en memoria y se descarga cada
+`descarga_cada` barridos (o con `descargar_vistos`), para no reescribir en cada barrido
+las filas de todos los dispositivos leídos.
+"""
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .models import Producto, Movimiento, Device, SuministroDispositivo, LecturaSuministro
+from .resumenes import acumular_movimientos
+from .alertas import reevaluar_alertas
+from .invalidacion import emitir
+
+logger = logging.getLogger(__name__)
+
+TOLERANCIA_UNIDADES = 1  # tolerancia en unidades para evitar ruidos
+DESCRIPCION_MOVIMIENTO = 'Auto-detect SNMP'
+DESCARGA_CADA = 10  # barridos entre escrituras de ultima_lectura de dispositivos sin cambios
+
+
+class ProcesadorLecturas:
+    """
+    Acumula las lecturas de un barrido y las aplica en lote
+
+    Uso:
+        procesador = ProcesadorLecturas()
+        procesador.cargar(dispositivos)
+        for device, lecturas in ...:
+            procesador.registrar(device, lecturas)
+        resultado = procesador.aplicar()
+
+    La instancia puede reutilizarse entre barridos: la última lectura de cada
+    dispositivo queda en memoria y solo se consulta la BD para dispositivos nuevos.
+    Quien la reutiliza debe llamar a `descargar_vistos()` al terminar.
+    """
+
+    def __init__(self, descarga_cada=DESCARGA_CADA):
+        self._ultimas = {}  # device_id -> {indice: SuministroDispositivo}
+        self._vistos = {}  # device_id -> fecha de la última lectura sin cambios aún no escrita
+        self.descarga_cada = descarga_cada
+        self._barridos = 0
+        self._reiniciar_lote()
+
+    def _reiniciar_lote(self):
+        self._nuevos = []
+        self._modificados = {}
+        self._cambios_nivel = []
+        self._lecturas = []
+        self._leidos = set()
+        self._cambiados = set()
+
+    def cargar(self, dispositivos):
+        """Precarga en una sola consulta la última lectura de los dispositivos que no están en memoria"""
+        ids = [d.pk for d in dispositivos if d.pk not in self._ultimas]
+        if not ids:
+            return
+        for device_id in ids:
+            self._ultimas[device_id] = {}
+        for suministro in SuministroDispositivo.objects.filter(dispositivo_id__in=ids):
+            self._ultimas[suministro.dispositivo_id][suministro.indice] = suministro
+
+    def porcentajes(self, device_id):
+        """Niveles en memoria (fracción 0..1) de la última lectura del dispositivo, por índice"""
+        return {
+            indice: suministro.porcentaje
+            for indice, suministro in self._ultimas.get(device_id, {}).items()
+            if suministro.porcentaje is not None
+        }
+
+    def registrar(self, device, lecturas):
+        """
+        Compara la lectura con la anterior y encola solo lo que cambió
+
+        Args:
+            device: Instancia Device leída
+            lecturas: Lista de dicts (indice, descripcion, nivel, capacidad) de read_all_supplies
+
+        Returns:
+            True si algún consumible cambió respecto de la última lectura
+        """
+        self._leidos.add(device.pk)
+        if device.pk not in self._ultimas:
+            self.cargar([device])
+        anteriores = self._ultimas[device.pk]
+
+        hubo_cambios = False
+        for lectura in lecturas:
+            descripcion = lectura['descripcion'][:255]
+            suministro = anteriores.get(lectura['indice'])
+            # La serie de tiempo guarda toda lectura medible, haya cambiado o no
+            if lectura['nivel'] >= 0:
+                self._lecturas.append((lectura['indice'], lectura['nivel'], lectura['capacidad'], device.pk))
+            if suministro is not None and (
+                suministro.nivel == lectura['nivel']
+                and suministro.capacidad_maxima == lectura['capacidad']
+                and suministro.descripcion == descripcion
+            ):
+                continue
+
+            hubo_cambios = True
+            if suministro is None:
+                suministro = SuministroDispositivo(dispositivo=device, indice=lectura['indice'])
+                anteriores[lectura['indice']] = suministro
+                self._nuevos.append(suministro)
+            elif suministro.pk:
+                self._modificados[suministro.pk] = suministro
+            suministro.descripcion = descripcion
+            suministro.nivel = lectura['nivel']
+            suministro.capacidad_maxima = lectura['capacidad']
+
+            # El consumible 1 usa el producto del dispositivo si no tiene uno propio
+            producto_id = suministro.producto_id or (device.producto_id if suministro.indice == 1 else None)
+            if producto_id and suministro.porcentaje is not None:
+                self._cambios_nivel.append((producto_id, suministro.porcentaje))
+
+        if hubo_cambios:
+            self._cambiados.add(device.pk)
+        return hubo_cambios
+
+    def aplicar(self):
+        """
+        Escribe el lote acumulado en una sola transacción
+
+        Returns:
+            Dict con `dispositivos` leídos, `con_cambios`, `sin_cambios` y la lista
+            de `movimientos` creados
+        """
+        resultado = {
+            'dispositivos': len(self._leidos),
+            'con_cambios': len(self._cambiados),
+            'sin_cambios': len(self._leidos) - len(self._cambiados),
+            'movimientos': [],
+        }
+        if not self._leidos:
+            return resultado
+
+        ahora = timezone.now()
+        try:
+            with transaction.atomic():
+                for suministro in self._nuevos:
+                    suministro.ultima_lectura = ahora
+                SuministroDispositivo.objects.bulk_create(self._nuevos)
+                SuministroDispositivo.objects.bulk_update(
+                    list(self._modificados.values()), ['descripcion', 'nivel', 'capacidad_maxima']
+                )
+                if self._cambiados:
+                    self._escribir_ultima_lectura(self._cambiados, ahora)
+                self._guardar_lecturas(ahora)
+
+                if self._cambios_nivel:
+                    resultado['movimientos'] = self._aplicar_stock()
+
+            # Sin pk no se podrá actualizar la fila en el próximo barrido: forzar recarga
+            for suministro in self._nuevos:
+                if suministro.pk is None:
+                    self._ultimas.pop(suministro.dispositivo_id, None)
+        except Exception:
+            # El estado en memoria ya no refleja la BD
+            self._ultimas.clear()
+            raise
+        finally:
+            for device_id in self._leidos - self._cambiados:
+                self._vistos[device_id] = ahora
+            for device_id in self._cambiados:
+                self._vistos.pop(device_id, None)
+            self._reiniciar_lote()
+
+        self._barridos += 1
+        if self._barridos >= self.descarga_cada:
+            self.descargar_vistos()
+        return resultado
+
+    def descargar_vistos(self):
+        """Escribe la ultima_lectura pendiente de los dispositivos leídos sin cambios"""
+        self._barridos = 0
+        if not self._vistos:
+            return 0
+        por_fecha = {}
+        for device_id, fecha in self._vistos.items():
+            por_fecha.setdefault(fecha, []).append(device_id)
+        with transaction.atomic():
+            for fecha, ids in por_fecha.items():
+                self._escribir_ultima_lectura(ids, fecha)
+        descargados = len(self._vistos)
+        self._vistos.clear()
+        return descargados
+
+    def _escribir_ultima_lectura(self, ids, fecha):
+        Device.objects.filter(pk__in=ids).update(ultima_lectura=fecha)
+        SuministroDispositivo.objects.filter(dispositivo_id__in=ids).update(ultima_lectura=fecha)
+
+    def _guardar_lecturas(self, ahora):
+        """Agrega las lecturas del barrido a la serie de tiempo en un solo INSERT por lote"""
+        lecturas = []
+        for indice, nivel, capacidad, device_id in self._lecturas:
+            suministro = self._ultimas.get(device_id, {}).get(indice)
+            if suministro is None or suministro.pk is None:
+                continue
+            lecturas.append(LecturaSuministro(
+                suministro_id=suministro.pk, fecha=ahora, nivel=nivel, capacidad_maxima=capacidad
+            ))
+        LecturaSuministro.objects.bulk_create(lecturas, batch_size=1000)
+
+    def _aplicar_stock(self):
+        """Convierte los cambios de nivel en movimientos y actualiza stock en bloque"""
+        ids = sorted({producto_id for producto_id, _ in self._cambios_nivel})
+        productos = {
+            p.pk: p for p in Producto.objects.select_for_update().filter(pk__in=ids).order_by('pk')
+        }
+
+        movimientos = []
+        tocados = {}
+        for producto_id, porcentaje in self._cambios_nivel:
+            producto = productos.get(producto_id)
+            if producto is None:
+                continue
+
+            # Mapear percent a unidades (aquí asumimos que product.stock representa unidades de cartucho)
+            nuevas_unidades = int(round(porcentaje * producto.stock))
+            delta = producto.stock - nuevas_unidades
+            if abs(delta) <= TOLERANCIA_UNIDADES:
+                continue
+
+            producto.stock -= delta
+            movimientos.append(Movimiento(
+                producto=producto,
+                tipo='SALIDA' if delta > 0 else 'ENTRADA',
+                cantidad=abs(delta),
+                descripcion=DESCRIPCION_MOVIMIENTO,
+                usuario='Sistema'
+            ))
+            tocados[producto.pk] = producto
+
+        Movimiento.objects.bulk_create(movimientos)
+        acumular_movimientos(movimientos)
+        if movimientos:
+            emitir('stock')
+        Producto.objects.bulk_update(list(tocados.values()), ['stock'])
+        reevaluar_alertas(list(tocados))
+
+        logger.info(
+            f"Lote de sondeo aplicado - Movimientos: {len(movimientos)}, "
+            f"Productos actualizados: {len(tocados)}"
+        )
+        return movimientos
@@ -0,0 +1,328 @@
+"""
+Libro de stock: el stock derivado de los movimientos, con cortes periódicos.
+
+La tabla Movimiento es el libro (solo inserción en modo estricto) y `Producto.stock` es
+una proyección que se mantiene en la misma transacción de cada movimiento. El stock de
+un producto a una fecha se deriva así:
+
+    stock(fecha) = stock del último CorteStock con fecha <= fecha
+                   + entradas - salidas con fecha en (corte, fecha]
+
+de modo que una consulta a cualquier fecha recorre solo los movimientos posteriores al
+último corte (índice (producto, fecha) de Movimiento), no toda la historia.
+
+- `tomar_cortes`: trabajo periódico (comando `tomar_cortes_stock`); escribe un corte
+  solo para los productos con movimientos desde su corte anterior
+- `stock_a_fecha`: stock de un producto a una fecha
+- `anotar_stock_libro`: el mismo cálculo como subconsultas correlacionadas sobre un
+  queryset de productos (conjuntos de productos en una sola consulta)
+- `buscar_desfases` / `reconciliar`: productos cuyo `stock` no coincide con el libro y
+  su reparación por lotes de productos (comando `reconciliar_stock`)
+
+Al crear un producto con stock se escribe un corte de apertura (`abrir_saldos`) con ese
+stock a su fecha de creación: sin él el libro no conoce el stock inicial y derivaría
+stock negativo tras la primera salida. La migración 0017 abrió los productos existentes.
+
+Con LIBRO_STOCK_ESTRICTO=True los movimientos no se editan ni se eliminan por la API
+y todo cambio posterior de stock (edición de productos, importaciones, movimientos
+directos) queda registrado como movimiento.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import CorteStock, Movimiento, Producto
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 1000
+# Los cortes se toman con este desfase respecto de ahora: una transacción que aún no
+# confirma un movimiento con fecha anterior al corte quedaría fuera de él
+MARGEN_CORTE = timedelta(minutes=5)
+# Fecha anterior a cualquier movimiento, para productos sin cortes
+ORIGEN = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+DESCRIPCION_RECONCILIACION = 'Reconciliación de stock'
+
+
+def modo_estricto():
+    """Indica si el libro es de solo inserción (setting LIBRO_STOCK_ESTRICTO)"""
+    return getattr(settings, 'LIBRO_STOCK_ESTRICTO', False)
+
+
+def neto_movimientos():
+    """Entradas menos salidas, como agregado"""
+    return Sum(Case(
+        When(tipo='ENTRADA', then=F('cantidad')),
+        default=-F('cantidad'),
+        output_field=IntegerField()
+    ))
+
+
+def anotar_stock_libro(productos, hasta=None, usar_cortes=True):
+    """
+    Agrega `stock_libro` (stock derivado del libro a la fecha `hasta`, o actual) a un
+    queryset de productos, además de `corte_fecha`, `corte_stock` y `neto_libro` (neto de
+    los movimientos posteriores al corte; None si no hubo)
+
+    Args:
+        usar_cortes: Con False se suma toda la historia de movimientos (verificación completa)
+    """
+    movimientos = Movimiento.objects.filter(producto=OuterRef('pk'))
+    if hasta is not None:
+        movimientos = movimientos.filter(fecha__lte=hasta)
+
+    if usar_cortes:
+        cortes = CorteStock.objects.filter(producto=OuterRef('pk'))
+        if hasta is not None:
+            cortes = cortes.filter(fecha__lte=hasta)
+        cortes = cortes.order_by('-fecha')
+        productos = productos.annotate(
+            corte_fecha=Subquery(cortes.values('fecha')[:1]),
+            corte_stock=Subquery(cortes.values('stock')[:1]),
+        )
+        movimientos = movimientos.filter(fecha__gt=Coalesce(OuterRef('corte_fecha'), Value(ORIGEN)))
+    else:
+        productos = productos.annotate(
+            corte_fecha=Value(None, output_field=CorteStock._meta.get_field('fecha')),
+            corte_stock=Value(None, output_field=IntegerField()),
+        )
+
+    neto = movimientos.order_by().values('producto').annotate(neto=neto_movimientos()).values('neto')
+    return productos.annotate(
+        neto_libro=Subquery(neto, output_field=IntegerField()),
+    ).annotate(
+        stock_libro=Coalesce('corte_stock', 0) + Coalesce('neto_libro', 0),
+    )
+
+
+def stock_a_fecha(producto_id, fecha=None):
+    """
+    Stock del producto a `fecha` (actual si es None) según el libro: último corte
+    anterior más los movimientos desde ese corte
+
+    Returns:
+        El stock, o None si el producto no existe
+    """
+    if not Producto.objects.filter(pk=producto_id).exists():
+        return None
+    cortes = CorteStock.objects.filter(producto_id=producto_id)
+    movimientos = Movimiento.objects.filter(producto_id=producto_id)
+    if fecha is not None:
+        cortes = cortes.filter(fecha__lte=fecha)
+        movimientos = movimientos.filter(fecha__lte=fecha)
+    corte = cortes.order_by('-fecha').values_list('fecha', 'stock').first()
+    if corte:
+        movimientos = movimientos.filter(fecha__gt=corte[0])
+    neto = movimientos.aggregate(neto=neto_movimientos())['neto'] or 0
+    return (corte[1] if corte else 0) + neto
+
+
+def _por_lotes(productos, tamano_lote):
+    """Recorre un queryset de productos en lotes por clave primaria (sin OFFSET)"""
+    ultimo = 0
+    while True:
+        lote = list(productos.filter(pk__gt=ultimo).order_by('pk')[:tamano_lote])
+        if not lote:
+            return
+        yield lote
+        ultimo = lote[-1]['pk'] if isinstance(lote[-1], dict) else lote[-1].pk
+
+
+def tomar_cortes(hasta=None, tamano_lote=TAMANO_LOTE):
+    """
+    Escribe un corte a la fecha `hasta` (por defecto ahora menos MARGEN_CORTE) para cada
+    producto con movimientos desde su corte anterior. Es incremental e idempotente: los
+    productos sin movimientos nuevos conservan su último corte, que sigue vigente.
+
+    Returns:
+        Cantidad de cortes escritos
+
+    Raises:
+        ValueError: Si `hasta` es futura
+    """
+    if hasta is not None and hasta > timezone.now():
+        # Un movimiento posterior con fecha anterior al corte quedaría fuera de él
+        raise ValueError('La fecha de corte no puede ser futura')
+    hasta = hasta or timezone.now() - MARGEN_CORTE
+    pendientes = anotar_stock_libro(Producto.objects.order_by(), hasta=hasta).filter(
+        neto_libro__isnull=False
+    ).values('pk', 'stock_libro')
+
+    escritos = 0
+    for lote in _por_lotes(pendientes, tamano_lote):
+        with transaction.atomic():
+            CorteStock.objects.bulk_create(
+                [CorteStock(producto_id=fila['pk'], fecha=hasta, stock=fila['stock_libro']) for fila in lote],
+                ignore_conflicts=True,
+            )
+        escritos += len(lote)
+
+    logger.info(f"Cortes de stock tomados - Fecha: {hasta.isoformat()}, Productos: {escritos}")
+    return escritos
+
+
+def abrir_saldos(productos):
+    """
+    Escribe el corte de apertura (stock inicial a la fecha de creación) de productos
+    recién creados con stock distinto de cero
+
+    Returns:
+        Cantidad de cortes escritos
+    """
+    aperturas = [
+        CorteStock(producto_id=producto.pk, fecha=producto.fecha_creacion, stock=producto.stock)
+        for producto in productos if producto.stock
+    ]
+    CorteStock.objects.bulk_create(aperturas, batch_size=TAMANO_LOTE, ignore_conflicts=True)
+    return len(aperturas)
+
+
+def invalidar_cortes(producto_id, desde):
+    """
+    Elimina los cortes del producto posteriores a un cambio en su historia (desde `desde`),
+    salvo el de apertura: el stock inicial no depende de los movimientos
+    """
+    creacion = Producto.objects.filter(pk=producto_id).values('fecha_creacion')
+    eliminados, _ = CorteStock.objects.filter(producto_id=producto_id, fecha__gte=desde).exclude(
+        fecha__lte=Subquery(creacion)
+    ).delete()
+    if eliminados:
+        logger.info(f"Cortes invalidados - Producto: {producto_id}, Desde: {desde.isoformat()}, Cortes: {eliminados}")
+    return eliminados
+
+
+def registrar_diferencias(cambios, descripcion, usuario=None):
+    """
+    Registra en el libro cambios de stock ya aplicados a los productos
+
+    Args:
+        cambios: Iterable de (producto_id, stock_anterior, stock_nuevo)
+
+    Returns:
+        Lista de Movimiento creados (uno por producto cuyo stock cambió)
+    """
+    from .resumenes import acumular_movimientos
+
+    movimientos = [
+        Movimiento(
+            producto_id=producto_id,
+            tipo='ENTRADA' if nuevo > anterior else 'SALIDA',
+            cantidad=abs(nuevo - anterior),
+            descripcion=descripcion,
+            usuario=usuario or 'Sistema'
+        )
+        for producto_id, anterior, nuevo in cambios if nuevo != anterior
+    ]
+    if not movimientos:
+        return []
+    with transaction.atomic():
+        movimientos = Movimiento.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+        acumular_movimientos(movimientos)
+    return movimientos
+
+
+def buscar_desfases(usar_cortes=True, tamano_lote=TAMANO_LOTE):
+    """
+    Productos cuyo `stock` difiere del libro, un lote de productos por consulta
+
+    Yields:
+        Dicts con producto, stock, stock_libro y diferencia (stock_libro - stock)
+    """
+    desfasados = anotar_stock_libro(Producto.objects.order_by(), usar_cortes=usar_cortes).exclude(
+        stock=F('stock_libro')
+    ).values('pk', 'stock', 'stock_libro')
+    for lote in _por_lotes(desfasados, tamano_lote):
+        for fila in lote:
+            yield {
+                'producto': fila['pk'],
+                'stock': fila['stock'],
+                'stock_libro': fila['stock_libro'],
+                'diferencia': fila['stock_libro'] - fila['stock'],
+            }
+
+
+def _corregir_al_libro(lote):
+    """
+    Lleva el stock de un lote de productos al valor del libro en un solo UPDATE, sin
+    dejar stock negativo (dentro de una transacción: las filas quedan bloqueadas entre
+    la verificación y el UPDATE)
+
+    Returns:
+        Ids de los productos corregidos
+    """
+    # stock + diferencia (no el valor leído): un movimiento concurrente mueve stock y
+    # libro por igual, y la diferencia sigue siendo válida
+    diferencia = Case(
+        *[When(pk=desfase['producto'], then=Value(desfase['diferencia'])) for desfase in lote],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    filas = Producto.objects.filter(pk__in=[desfase['producto'] for desfase in lote]).annotate(
+        corregido=F('stock') + diferencia
+    ).filter(corregido__gte=0)
+    ids = list(filas.select_for_update().values_list('pk', flat=True))
+    Producto.objects.filter(pk__in=ids).update(stock=F('stock') + diferencia)
+    return ids
+
+
+def reconciliar(reparar=False, fuente='stock', usar_cortes=True, tamano_lote=TAMANO_LOTE):
+    """
+    Busca productos con el stock desfasado respecto del libro y opcionalmente los repara
+
+    Args:
+        reparar: Con False solo informa
+        fuente: 'stock' (por defecto) conserva el stock guardado y agrega al libro un
+            movimiento compensatorio por la diferencia; 'libro' corrige `Producto.stock`
+            al valor del libro, solo en modo estricto (fuera de él el stock editado
+            directamente es legítimo y el libro no lo conoce) y nunca a un valor negativo
+        usar_cortes: Con False compara contra toda la historia de movimientos
+
+    Returns:
+        Dict con `revisados`, `desfases` (lista de dicts de `buscar_desfases`), `reparados`
+        y `omitidos` (ids que no se corrigieron porque quedarían con stock negativo)
+
+    Raises:
+        ValueError: Si la fuente no es válida o es 'libro' fuera del modo estricto
+    """
+    from .alertas import reevaluar_alertas
+    from .invalidacion import emitir
+
+    if fuente not in ('libro', 'stock'):
+        raise ValueError("La fuente debe ser 'libro' o 'stock'")
+    if fuente == 'libro' and reparar and not modo_estricto():
+        raise ValueError("Corregir el stock al libro requiere LIBRO_STOCK_ESTRICTO=True; use la fuente 'stock'")
+
+    desfases = list(buscar_desfases(usar_cortes=usar_cortes, tamano_lote=tamano_lote))
+    reparados = 0
+    omitidos = []
+    if reparar and desfases:
+        for inicio in range(0, len(desfases), tamano_lote):
+            lote = desfases[inicio:inicio + tamano_lote]
+            with transaction.atomic():
+                if fuente == 'libro':
+                    corregidos = _corregir_al_libro(lote)
+                    omitidos.extend(sorted({d['producto'] for d in lote} - set(corregidos)))
+                    reparados += len(corregidos)
+                    reevaluar_alertas(corregidos)
+                else:
+                    reparados += len(registrar_diferencias(
+                        [(d['producto'], d['stock_libro'], d['stock']) for d in lote],
+                        DESCRIPCION_RECONCILIACION
+                    ))
+                emitir('stock')
+        if omitidos:
+            logger.warning(f"Reconciliación: {len(omitidos)} producto(s) quedarían con stock negativo, no se corrigen")
+
+    logger.info(
+        f"Reconciliación de stock - Desfases: {len(desfases)}, Reparados: {reparados}, "
+        f"Omitidos: {len(omitidos)}, Fuente: {fuente}, Cortes: {usar_cortes}"
+    )
+    return {
+        'revisados': Producto.objects.count(),
+        'desfases': desfases,
+        'reparados': reparados,
+        'omitidos': omitidos,
+    }
@@ -0,0 +1,98 @@
+"""
+Movimientos de stock por lote (recepción de pallets, tomas de inventario).
+
+`registrar_lote` aplica cientos de entradas y salidas en una sola transacción:
+- bloquea todos los productos tocados con un único SELECT ... FOR UPDATE ordenado por id
+  (dos lotes concurrentes siempre toman los bloqueos en el mismo orden: sin deadlocks)
+- aplica los ítems en orden sobre el stock bloqueado, de modo que una salida puede usar
+  lo que ingresó un ítem anterior del mismo lote
+- inserta los movimientos con bulk_create, actualiza el stock con bulk_update, evalúa
+  las alertas de todos los productos en un UPDATE y los resúmenes una vez por producto
+
+El lote es todo o nada: si algún ítem falla (producto inexistente, stock insuficiente)
+no se escribe nada y se informan los errores de cada ítem.
+"""
+import logging
+from django.db import transaction
+from .invalidacion import emitir
+from .models import Movimiento, Producto
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS_LOTE = 1000
+
+
+class LoteInvalido(ValueError):
+    """El lote no se aplicó; `errores` es una lista de {'indice', 'error'} por ítem fallido"""
+
+    def __init__(self, errores):
+        super().__init__(f'{len(errores)} ítem(s) con errores')
+        self.errores = errores
+
+
+def registrar_lote(items, usuario=None):
+    """
+    Aplica un lote de movimientos validado por MovimientoLoteSerializer
+
+    Args:
+        items: Lista de dicts con producto (id), tipo, cantidad y descripcion
+
+    Returns:
+        Lista de Movimiento creados, en el orden de `items`
+
+    Raises:
+        LoteInvalido: Si algún ítem no puede aplicarse (no se escribe nada)
+    """
+    from .alertas import reevaluar_alertas
+    from .resumenes import acumular_movimientos
+
+    if len(items) > MAX_ITEMS_LOTE:
+        raise ValueError(f'El lote no puede superar {MAX_ITEMS_LOTE} movimientos')
+
+    with transaction.atomic():
+        ids = sorted({item['producto'] for item in items})
+        productos = {p.pk: p for p in Producto.objects.select_for_update().filter(pk__in=ids).order_by('pk')}
+
+        errores = []
+        movimientos = []
+        for indice, item in enumerate(items):
+            producto = productos.get(item['producto'])
+            if producto is None:
+                errores.append({'indice': indice, 'error': f"No existe el producto {item['producto']}"})
+                continue
+            cantidad = item['cantidad']
+            if item['tipo'] == 'SALIDA':
+                if cantidad > producto.stock:
+                    errores.append({
+                        'indice': indice,
+                        'error': (
+                            f"Stock insuficiente para '{producto.nombre}'. "
+                            f"Disponible: {producto.stock}, Solicitado: {cantidad}"
+                        )
+                    })
+                    continue
+                producto.stock -= cantidad
+            else:
+                producto.stock += cantidad
+            movimientos.append(Movimiento(
+                producto=producto,
+                tipo=item['tipo'],
+                cantidad=cantidad,
+                descripcion=item['descripcion'],
+                usuario=usuario or 'Sistema'
+            ))
+
+        if errores:
+            # Nada se escribió todavía: basta con no continuar para que el lote no se aplique
+            logger.warning(f"Lote rechazado - Ítems: {len(items)}, Errores: {len(errores)}")
+            raise LoteInvalido(errores)
+
+        movimientos = Movimiento.objects.bulk_create(movimientos)
+        tocados = list(productos.values())
+        Producto.objects.bulk_update(tocados, ['stock'])
+        reevaluar_alertas([producto.pk for producto in tocados])
+        acumular_movimientos(movimientos)
+        emitir('stock')
+
+    logger.info(f"Lote registrado - Movimientos: {len(movimientos)}, Productos: {len(tocados)}")
+    return movimientos
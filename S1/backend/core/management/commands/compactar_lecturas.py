@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from core.series_tiempo import (
+    consolidar_por_hora,
+    consolidar_por_dia,
+    podar,
+    RETENCION_CRUDAS_DIAS,
+    RETENCION_HORAS_DIAS,
+    RETENCION_DIAS_DIAS,
+)
+
+
+class Command(BaseCommand):
+    help = 'Consolida las lecturas de consumibles en resúmenes horarios/diarios y poda según retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retencion-crudas',
+            type=int,
+            default=RETENCION_CRUDAS_DIAS,
+            help='Días que se conservan las lecturas crudas',
+        )
+        parser.add_argument(
+            '--retencion-horas',
+            type=int,
+            default=RETENCION_HORAS_DIAS,
+            help='Días que se conservan los resúmenes horarios',
+        )
+        parser.add_argument(
+            '--retencion-dias',
+            type=int,
+            default=RETENCION_DIAS_DIAS,
+            help='Días que se conservan los resúmenes diarios',
+        )
+        parser.add_argument(
+            '--sin-poda',
+            action='store_true',
+            help='Solo consolidar, sin eliminar datos antiguos',
+        )
+
+    def handle(self, *args, **options):
+        horas = consolidar_por_hora()
+        dias = consolidar_por_dia()
+        self.stdout.write(f'Resúmenes escritos: {horas} horarios, {dias} diarios')
+
+        if options['sin_poda']:
+            return
+
+        eliminadas = podar(
+            crudas_dias=options['retencion_crudas'],
+            horas_dias=options['retencion_horas'],
+            dias_dias=options['retencion_dias'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Poda completada: {eliminadas['crudas']} lecturas, "
+            f"{eliminadas['horas']} resúmenes horarios, {eliminadas['dias']} resúmenes diarios"
+        ))
@@ -0,0 +1,119 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from core.estres import MEZCLA_POR_DEFECTO, ejecutar_estres
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés de concurrencia: hilos o procesos con entradas, salidas y ajustes '
+        'simultáneos; reporta rendimiento, latencias, bloqueos, deadlocks e invariantes de stock'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=8,
+            help='Trabajadores concurrentes',
+        )
+        parser.add_argument(
+            '--procesos',
+            action='store_true',
+            help='Usar procesos en lugar de hilos (requiere una base compartida: PostgreSQL o SQLite en archivo)',
+        )
+        parser.add_argument(
+            '--operaciones',
+            type=int,
+            default=100,
+            help='Operaciones por trabajador',
+        )
+        parser.add_argument(
+            '--productos',
+            type=int,
+            default=5,
+            help='Productos de prueba en disputa (menos productos = más contención)',
+        )
+        parser.add_argument(
+            '--stock-inicial',
+            type=int,
+            default=20,
+            help='Stock inicial de cada producto de prueba',
+        )
+        parser.add_argument(
+            '--mezcla',
+            default=','.join(str(peso) for peso in MEZCLA_POR_DEFECTO),
+            help='Pesos de entrada,salida,ajuste (p. ej. 45,45,10)',
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=None,
+            help='Semilla aleatoria para repetir una corrida',
+        )
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='No eliminar los productos y movimientos de prueba al terminar',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Imprimir el reporte completo en JSON',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mezcla = tuple(int(peso) for peso in options['mezcla'].split(','))
+        except ValueError:
+            raise CommandError('--mezcla debe tener tres enteros separados por comas')
+        if len(mezcla) != 3 or sum(mezcla) <= 0:
+            raise CommandError('--mezcla debe tener tres enteros separados por comas')
+
+        reporte = ejecutar_estres(
+            hilos=options['hilos'],
+            operaciones=options['operaciones'],
+            productos=options['productos'],
+            stock_inicial=options['stock_inicial'],
+            mezcla=mezcla,
+            procesos=options['procesos'],
+            semilla=options['semilla'],
+            conservar=options['conservar'],
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, indent=2, ensure_ascii=False))
+        else:
+            latencias = reporte['latencias']
+            self.stdout.write(
+                f"Motor: {reporte['motor']} ({reporte['trabajadores']} {reporte['modo']}, "
+                f"{reporte['productos']} productos, semilla {reporte['semilla']})"
+            )
+            self.stdout.write(
+                f"Operaciones: {reporte['operaciones']} en {reporte['duracion_s']}s "
+                f"({reporte['operaciones_por_segundo']} op/s)"
+            )
+            self.stdout.write(
+                f"Latencia: p50 {latencias['p50_ms']} ms, p95 {latencias['p95_ms']} ms, p99 {latencias['p99_ms']} ms"
+            )
+            for operacion, datos in reporte['latencias_por_operacion'].items():
+                self.stdout.write(
+                    f"  {operacion}: {datos['cantidad']} ops, p50 {datos['p50_ms']} ms, "
+                    f"p95 {datos['p95_ms']} ms, p99 {datos['p99_ms']} ms"
+                )
+            self.stdout.write(
+                f"Rechazadas por stock: {reporte['rechazadas_stock_insuficiente']}, "
+                f"Esperas por bloqueo: {reporte['esperas_bloqueo']}, Deadlocks: {reporte['deadlocks']}, "
+                f"Errores: {reporte['errores']}"
+            )
+            if reporte['locks_en_espera'] is not None:
+                locks = reporte['locks_en_espera']
+                self.stdout.write(
+                    f"Locks en espera (pg_locks): {locks['muestras_con_espera']}/{locks['muestras']} muestras, "
+                    f"máximo {locks['maximo']}; deadlocks en pg_stat_database: {reporte['deadlocks_postgresql']}"
+                )
+
+        invariantes = reporte['invariantes']
+        if not (invariantes['stock_igual_movimientos'] and invariantes['stock_no_negativo']):
+            raise CommandError(f"Invariantes de stock violadas: {invariantes}")
+        self.stdout.write(self.style.SUCCESS('Invariantes OK: stock = suma de movimientos y nunca negativo'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from core.valorizacion import generar_inventario_diario
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera el inventario al cierre de cada día pendiente (stock y valor por producto) '
+        'a partir del día anterior y los movimientos del día; programar en cron cada noche'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            help='Primer día a (re)generar, YYYY-MM-DD (por defecto el siguiente al último generado)',
+        )
+        parser.add_argument(
+            '--hasta',
+            help='Último día a generar, YYYY-MM-DD (por defecto ayer)',
+        )
+
+    def _fecha(self, valor):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f'Fecha inválida: {valor}')
+        return fecha
+
+    def handle(self, *args, **options):
+        try:
+            dias = generar_inventario_diario(
+                hasta=self._fecha(options['hasta']),
+                desde=self._fecha(options['desde']),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Días de inventario generados: {dias}'))
@@ -0,0 +1,62 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.importacion import importar_ruta, TAMANO_BLOQUE, TAMANO_RANGO, UMBRAL_PARALELO
+
+ERRORES_A_MOSTRAR = 20
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un CSV (nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV')
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=0,
+            help='Procesos que parsean y validan en paralelo; 0 = uno por núcleo, 1 = secuencial',
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help='Filas por bloque de escritura',
+        )
+        parser.add_argument(
+            '--rango-mb',
+            type=float,
+            default=TAMANO_RANGO / (1024 * 1024),
+            help='MB de CSV que parsea cada proceso por vez',
+        )
+        parser.add_argument(
+            '--por-bloque',
+            action='store_true',
+            help='Confirmar cada bloque por separado en lugar de una sola transacción',
+        )
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        if not os.path.isfile(ruta):
+            raise CommandError(f'No existe el archivo: {ruta}')
+
+        inicio = time.time()
+        resultado = importar_ruta(
+            ruta,
+            procesos=options['procesos'] or None,
+            tamano_bloque=options['bloque'],
+            atomico=not options['por_bloque'],
+            tamano_rango=int(options['rango_mb'] * 1024 * 1024),
+            umbral_paralelo=min(UMBRAL_PARALELO, int(options['rango_mb'] * 1024 * 1024)),
+        )
+        transcurrido = time.time() - inicio
+
+        for error in resultado['errores'][:ERRORES_A_MOSTRAR]:
+            self.stdout.write(self.style.WARNING(error))
+        if len(resultado['errores']) > ERRORES_A_MOSTRAR:
+            self.stdout.write(f"... y {len(resultado['errores']) - ERRORES_A_MOSTRAR} errores más")
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada en {transcurrido:.1f}s - Creados: {resultado['creados']}, "
+            f"Actualizados: {resultado['actualizados']}, Errores: {len(resultado['errores'])}"
+        ))
@@ -1,51 +1,196 @@
+import signal
+import time
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
+from django.db import close_old_connections
 from core.models import Device
-from core.adapters.snmp_adapter import read_supply
+from core.lecturas import ProcesadorLecturas
+from core.planificador import PlanificadorSondeo, publicar_metricas
+from core.adapters.snmp_adapter import read_all_supplies, obtener_adaptador
+from core.adapters.sondeo import leer_en_paralelo, CONCURRENCIA_POR_DEFECTO, PLAZO_POR_DEFECTO
+
+SNMP_REINTENTOS = 1
+
+
+def leer_dispositivo(device, plazo):
+    """Despacha la lectura según el protocolo del dispositivo, respetando el plazo por host"""
+    if device.protocolo.upper() == 'SNMP':
+        # Repartir el plazo entre el intento inicial y los reintentos
+        timeout = plazo / (SNMP_REINTENTOS + 1)
+        return read_all_supplies(device, timeout=timeout, retries=SNMP_REINTENTOS)
+    # agregar otros adapters según protocolo (IPP, API, etc.)
+    return None
 
 
 class Command(BaseCommand):
     help = 'Poll devices (printers) and update mapped product stock using adapters'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=CONCURRENCIA_POR_DEFECTO,
+            help='Número máximo de dispositivos consultados en paralelo',
+        )
+        parser.add_argument(
+            '--plazo',
+            type=float,
+            default=PLAZO_POR_DEFECTO,
+            help='Segundos máximos por dispositivo antes de considerarlo sin respuesta',
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Ejecutar de forma continua, leyendo cada dispositivo según su propio intervalo',
+        )
+        parser.add_argument(
+            '--recarga',
+            type=float,
+            default=60.0,
+            help='(daemon) Segundos entre recargas de la lista de dispositivos activos',
+        )
+        parser.add_argument(
+            '--ciclos',
+            type=int,
+            default=0,
+            help='(daemon) Detenerse tras N ciclos de lectura; 0 = sin límite',
+        )
+
     def handle(self, *args, **options):
-        devices = Device.objects.filter(activo=True)
-        for device in devices:
-            self.stdout.write(f'Polling {device}...')
-            res = None
-            if device.protocol.upper() == 'SNMP':
-                res = read_supply(device)
-            # agregar otros adapters según protocol (IPP, API, etc.)
-
-            if not res:
+        if options['daemon']:
+            return self._ejecutar_daemon(options)
+
+        devices = list(Device.objects.filter(activo=True))
+        # Un barrido único no tiene barridos siguientes a los que diferir ultima_lectura
+        procesador = ProcesadorLecturas(descarga_cada=1)
+        procesador.cargar(devices)
+
+        inicio = time.monotonic()
+        sin_lectura = 0
+
+        # Las lecturas corren en paralelo; se comparan con la anterior en este hilo
+        # y solo los cambios se escriben, todos juntos, al final del barrido
+        for device, suministros in leer_en_paralelo(devices, leer_dispositivo, options['concurrencia'], options['plazo']):
+            if not suministros:
                 self.stdout.write(self.style.WARNING(f'No lectura válida para {device}'))
+                sin_lectura += 1
                 continue
+            if procesador.registrar(device, suministros) and options['verbosity'] > 1:
+                self.stdout.write(f'Cambios de nivel en {device}')
+
+        resultado = procesador.aplicar()
+
+        for movimiento in resultado['movimientos']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Registrada {movimiento.tipo} {movimiento.cantidad} para {movimiento.producto}'
+            ))
+
+        self.stdout.write(
+            f'Sondeo completado: {len(devices)} dispositivos en {time.monotonic() - inicio:.2f}s '
+            f'({sin_lectura} sin lectura válida, {resultado["sin_cambios"]} sin cambios, '
+            f'{resultado["con_cambios"]} con cambios)'
+        )
+
+        self._escribir_latencia_snmp()
 
-            value, max_value = res
-            if max_value == 0:
-                self.stdout.write(self.style.WARNING(f'Max capacity 0 for {device}'))
+    def _escribir_latencia_snmp(self):
+        stats = obtener_adaptador().estadisticas()
+        if stats['consultas']:
+            latencia = stats['latencia_ms']
+            self.stdout.write(
+                f"Latencia SNMP: {stats['consultas']} consultas, {stats['errores']} errores, "
+                f"p50={latencia['p50']}ms p95={latencia['p95']}ms max={latencia['max']}ms"
+            )
+
+    def _ejecutar_daemon(self, options):
+        """
+        Bucle continuo: cada dispositivo se lee cuando vence su hora en la cola de prioridad.
+        La tabla Device solo se vuelve a consultar cada `--recarga` segundos.
+        """
+        planificador = PlanificadorSondeo()
+        procesador = ProcesadorLecturas()
+        dispositivos = {}
+        proxima_recarga = 0
+        ciclos = 0
+
+        self._detener = False
+        try:
+            handler_anterior = signal.signal(signal.SIGTERM, lambda *args: setattr(self, '_detener', True))
+        except ValueError:
+            handler_anterior = None  # signal solo puede registrarse desde el hilo principal
+
+        self.stdout.write('Daemon de sondeo iniciado')
+        try:
+            while not self._detener:
+                ahora = time.monotonic()
+                if ahora >= proxima_recarga:
+                    close_old_connections()
+                    dispositivos = self._sincronizar_dispositivos(planificador, ahora)
+                    proxima_recarga = ahora + options['recarga']
+
+                vencidos = [dispositivos[i] for i in planificador.extraer_vencidos(ahora) if i in dispositivos]
+                if not vencidos:
+                    espera = planificador.espera(ahora)
+                    # Dormir como máximo 1s para atender SIGTERM y recargas a tiempo
+                    time.sleep(max(0.0, min(1.0, proxima_recarga - ahora, espera if espera is not None else 1.0)))
+                    continue
+
+                self._ciclo_daemon(vencidos, planificador, procesador, options)
+                ciclos += 1
+                if options['ciclos'] and ciclos >= options['ciclos']:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if handler_anterior is not None:
+                signal.signal(signal.SIGTERM, handler_anterior)
+            procesador.descargar_vistos()
+
+        self.stdout.write(f'Daemon de sondeo detenido tras {ciclos} ciclos')
+
+    def _sincronizar_dispositivos(self, planificador, ahora):
+        """Alinea la planificación con los dispositivos activos en BD (altas, bajas e intervalos)"""
+        dispositivos = {d.pk: d for d in Device.objects.filter(activo=True)}
+        for device_id in planificador.ids():
+            if device_id not in dispositivos:
+                planificador.quitar(device_id)
+        for device in dispositivos.values():
+            planificador.agregar(device.pk, device.intervalo_sondeo, ahora)
+        return dispositivos
+
+    def _ciclo_daemon(self, vencidos, planificador, procesador, options):
+        """Lee los dispositivos vencidos, aplica los cambios y reprograma cada uno"""
+        procesador.cargar(vencidos)
+        anteriores = {device.pk: procesador.porcentajes(device.pk) for device in vencidos}
+        fallidos = 0
+
+        for device, suministros in leer_en_paralelo(vencidos, leer_dispositivo, options['concurrencia'], options['plazo']):
+            if not suministros:
+                fallidos += 1
+                planificador.registrar_fallo(device.pk, time.monotonic())
                 continue
+            procesador.registrar(device, suministros)
+            antes = anteriores[device.pk]
+            caida = max(
+                (antes[indice] - porcentaje for indice, porcentaje in procesador.porcentajes(device.pk).items()
+                 if indice in antes),
+                default=0.0
+            )
+            planificador.registrar_exito(device.pk, time.monotonic(), caida)
+
+        resultado = procesador.aplicar()
+
+        metricas = planificador.metricas(time.monotonic())
+        metricas['ultimo_ciclo'] = {
+            'leidos': len(vencidos),
+            'fallidos': fallidos,
+            'con_cambios': resultado['con_cambios'],
+            'movimientos': len(resultado['movimientos']),
+        }
+        publicar_metricas(metricas, max(300, options['recarga'] * 5))
 
-            percent = value / max_value
-            product = device.producto
-
-            # Mapear percent a unidades (aquí asumimos que product.stock representa unidades de cartucho)
-            # Si deseas usar otra lógica, ajusta product.max_units o similar.
-            new_units = int(round(percent * product.stock))
-
-            delta = product.stock - new_units
-            tolerance = 1  # tolerancia en unidades para evitar ruidos
-
-            try:
-                if delta > tolerance:
-                    product.registrar_salida(delta, descripcion='Auto-detect SNMP')
-                    self.stdout.write(self.style.SUCCESS(f'Registrada SALIDA {delta} para {product}'))
-                elif delta < -tolerance:
-                    product.registrar_entrada(-delta, descripcion='Auto-detect SNMP')
-                    self.stdout.write(self.style.SUCCESS(f'Registrada ENTRADA {-delta} para {product}'))
-                else:
-                    self.stdout.write(f'No cambios para {product} (delta={delta})')
-
-                device.ultimo_lectura = timezone.now()
-                device.save()
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error actualizando producto para {device}: {e}'))
+        self.stdout.write(
+            f"Ciclo: {len(vencidos)} leídos ({fallidos} sin respuesta, {resultado['con_cambios']} con cambios), "
+            f"cola={metricas['profundidad_cola']}, en backoff={metricas['en_backoff']}, "
+            f"retraso p95={metricas['retraso_ms']['p95']}ms"
+        )
@@ -0,0 +1,100 @@
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.tareas import procesar_pendientes, recuperar_abandonadas, limpiar_terminadas
+
+
+class Command(BaseCommand):
+    help = 'Worker de tareas en segundo plano (importaciones y exportaciones encoladas en la tabla Tarea)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=2,
+            help='Tareas ejecutadas en paralelo por este proceso',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=1.0,
+            help='Segundos de espera entre consultas a la cola cuando está vacía',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar las tareas pendientes y terminar (sin quedar escuchando la cola)',
+        )
+        parser.add_argument(
+            '--retencion-dias',
+            type=int,
+            default=7,
+            help='Días que se conservan las tareas terminadas y sus archivos; 0 = no limpiar',
+        )
+
+    def handle(self, *args, **options):
+        recuperar_abandonadas()
+        if options['retencion_dias']:
+            eliminadas = limpiar_terminadas(options['retencion_dias'])
+            if eliminadas:
+                self.stdout.write(f'{eliminadas} tareas antiguas eliminadas')
+
+        base = f'{socket.gethostname()}-{os.getpid()}'
+        if options['una_vez']:
+            procesadas = procesar_pendientes(base)
+            self.stdout.write(self.style.SUCCESS(f'{procesadas} tareas procesadas'))
+            return
+
+        self._detener = threading.Event()
+        handler_anterior = self._registrar_senal()
+        hilos = self._iniciar_hilos(base, options['hilos'], options['intervalo'])
+        self.stdout.write(f'Worker de tareas iniciado ({len(hilos)} hilos)')
+
+        try:
+            self._vigilar()
+        finally:
+            if handler_anterior is not None:
+                signal.signal(signal.SIGTERM, handler_anterior)
+
+        # Las tareas en curso terminan antes de salir
+        for hilo in hilos:
+            hilo.join()
+        self.stdout.write('Worker de tareas detenido')
+
+    def _registrar_senal(self):
+        """SIGTERM detiene el worker; devuelve el handler anterior (None si no se registró)"""
+        try:
+            return signal.signal(signal.SIGTERM, lambda *args: self._detener.set())
+        except ValueError:
+            return None  # signal solo puede registrarse desde el hilo principal
+
+    def _iniciar_hilos(self, base, cantidad, intervalo):
+        hilos = [
+            threading.Thread(target=self._bucle, args=(f'{base}-{i}', intervalo), daemon=True)
+            for i in range(max(1, cantidad))
+        ]
+        for hilo in hilos:
+            hilo.start()
+        return hilos
+
+    def _vigilar(self):
+        """El hilo principal revisa periódicamente las tareas abandonadas por otros workers"""
+        try:
+            while not self._detener.wait(60):
+                close_old_connections()
+                recuperar_abandonadas()
+        except KeyboardInterrupt:
+            self._detener.set()
+
+    def _bucle(self, worker, intervalo):
+        try:
+            while not self._detener.is_set():
+                close_old_connections()
+                if not procesar_pendientes(worker, maximo=1):
+                    self._detener.wait(intervalo)
+        finally:
+            close_old_connections()
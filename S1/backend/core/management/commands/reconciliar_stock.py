@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.libro_stock import reconciliar, TAMANO_LOTE
+
+DESFASES_A_MOSTRAR = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el stock de cada producto con el derivado del libro de movimientos '
+        '(último corte + movimientos posteriores) y opcionalmente repara los desfases'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar',
+            action='store_true',
+            help='Corregir los desfases encontrados (por defecto solo informa)',
+        )
+        parser.add_argument(
+            '--fuente',
+            choices=['libro', 'stock'],
+            default='stock',
+            help=(
+                "stock: conserva el stock guardado y agrega un movimiento compensatorio; "
+                "libro: corrige el stock al valor del libro (solo con LIBRO_STOCK_ESTRICTO)"
+            ),
+        )
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Ignorar los cortes y sumar toda la historia de movimientos',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help='Productos por consulta y transacción',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resultado = reconciliar(
+                reparar=options['reparar'],
+                fuente=options['fuente'],
+                usar_cortes=not options['completo'],
+                tamano_lote=options['lote'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        desfases = resultado['desfases']
+        self.stdout.write(f"Productos revisados: {resultado['revisados']}, con desfase: {len(desfases)}")
+        for desfase in desfases[:DESFASES_A_MOSTRAR]:
+            self.stdout.write(
+                f"  Producto {desfase['producto']}: stock {desfase['stock']}, "
+                f"libro {desfase['stock_libro']} ({desfase['diferencia']:+d})"
+            )
+        if len(desfases) > DESFASES_A_MOSTRAR:
+            self.stdout.write(f'  ... y {len(desfases) - DESFASES_A_MOSTRAR} más')
+
+        if not desfases:
+            self.stdout.write(self.style.SUCCESS('Stock y libro coinciden'))
+        elif options['reparar']:
+            self.stdout.write(self.style.SUCCESS(f"Desfases reparados: {resultado['reparados']}"))
+            if resultado['omitidos']:
+                self.stdout.write(self.style.WARNING(
+                    f"Sin reparar (el stock quedaría negativo): {', '.join(map(str, resultado['omitidos']))}"
+                ))
+        else:
+            self.stdout.write(self.style.WARNING('Ejecute con --reparar para corregirlos'))
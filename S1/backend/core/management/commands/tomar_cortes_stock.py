@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.libro_stock import tomar_cortes, MARGEN_CORTE, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = (
+        'Toma cortes de stock derivados del libro de movimientos para los productos con '
+        'movimientos desde su último corte (programar en cron, p. ej. cada noche)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasta',
+            help=f'Fecha y hora ISO 8601 del corte (por defecto ahora menos {int(MARGEN_CORTE.total_seconds() // 60)} minutos)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help='Productos por consulta y transacción',
+        )
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            hasta = parse_datetime(options['hasta'])
+            if hasta is None:
+                raise CommandError(f"Fecha inválida: {options['hasta']}")
+            if timezone.is_naive(hasta):
+                hasta = timezone.make_aware(hasta)
+
+        try:
+            escritos = tomar_cortes(hasta=hasta, tamano_lote=options['lote'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Cortes de stock escritos: {escritos}'))
@@ -0,0 +1,155 @@
+"""
+Construcción de las métricas del dashboard con un número fijo de consultas.
+
+Cada bloque del dashboard es una consulta agregada independiente del volumen de datos:
+1. Productos: totales, precios y clasificación por stock en un solo aggregate
+2. Categorías: un GROUP BY con cantidad y valor (los dos rankings se ordenan en memoria)
+3. Alertas activas: un COUNT
+4. Productos más movidos: top 5 de ResumenProducto
+5. Histograma semanal: un GROUP BY fecha sobre ResumenDiarioProducto; la actividad
+   de hoy es el primer día del histograma
+
+`CONSULTAS_DASHBOARD` documenta el presupuesto que verifica PerformanceTestCase.
+`construir_estadisticas` arma el payload de /api/productos/estadisticas/ con el mismo criterio.
+"""
+from datetime import timedelta
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+from .models import Producto, Alerta, ResumenProducto, ResumenDiarioProducto
+
+CONSULTAS_DASHBOARD = 5
+DIAS_HISTOGRAMA = 7
+
+
+def _agregados_productos():
+    return Producto.objects.aggregate(
+        total_productos=Count('id'),
+        stock_total=Sum('stock'),
+        valor_total=Sum(F('stock') * F('precio')),
+        precio_promedio=Avg('precio'),
+        precio_max=Max('precio'),
+        precio_min=Min('precio'),
+        critico=Count('id', filter=Q(stock__lte=5)),
+        bajo=Count('id', filter=Q(stock__gt=5, stock__lte=10)),
+        normal=Count('id', filter=Q(stock__gt=10))
+    )
+
+
+def _categorias():
+    """Top 3 por cantidad y top 3 por valor a partir de un único GROUP BY categoria"""
+    filas = list(
+        Producto.objects.values('categoria').annotate(
+            cantidad=Count('id'),
+            valor=Sum(F('stock') * F('precio'))
+        ).order_by()
+    )
+    por_cantidad = sorted(filas, key=lambda f: f['cantidad'], reverse=True)[:3]
+    por_valor = sorted(filas, key=lambda f: f['valor'] or 0, reverse=True)[:3]
+    return (
+        [{'categoria': f['categoria'], 'cantidad': f['cantidad']} for f in por_cantidad],
+        [{'categoria': f['categoria'], 'valor': round(float(f['valor'] or 0), 2)} for f in por_valor],
+    )
+
+
+def _histograma(hoy, dias=DIAS_HISTOGRAMA):
+    """Entradas y salidas por día de los últimos `dias` días (hoy primero), en una consulta"""
+    por_fecha = {
+        fila['fecha']: fila
+        for fila in ResumenDiarioProducto.objects.filter(fecha__gt=hoy - timedelta(days=dias)).values('fecha').annotate(
+            entradas=Sum('entradas'),
+            salidas=Sum('salidas')
+        ).order_by()
+    }
+    histograma = []
+    for i in range(dias):
+        dia = hoy - timedelta(days=i)
+        fila = por_fecha.get(dia, {})
+        histograma.append({
+            'fecha': dia.strftime('%Y-%m-%d'),
+            'entradas': fila.get('entradas', 0),
+            'salidas': fila.get('salidas', 0)
+        })
+    return histograma
+
+
+def construir_metricas_dashboard():
+    """
+    Calcula el payload completo de `metricas_dashboard` en `CONSULTAS_DASHBOARD` consultas
+
+    Returns:
+        Dict serializable con resumen, stock, actividad, rankings y la semana
+    """
+    stats = _agregados_productos()
+    top_categorias, top_valor_categoria = _categorias()
+    alertas_activas = Alerta.objects.filter(activa=True).count()
+    productos_mas_movidos = list(
+        ResumenProducto.objects.filter(movimientos__gt=0).order_by('-movimientos').values(
+            'producto__nombre', total_movimientos=F('movimientos')
+        )[:5]
+    )
+    semana = _histograma(timezone.localdate())
+    hoy = semana[0]
+
+    return {
+        'resumen': {
+            'total_productos': stats['total_productos'] or 0,
+            'stock_total': stats['stock_total'] or 0,
+            'valor_total': round(float(stats['valor_total'] or 0), 2),
+            'alertas_activas': alertas_activas,
+        },
+        'stock': {
+            'critico': stats['critico'],
+            'bajo': stats['bajo'],
+            'normal': stats['normal']
+        },
+        'actividad_hoy': {
+            'entradas': hoy['entradas'],
+            'salidas': hoy['salidas'],
+            'total': hoy['entradas'] + hoy['salidas']
+        },
+        'productos_mas_movidos': productos_mas_movidos,
+        'top_categorias': top_categorias,
+        'top_valor_categoria': top_valor_categoria,
+        'precio_stats': {
+            'promedio': round(float(stats['precio_promedio'] or 0), 2),
+            'maximo': round(float(stats['precio_max'] or 0), 2),
+            'minimo': round(float(stats['precio_min'] or 0), 2)
+        },
+        'movimientos_semana': semana
+    }
+
+
+def construir_estadisticas():
+    """
+    Calcula el payload de `estadisticas`: clasificación por stock, valor total y
+    desglose por categoría, en dos consultas agregadas
+    """
+    stats = Producto.objects.aggregate(
+        total=Count('id'),
+        critico=Count('id', filter=Q(stock__lte=5)),
+        bajo=Count('id', filter=Q(stock__gt=5, stock__lte=10)),
+        normal=Count('id', filter=Q(stock__gt=10)),
+        valor_total=Sum(F('stock') * F('precio'))
+    )
+
+    categorias = {
+        stat['categoria']: {
+            'cantidad': stat['cantidad'],
+            'stock_total': stat['stock_total'] or 0,
+            'valor_total': float(stat['valor_total'] or 0)
+        }
+        for stat in Producto.objects.values('categoria').annotate(
+            cantidad=Count('id'),
+            stock_total=Sum('stock'),
+            valor_total=Sum(F('stock') * F('precio'))
+        ).order_by('-cantidad')
+    }
+
+    return {
+        'total_productos': stats['total'],
+        'stock_critico': stats['critico'],
+        'stock_bajo': stats['bajo'],
+        'stock_normal': stats['normal'],
+        'valor_inventario': round(float(stats['valor_total'] or 0), 2),
+        'por_categoria': categorias
+    }
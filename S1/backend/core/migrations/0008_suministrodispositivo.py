@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_rename_snmp_community_device_comunidad_snmp_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuministroDispositivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveIntegerField(verbose_name='Índice SNMP del consumible')),
+                ('descripcion', models.CharField(blank=True, max_length=255, verbose_name='Descripción')),
+                ('nivel', models.IntegerField(help_text='Valores negativos según Printer-MIB: -1 otro, -2 desconocido, -3 queda algo', verbose_name='Nivel actual')),
+                ('capacidad_maxima', models.IntegerField(verbose_name='Capacidad máxima')),
+                ('ultima_lectura', models.DateTimeField(blank=True, null=True, verbose_name='Última lectura')),
+                ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suministros', to='core.device', verbose_name='Dispositivo')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='suministros', to='core.producto', verbose_name='Producto consumible')),
+            ],
+            options={
+                'verbose_name': 'Suministro de dispositivo',
+                'verbose_name_plural': 'Suministros de dispositivos',
+                'ordering': ['dispositivo', 'indice'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='suministrodispositivo',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'indice'), name='suministro_unico_por_indice'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_suministrodispositivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='intervalo_sondeo',
+            field=models.PositiveIntegerField(default=300, help_text='Cada cuánto lo lee poll_devices --daemon; se acorta si los consumibles bajan rápido', verbose_name='Intervalo de sondeo (segundos)'),
+        ),
+    ]
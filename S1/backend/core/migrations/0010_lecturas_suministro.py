@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_device_intervalo_sondeo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LecturaSuministro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha de lectura')),
+                ('nivel', models.IntegerField(verbose_name='Nivel')),
+                ('capacidad_maxima', models.IntegerField(verbose_name='Capacidad máxima')),
+                ('suministro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lecturas', to='core.suministrodispositivo', verbose_name='Suministro')),
+            ],
+            options={
+                'verbose_name': 'Lectura de suministro',
+                'verbose_name_plural': 'Lecturas de suministros',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenLecturaSuministro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('HORA', 'Hora'), ('DIA', 'Día')], max_length=4, verbose_name='Periodo')),
+                ('inicio', models.DateTimeField(verbose_name='Inicio del periodo')),
+                ('nivel_min', models.IntegerField(verbose_name='Nivel mínimo')),
+                ('nivel_max', models.IntegerField(verbose_name='Nivel máximo')),
+                ('nivel_promedio', models.FloatField(verbose_name='Nivel promedio')),
+                ('muestras', models.PositiveIntegerField(verbose_name='Cantidad de lecturas')),
+                ('suministro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='core.suministrodispositivo', verbose_name='Suministro')),
+            ],
+            options={
+                'verbose_name': 'Resumen de lecturas',
+                'verbose_name_plural': 'Resúmenes de lecturas',
+                'ordering': ['suministro', 'periodo', 'inicio'],
+                'indexes': [models.Index(fields=['periodo', 'inicio'], name='core_resume_periodo_e6961c_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumenlecturasuministro',
+            constraint=models.UniqueConstraint(fields=('suministro', 'periodo', 'inicio'), name='resumen_unico_por_periodo'),
+        ),
+        migrations.AddIndex(
+            model_name='lecturasuministro',
+            index=models.Index(fields=['suministro', 'fecha'], name='core_lectur_suminis_7b7457_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lecturasuministro',
+            index=models.Index(fields=['fecha'], name='core_lectur_fecha_38adcc_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def cargar_resumenes(apps, schema_editor):
+    """Carga inicial de los resúmenes desde los movimientos existentes"""
+    Movimiento = apps.get_model('core', 'Movimiento')
+    ResumenProducto = apps.get_model('core', 'ResumenProducto')
+    ResumenDiarioProducto = apps.get_model('core', 'ResumenDiarioProducto')
+    por_tipo = {
+        'entradas': Count('id', filter=Q(tipo='ENTRADA')),
+        'salidas': Count('id', filter=Q(tipo='SALIDA')),
+        'unidades_entrada': Sum('cantidad', filter=Q(tipo='ENTRADA'), default=0),
+        'unidades_salida': Sum('cantidad', filter=Q(tipo='SALIDA'), default=0),
+    }
+    diarios = Movimiento.objects.annotate(dia=TruncDate('fecha')).values('producto_id', 'dia').annotate(**por_tipo).order_by()
+    ResumenDiarioProducto.objects.bulk_create(
+        [ResumenDiarioProducto(fecha=fila.pop('dia'), **fila) for fila in diarios],
+        batch_size=1000,
+    )
+    ResumenProducto.objects.bulk_create(
+        [
+            ResumenProducto(movimientos=fila['entradas'] + fila['salidas'], **fila)
+            for fila in Movimiento.objects.values('producto_id').annotate(
+                ultimo_movimiento=Max('fecha'), **por_tipo
+            ).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_lecturas_suministro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='core.producto', verbose_name='Producto')),
+                ('movimientos', models.IntegerField(default=0, verbose_name='Total de movimientos')),
+                ('entradas', models.IntegerField(default=0, verbose_name='Movimientos de entrada')),
+                ('salidas', models.IntegerField(default=0, verbose_name='Movimientos de salida')),
+                ('unidades_entrada', models.IntegerField(default=0, verbose_name='Unidades ingresadas')),
+                ('unidades_salida', models.IntegerField(default=0, verbose_name='Unidades retiradas')),
+                ('ultimo_movimiento', models.DateTimeField(blank=True, null=True, verbose_name='Último movimiento')),
+            ],
+            options={
+                'verbose_name': 'Resumen de producto',
+                'verbose_name_plural': 'Resúmenes de productos',
+                'indexes': [models.Index(fields=['-movimientos'], name='core_resume_movimie_77fb00_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('entradas', models.IntegerField(default=0, verbose_name='Movimientos de entrada')),
+                ('salidas', models.IntegerField(default=0, verbose_name='Movimientos de salida')),
+                ('unidades_entrada', models.IntegerField(default=0, verbose_name='Unidades ingresadas')),
+                ('unidades_salida', models.IntegerField(default=0, verbose_name='Unidades retiradas')),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='core.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de producto',
+                'verbose_name_plural': 'Resúmenes diarios de productos',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha'], name='core_resume_fecha_c42f0f_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumendiarioproducto',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='resumen_diario_unico_por_producto'),
+        ),
+        migrations.RunPython(cargar_resumenes, migrations.RunPython.noop),
+    ]
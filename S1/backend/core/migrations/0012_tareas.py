@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_resumenes_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('IMPORTAR_PRODUCTOS', 'Importar productos'), ('EXPORTAR_PRODUCTOS', 'Exportar productos'), ('EXPORTAR_MOVIMIENTOS', 'Exportar movimientos'), ('EXPORTAR_REPORTE', 'Exportar reporte de inventario')], max_length=30, verbose_name='Tipo de tarea')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En proceso'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=12, verbose_name='Estado')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('archivo_entrada', models.FileField(blank=True, upload_to='tareas/entrada/', verbose_name='Archivo de entrada')),
+                ('archivo_resultado', models.FileField(blank=True, upload_to='tareas/resultado/', verbose_name='Archivo de resultado')),
+                ('resultado', models.JSONField(blank=True, null=True, verbose_name='Resultado')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('procesados', models.PositiveIntegerField(default=0, verbose_name='Unidades procesadas')),
+                ('total', models.PositiveIntegerField(blank=True, null=True, verbose_name='Total de unidades')),
+                ('usuario', models.CharField(blank=True, max_length=150, verbose_name='Usuario que la solicitó')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Worker asignado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio de ejecución')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin de ejecución')),
+                ('latido', models.DateTimeField(blank=True, null=True, verbose_name='Último latido del worker')),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='core_tarea_estado_f76719_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Índices de búsqueda de texto de productos (específicos de cada motor)
+
+from django.db import migrations, transaction
+
+# Debe coincidir exactamente con busqueda.VECTOR_PG para que el planificador use el índice
+VECTOR_PG = (
+    "setweight(to_tsvector('spanish'::regconfig, nombre::text), 'A') || "
+    "setweight(to_tsvector('spanish'::regconfig, modelo::text), 'A') || "
+    "setweight(to_tsvector('spanish'::regconfig, marca::text), 'B') || "
+    "setweight(to_tsvector('spanish'::regconfig, categoria::text), 'C') || "
+    "setweight(to_tsvector('spanish'::regconfig, descripcion), 'D')"
+)
+
+COLUMNAS_TRIGRAMA = ('nombre', 'marca', 'modelo')
+COLUMNAS_FTS = 'nombre, marca, modelo, categoria, descripcion'
+NUEVAS_FTS = 'new.id, new.nombre, new.marca, new.modelo, new.categoria, new.descripcion'
+VIEJAS_FTS = "'delete', old.id, old.nombre, old.marca, old.modelo, old.categoria, old.descripcion"
+
+
+def _crear_postgresql(schema_editor):
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS core_producto_busqueda_fts ON core_producto USING gin (({VECTOR_PG}))')
+    try:
+        # CREATE EXTENSION requiere privilegios: sin pg_trgm la búsqueda queda solo con tsvector
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except Exception:
+        return
+    for columna in COLUMNAS_TRIGRAMA:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS core_producto_{columna}_trgm '
+            f'ON core_producto USING gin (UPPER({columna}::text) gin_trgm_ops)'
+        )
+
+
+def _crear_sqlite(schema_editor):
+    # Tabla FTS5 de contenido externo: guarda solo el índice y lee el texto de core_producto.
+    # Si el SQLite no trae FTS5 se omite y la búsqueda usa LIKE
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE core_producto_fts USING fts5({COLUMNAS_FTS}, "
+                f"content='core_producto', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+    except Exception:
+        return
+    schema_editor.execute(
+        f'CREATE TRIGGER core_producto_fts_ai AFTER INSERT ON core_producto BEGIN '
+        f'INSERT INTO core_producto_fts(rowid, {COLUMNAS_FTS}) VALUES ({NUEVAS_FTS}); END'
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER core_producto_fts_ad AFTER DELETE ON core_producto BEGIN '
+        f'INSERT INTO core_producto_fts(core_producto_fts, rowid, {COLUMNAS_FTS}) VALUES ({VIEJAS_FTS}); END'
+    )
+    # Solo los cambios de texto tocan el índice; los de stock y precio no
+    schema_editor.execute(
+        f'CREATE TRIGGER core_producto_fts_au AFTER UPDATE OF {COLUMNAS_FTS} ON core_producto BEGIN '
+        f'INSERT INTO core_producto_fts(core_producto_fts, rowid, {COLUMNAS_FTS}) VALUES ({VIEJAS_FTS}); '
+        f'INSERT INTO core_producto_fts(rowid, {COLUMNAS_FTS}) VALUES ({NUEVAS_FTS}); END'
+    )
+    schema_editor.execute("INSERT INTO core_producto_fts(core_producto_fts) VALUES ('rebuild')")
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _crear_postgresql(schema_editor)
+    elif vendor == 'sqlite':
+        _crear_sqlite(schema_editor)
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS core_producto_busqueda_fts')
+        for columna in COLUMNAS_TRIGRAMA:
+            schema_editor.execute(f'DROP INDEX IF EXISTS core_producto_{columna}_trgm')
+    elif vendor == 'sqlite':
+        for sufijo in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS core_producto_fts_{sufijo}')
+        schema_editor.execute('DROP TABLE IF EXISTS core_producto_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha de corte')),
+                ('stock', models.IntegerField(verbose_name='Stock al corte')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cortes', to='core.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Corte de stock',
+                'verbose_name_plural': 'Cortes de stock',
+                'ordering': ['producto', '-fecha'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cortestock',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='corte_unico_por_producto'),
+        ),
+    ]
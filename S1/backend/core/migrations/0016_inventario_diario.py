@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_cortes_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventarioDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('categoria', models.CharField(blank=True, max_length=50, verbose_name='Categoría')),
+                ('stock', models.IntegerField(verbose_name='Stock al cierre')),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=16, verbose_name='Valor al cierre')),
+                ('producto', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventarios_diarios', to='core.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Inventario diario',
+                'verbose_name_plural': 'Inventarios diarios',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha', 'categoria'], name='core_invent_fecha_05b25e_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='inventariodiario',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='inventario_diario_unico_por_producto'),
+        ),
+    ]
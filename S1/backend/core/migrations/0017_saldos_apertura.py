@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Case, F, IntegerField, Min, Sum, When
+
+
+def abrir_saldos(apps, schema_editor):
+    """
+    Corte de apertura para los productos existentes: la parte del stock actual que no
+    explican sus movimientos, justo antes de su creación o de su primer movimiento. Los
+    cortes ya tomados se derivaron sin ese saldo y se corrigen por la misma diferencia.
+    """
+    Producto = apps.get_model('core', 'Producto')
+    Movimiento = apps.get_model('core', 'Movimiento')
+    CorteStock = apps.get_model('core', 'CorteStock')
+    historia = {
+        fila['producto_id']: fila
+        for fila in Movimiento.objects.values('producto_id').annotate(
+            neto=Sum(Case(
+                When(tipo='ENTRADA', then=F('cantidad')),
+                default=-F('cantidad'),
+                output_field=IntegerField()
+            )),
+            primero=Min('fecha'),
+        ).order_by()
+    }
+    aperturas = []
+    for producto in Producto.objects.order_by().values('pk', 'stock', 'fecha_creacion').iterator(chunk_size=1000):
+        fila = historia.get(producto['pk'], {'neto': 0, 'primero': producto['fecha_creacion']})
+        saldo = producto['stock'] - fila['neto']
+        if not saldo:
+            continue
+        CorteStock.objects.filter(producto_id=producto['pk']).update(stock=F('stock') + saldo)
+        aperturas.append(CorteStock(
+            producto_id=producto['pk'],
+            fecha=min(producto['fecha_creacion'], fila['primero']) - timedelta(microseconds=1),
+            stock=saldo,
+        ))
+    CorteStock.objects.bulk_create(aperturas, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_inventario_diario'),
+    ]
+
+    operations = [
+        migrations.RunPython(abrir_saldos, migrations.RunPython.noop),
+    ]
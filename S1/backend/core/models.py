@@ -1,5 +1,6 @@
 import logging
 from django.db import models, transaction
+from .invalidacion import emitir
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +61,8 @@ class Producto(models.Model):
             models.Index(fields=['marca', 'modelo']),
             models.Index(fields=['stock']),
             models.Index(fields=['codigo_barras']),
+            # Clave de la paginación por cursor (fecha_creacion, id)
+            models.Index(fields=['-fecha_creacion', '-id']),
         ]
 
     def __str__(self):
@@ -67,6 +70,17 @@ class Producto(models.Model):
             return f"{self.marca} {self.modelo} - {self.nombre}"
         return self.nombre
     
+    def save(self, *args, **kwargs):
+        """Al crear el producto con stock registra su saldo de apertura en el libro de stock"""
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        from .libro_stock import abrir_saldos
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            abrir_saldos([self])
+
     def esta_en_stock_bajo(self):
         """Verifica si el producto tiene stock por debajo del umbral de alerta"""
         alerta = self.alertas.first()
@@ -84,7 +98,15 @@ class Producto(models.Model):
             logger.warning(f"Intento de entrada sin descripción - Producto: {self.nombre}")
             raise ValueError("La descripción es obligatoria")
         
+        from .resumenes import acumular_movimientos
+        from .stock import sumar_stock
+        
         with transaction.atomic():
+            # stock = stock + n en la base de datos: sin lecturas previas ni actualizaciones perdidas
+            nuevo_stock = sumar_stock(self.pk, cantidad)
+            if nuevo_stock is None:
+                raise Producto.DoesNotExist(f"No existe el producto {self.pk}")
+            self.stock = nuevo_stock
             movimiento = Movimiento.objects.create(
                 producto=self,
                 tipo='ENTRADA',
@@ -92,9 +114,9 @@ class Producto(models.Model):
                 descripcion=descripcion,
                 usuario=usuario or 'Sistema'
             )
-            self.stock += cantidad
-            self.save(update_fields=['stock'])
             self._verificar_alertas()
+            acumular_movimientos([movimiento])
+            emitir('stock')
             
             logger.info(
                 f"Entrada registrada - Producto: {self.nombre}, "
@@ -112,50 +134,52 @@ class Producto(models.Model):
             logger.warning(f"Intento de salida sin descripción - Producto: {self.nombre}")
             raise ValueError("La descripción es obligatoria")
         
+        from .resumenes import acumular_movimientos
+        from .stock import descontar_stock, stock_actual
+        
         with transaction.atomic():
-            # Usar select_for_update para evitar race conditions en operaciones concurrentes
-            producto = Producto.objects.select_for_update().get(pk=self.pk)
-            
-            if cantidad > producto.stock:
+            # Decremento condicional (stock >= cantidad) en una sola sentencia: si no afecta
+            # filas el stock no alcanza y nada quedó bloqueado ni escrito
+            nuevo_stock = descontar_stock(self.pk, cantidad)
+            if nuevo_stock is None:
+                disponible = stock_actual(self.pk)
+                if disponible is None:
+                    raise Producto.DoesNotExist(f"No existe el producto {self.pk}")
+                self.stock = disponible
                 logger.warning(
-                    f"Stock insuficiente - Producto: {producto.nombre}, "
-                    f"Stock: {producto.stock}, Solicitado: {cantidad}"
+                    f"Stock insuficiente - Producto: {self.nombre}, "
+                    f"Stock: {disponible}, Solicitado: {cantidad}"
                 )
                 raise ValueError(
-                    f"Stock insuficiente para '{producto.nombre}'. "
-                    f"Disponible: {producto.stock}, Solicitado: {cantidad}, "
-                    f"Faltante: {cantidad - producto.stock}"
+                    f"Stock insuficiente para '{self.nombre}'. "
+                    f"Disponible: {disponible}, Solicitado: {cantidad}, "
+                    f"Faltante: {cantidad - disponible}"
                 )
             
+            self.stock = nuevo_stock
             movimiento = Movimiento.objects.create(
-                producto=producto,
+                producto=self,
                 tipo='SALIDA',
                 cantidad=cantidad,
                 descripcion=descripcion,
                 usuario=usuario or 'Sistema'
             )
-            producto.stock -= cantidad
-            producto.save(update_fields=['stock'])
-            producto._verificar_alertas()
+            self._verificar_alertas()
+            acumular_movimientos([movimiento])
+            emitir('stock')
             
             logger.info(
-                f"Salida registrada - Producto: {producto.nombre}, "
-                f"Cantidad: {cantidad}, Stock restante: {producto.stock}"
+                f"Salida registrada - Producto: {self.nombre}, "
+                f"Cantidad: {cantidad}, Stock restante: {self.stock}"
             )
-            
-            # Actualizar self para reflejar cambios
-            self.refresh_from_db()
         return movimiento
     
     def _verificar_alertas(self):
         """Verifica y actualiza el estado de las alertas según el stock actual"""
-        # Si no hay alertas configuradas, crear una por defecto con umbral de 10
-        if not self.alertas.exists():
-            Alerta.objects.create(producto=self, umbral=10, activa=False)
+        # UPDATE condicional único (ver core/alertas.py); crea la alerta por defecto si no hay
+        from .alertas import evaluar_alertas_producto
         
-        for alerta in self.alertas.all():
-            alerta.activa = self.stock < alerta.umbral
-            alerta.save(update_fields=['activa'])
+        evaluar_alertas_producto(self)
     
     def ajustar_stock(self, nuevo_stock, descripcion='Ajuste manual', usuario=None):
         """
@@ -166,15 +190,20 @@ class Producto(models.Model):
             logger.warning(f"Intento de ajuste con stock negativo: {nuevo_stock}")
             raise ValueError("El nuevo stock no puede ser negativo")
         
-        diferencia = nuevo_stock - self.stock
-        if diferencia == 0:
-            logger.info(f"Ajuste sin cambios - Producto: {self.nombre}, Stock: {self.stock}")
-            return None
-        
-        tipo = 'ENTRADA' if diferencia > 0 else 'SALIDA'
-        cantidad = abs(diferencia)
+        from .resumenes import acumular_movimientos
         
         with transaction.atomic():
+            # El ajuste fija un valor absoluto: la diferencia se calcula sobre la fila bloqueada
+            # para que una entrada o salida concurrente no se pierda ni se registre mal
+            stock_anterior = Producto.objects.select_for_update().values_list('stock', flat=True).get(pk=self.pk)
+            self.stock = stock_anterior
+            diferencia = nuevo_stock - stock_anterior
+            if diferencia == 0:
+                logger.info(f"Ajuste sin cambios - Producto: {self.nombre}, Stock: {self.stock}")
+                return None
+            
+            tipo = 'ENTRADA' if diferencia > 0 else 'SALIDA'
+            cantidad = abs(diferencia)
             movimiento = Movimiento.objects.create(
                 producto=self,
                 tipo=tipo,
@@ -182,10 +211,11 @@ class Producto(models.Model):
                 descripcion=descripcion,
                 usuario=usuario or 'Sistema'
             )
-            stock_anterior = self.stock
+            Producto.objects.filter(pk=self.pk).update(stock=nuevo_stock)
             self.stock = nuevo_stock
-            self.save(update_fields=['stock'])
             self._verificar_alertas()
+            acumular_movimientos([movimiento])
+            emitir('stock')
             
             logger.info(
                 f"Stock ajustado - Producto: {self.nombre}, "
@@ -249,6 +279,8 @@ class Movimiento(models.Model):
         indexes = [
             models.Index(fields=['producto', '-fecha']),
             models.Index(fields=['tipo', '-fecha']),
+            # Clave de la paginación por cursor (fecha, id)
+            models.Index(fields=['-fecha', '-id']),
         ]
 
     def __str__(self):
@@ -284,6 +316,137 @@ class Alerta(models.Model):
         return f"Alerta: {self.producto.nombre} (Umbral: {self.umbral})"
 
 
+class ResumenProducto(models.Model):
+    """
+    Totales acumulados de movimientos de un producto (tabla desnormalizada).
+    Se actualiza de forma incremental en la misma transacción que escribe cada
+    movimiento (ver core/resumenes.py), para que los dashboards lean una fila por
+    producto en lugar de agregar toda la tabla Movimiento.
+    """
+    producto = models.OneToOneField(
+        Producto,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='resumen',
+        verbose_name="Producto"
+    )
+    movimientos = models.IntegerField(default=0, verbose_name="Total de movimientos")
+    entradas = models.IntegerField(default=0, verbose_name="Movimientos de entrada")
+    salidas = models.IntegerField(default=0, verbose_name="Movimientos de salida")
+    unidades_entrada = models.IntegerField(default=0, verbose_name="Unidades ingresadas")
+    unidades_salida = models.IntegerField(default=0, verbose_name="Unidades retiradas")
+    ultimo_movimiento = models.DateTimeField(null=True, blank=True, verbose_name="Último movimiento")
+
+    class Meta:
+        verbose_name = 'Resumen de producto'
+        verbose_name_plural = 'Resúmenes de productos'
+        indexes = [
+            models.Index(fields=['-movimientos']),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.producto_id}: {self.movimientos} movimientos"
+
+
+class ResumenDiarioProducto(models.Model):
+    """
+    Movimientos de un producto agregados por día (fecha local), mantenidos junto
+    con ResumenProducto. Alimenta los histogramas y ventanas de N días del dashboard.
+    """
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='resumenes_diarios',
+        db_index=False,
+        verbose_name="Producto"
+    )
+    fecha = models.DateField(verbose_name="Fecha")
+    entradas = models.IntegerField(default=0, verbose_name="Movimientos de entrada")
+    salidas = models.IntegerField(default=0, verbose_name="Movimientos de salida")
+    unidades_entrada = models.IntegerField(default=0, verbose_name="Unidades ingresadas")
+    unidades_salida = models.IntegerField(default=0, verbose_name="Unidades retiradas")
+
+    class Meta:
+        verbose_name = 'Resumen diario de producto'
+        verbose_name_plural = 'Resúmenes diarios de productos'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='resumen_diario_unico_por_producto'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} {self.fecha}: +{self.entradas} -{self.salidas}"
+
+
+class CorteStock(models.Model):
+    """
+    Stock de un producto a una fecha de corte, derivado de sus movimientos (ver
+    core/libro_stock.py). El stock a cualquier fecha es el del último corte anterior
+    más los movimientos posteriores a ese corte, sin recorrer toda la historia.
+    """
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='cortes',
+        db_index=False,
+        verbose_name="Producto"
+    )
+    fecha = models.DateTimeField(verbose_name="Fecha de corte")
+    stock = models.IntegerField(verbose_name="Stock al corte")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+
+    class Meta:
+        verbose_name = 'Corte de stock'
+        verbose_name_plural = 'Cortes de stock'
+        ordering = ['producto', '-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='corte_unico_por_producto'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} @ {self.fecha:%Y-%m-%d %H:%M}: {self.stock}"
+
+
+class InventarioDiario(models.Model):
+    """
+    Stock y valor de cada producto al cierre de un día (fecha local), escrito por el
+    comando `generar_inventario_diario` a partir del día anterior y los movimientos del
+    día (ver core/valorizacion.py). La valorización a una fecha lee solo las filas de
+    ese día. El precio es el vigente al generar la fila; la categoría se copia para que
+    la historia no dependa de ediciones o bajas posteriores del producto.
+    """
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='inventarios_diarios',
+        db_index=False,
+        verbose_name="Producto"
+    )
+    fecha = models.DateField(verbose_name="Fecha")
+    categoria = models.CharField(max_length=50, blank=True, verbose_name="Categoría")
+    stock = models.IntegerField(verbose_name="Stock al cierre")
+    precio = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Precio")
+    valor = models.DecimalField(max_digits=16, decimal_places=2, verbose_name="Valor al cierre")
+
+    class Meta:
+        verbose_name = 'Inventario diario'
+        verbose_name_plural = 'Inventarios diarios'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='inventario_diario_unico_por_producto'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'categoria']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} {self.fecha}: {self.stock} (${self.valor})"
+
+
 class Device(models.Model):
     """
     Representa una impresora/dispositivo que puede reportar niveles de consumibles.
@@ -304,6 +467,11 @@ class Device(models.Model):
     comunidad_snmp = models.CharField(max_length=100, blank=True, verbose_name="SNMP Community")
     activo = models.BooleanField(default=True, verbose_name="Activo")
     ultima_lectura = models.DateTimeField(null=True, blank=True, verbose_name="Última lectura")
+    intervalo_sondeo = models.PositiveIntegerField(
+        default=300,
+        verbose_name="Intervalo de sondeo (segundos)",
+        help_text="Cada cuánto lo lee poll_devices --daemon; se acorta si los consumibles bajan rápido"
+    )
 
     class Meta:
         verbose_name = 'Dispositivo'
@@ -315,3 +483,177 @@ class Device(models.Model):
 
     def __str__(self):
         return f"{self.nombre} ({self.ip})"
+
+
+class SuministroDispositivo(models.Model):
+    """
+    Consumible individual reportado por un dispositivo (fila de prtMarkerSuppliesTable).
+    Una impresora color tiene varios (negro, cian, magenta, amarillo, tambor, etc.);
+    cada uno puede mapearse a su propio `Producto` para actualizar stock.
+    """
+    dispositivo = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name='suministros',
+        verbose_name="Dispositivo"
+    )
+    indice = models.PositiveIntegerField(verbose_name="Índice SNMP del consumible")
+    descripcion = models.CharField(max_length=255, blank=True, verbose_name="Descripción")
+    nivel = models.IntegerField(
+        verbose_name="Nivel actual",
+        help_text="Valores negativos según Printer-MIB: -1 otro, -2 desconocido, -3 queda algo"
+    )
+    capacidad_maxima = models.IntegerField(verbose_name="Capacidad máxima")
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='suministros',
+        verbose_name="Producto consumible"
+    )
+    ultima_lectura = models.DateTimeField(null=True, blank=True, verbose_name="Última lectura")
+
+    class Meta:
+        verbose_name = 'Suministro de dispositivo'
+        verbose_name_plural = 'Suministros de dispositivos'
+        ordering = ['dispositivo', 'indice']
+        constraints = [
+            models.UniqueConstraint(fields=['dispositivo', 'indice'], name='suministro_unico_por_indice'),
+        ]
+
+    def __str__(self):
+        return f"{self.dispositivo.nombre} #{self.indice} {self.descripcion}"
+
+    @property
+    def porcentaje(self):
+        """Nivel como fracción 0..1, o None si la impresora no reporta un valor medible"""
+        if self.nivel < 0 or self.capacidad_maxima <= 0:
+            return None
+        return self.nivel / self.capacidad_maxima
+
+
+class LecturaSuministro(models.Model):
+    """
+    Lectura cruda de nivel de un consumible (serie de tiempo, solo inserción).
+    Se escribe una fila por consumible medible en cada sondeo, en bloque por barrido.
+    Las filas antiguas se consolidan en ResumenLecturaSuministro y se eliminan
+    (ver comando compactar_lecturas), de modo que la tabla se mantiene acotada.
+    """
+    suministro = models.ForeignKey(
+        SuministroDispositivo,
+        on_delete=models.CASCADE,
+        related_name='lecturas',
+        db_index=False,
+        verbose_name="Suministro"
+    )
+    fecha = models.DateTimeField(verbose_name="Fecha de lectura")
+    nivel = models.IntegerField(verbose_name="Nivel")
+    capacidad_maxima = models.IntegerField(verbose_name="Capacidad máxima")
+
+    class Meta:
+        verbose_name = 'Lectura de suministro'
+        verbose_name_plural = 'Lecturas de suministros'
+        indexes = [
+            models.Index(fields=['suministro', 'fecha']),
+            models.Index(fields=['fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.suministro_id} @ {self.fecha:%Y-%m-%d %H:%M}: {self.nivel}/{self.capacidad_maxima}"
+
+
+class ResumenLecturaSuministro(models.Model):
+    """
+    Consolidación por hora o por día de las lecturas de un consumible (mín/máx/promedio)
+    """
+    PERIODO_CHOICES = [
+        ('HORA', 'Hora'),
+        ('DIA', 'Día'),
+    ]
+
+    suministro = models.ForeignKey(
+        SuministroDispositivo,
+        on_delete=models.CASCADE,
+        related_name='resumenes',
+        db_index=False,
+        verbose_name="Suministro"
+    )
+    periodo = models.CharField(max_length=4, choices=PERIODO_CHOICES, verbose_name="Periodo")
+    inicio = models.DateTimeField(verbose_name="Inicio del periodo")
+    nivel_min = models.IntegerField(verbose_name="Nivel mínimo")
+    nivel_max = models.IntegerField(verbose_name="Nivel máximo")
+    nivel_promedio = models.FloatField(verbose_name="Nivel promedio")
+    muestras = models.PositiveIntegerField(verbose_name="Cantidad de lecturas")
+
+    class Meta:
+        verbose_name = 'Resumen de lecturas'
+        verbose_name_plural = 'Resúmenes de lecturas'
+        ordering = ['suministro', 'periodo', 'inicio']
+        constraints = [
+            models.UniqueConstraint(fields=['suministro', 'periodo', 'inicio'], name='resumen_unico_por_periodo'),
+        ]
+        indexes = [
+            models.Index(fields=['periodo', 'inicio']),
+        ]
+
+    def __str__(self):
+        return f"{self.suministro_id} {self.periodo} {self.inicio:%Y-%m-%d %H:%M}"
+
+
+class Tarea(models.Model):
+    """
+    Trabajo en segundo plano (importaciones y exportaciones grandes).
+    La tabla es la cola: el endpoint encola la tarea y responde de inmediato, un
+    worker de `procesar_tareas` la toma, informa el avance y deja el archivo de
+    resultado para descargar (ver core/tareas.py).
+    """
+    TIPO_CHOICES = [
+        ('IMPORTAR_PRODUCTOS', 'Importar productos'),
+        ('EXPORTAR_PRODUCTOS', 'Exportar productos'),
+        ('EXPORTAR_MOVIMIENTOS', 'Exportar movimientos'),
+        ('EXPORTAR_REPORTE', 'Exportar reporte de inventario'),
+    ]
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('COMPLETADA', 'Completada'),
+        ('FALLIDA', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES, verbose_name="Tipo de tarea")
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='PENDIENTE', verbose_name="Estado")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parámetros")
+    archivo_entrada = models.FileField(upload_to='tareas/entrada/', blank=True, verbose_name="Archivo de entrada")
+    archivo_resultado = models.FileField(upload_to='tareas/resultado/', blank=True, verbose_name="Archivo de resultado")
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Resultado")
+    error = models.TextField(blank=True, verbose_name="Error")
+    procesados = models.PositiveIntegerField(default=0, verbose_name="Unidades procesadas")
+    total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Total de unidades")
+    usuario = models.CharField(max_length=150, blank=True, verbose_name="Usuario que la solicitó")
+    worker = models.CharField(max_length=100, blank=True, verbose_name="Worker asignado")
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio de ejecución")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin de ejecución")
+    latido = models.DateTimeField(null=True, blank=True, verbose_name="Último latido del worker")
+
+    class Meta:
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.estado})"
+
+    @property
+    def progreso(self):
+        """Porcentaje de avance (0-100); None mientras no se conoce el total"""
+        if self.estado == 'COMPLETADA':
+            return 100
+        if not self.total:
+            return None
+        return min(100, int(self.procesados * 100 / self.total))
@@ -1,23 +1,200 @@
+import base64
+import json
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .conteo import MODOS_CONTEO, contar, contar_aproximado
 
 
-class PaginacionEstandar(PageNumberPagination):
+class _PaginaEstimada(Page):
+    """Página cuyo `has_next` sale de haber leído una fila extra y no del total"""
+
+    def __init__(self, object_list, number, paginator, hay_siguiente):
+        super().__init__(object_list, number, paginator)
+        self.hay_siguiente = hay_siguiente
+
+    def has_next(self):
+        return self.hay_siguiente
+
+
+class PaginadorConteo(Paginator):
+    """
+    Paginator de Django que obtiene el total con `conteo.contar_aproximado`
+    (cacheado por filtros; estimado en tablas grandes de PostgreSQL en lugar de COUNT(*)).
+
+    Cuando el total es estimado no se usa para validar el número de página ni para
+    decidir si hay página siguiente: se lee una fila más que el tamaño de página.
+    """
+    conteo_exacto = True
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        total, self.conteo_exacto = contar_aproximado(self.object_list)
+        return total
+
+    def validate_number(self, number):
+        if self.count is not None and self.conteo_exacto:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.conteo_exacto:
+            return super().page(number)
+        inicio = (number - 1) * self.per_page
+        filas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        if not filas and number > 1:
+            raise EmptyPage('That page contains no results')
+        return _PaginaEstimada(filas[:self.per_page], number, self, len(filas) > self.per_page)
+
+
+class PaginadorCursor:
+    """
+    Paginación por clave (keyset) sobre (campo, id), sin OFFSET ni COUNT(*)
+
+    La página siguiente se pide con WHERE (campo, id) < (último campo, último id)
+    ordenado por campo e id, de modo que cada página recorre solo sus filas en el
+    índice (campo, id) sin importar qué tan profunda sea. El cursor es opaco para
+    el cliente: base64 de la posición y la dirección.
+    """
+    cursor_query_param = 'cursor'
+
+    def __init__(self, campo, tamano_pagina, descendente=True, modo_conteo='ninguno'):
+        self.campo = campo
+        self.tamano_pagina = tamano_pagina
+        self.descendente = descendente
+        self.modo_conteo = modo_conteo
+
+    def _codificar(self, item, atras):
+        valor = getattr(item, self.campo)
+        posicion = {'v': valor.isoformat() if hasattr(valor, 'isoformat') else valor, 'id': item.pk}
+        if atras:
+            posicion['a'] = 1
+        return base64.urlsafe_b64encode(json.dumps(posicion, separators=(',', ':')).encode()).decode()
+
+    def _decodificar(self, token, modelo):
+        try:
+            posicion = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            valor = modelo._meta.get_field(self.campo).to_python(posicion['v'])
+            return valor, int(posicion['id']), bool(posicion.get('a'))
+        except Exception:
+            raise NotFound('Cursor inválido')
+
+    def paginar(self, queryset, request):
+        self.request = request
+        token = request.query_params.get(self.cursor_query_param)
+        posicion = self._decodificar(token, queryset.model) if token else None
+        atras = bool(posicion and posicion[2])
+
+        # En la dirección "hacia atrás" se recorre el orden inverso y luego se invierte la página
+        hacia_menores = self.descendente != atras
+        prefijo = '-' if hacia_menores else ''
+        queryset = queryset.order_by(f'{prefijo}{self.campo}', f'{prefijo}id')
+        self.count = contar(queryset, self.modo_conteo)
+        if posicion:
+            valor, id_, _ = posicion
+            comparacion = 'lt' if hacia_menores else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.campo}__{comparacion}': valor}) | Q(**{self.campo: valor, f'id__{comparacion}': id_})
+            )
+
+        items = list(queryset[:self.tamano_pagina + 1])
+        hay_mas = len(items) > self.tamano_pagina
+        items = items[:self.tamano_pagina]
+        if atras:
+            items.reverse()
+
+        self.siguiente = self.anterior = None
+        if items:
+            if hay_mas or atras:
+                self.siguiente = self._codificar(items[-1], atras=False)
+            if (hay_mas and atras) or (posicion and not atras):
+                self.anterior = self._codificar(items[0], atras=True)
+        return items
+
+    def _enlace(self, token):
+        if token is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'paginacion')
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def respuesta(self, data):
+        return Response({
+            'count': self.count,
+            'next': self._enlace(self.siguiente),
+            'previous': self._enlace(self.anterior),
+            'results': data
+        })
+
+
+class CursorOpcionalMixin:
+    """
+    Permite pedir paginación por cursor en las vistas que declaran `campo_cursor`
+    (un campo único junto con id, p. ej. 'fecha'): con `?paginacion=cursor` para la
+    primera página o `?cursor=...` para las siguientes. Sin esos parámetros se pagina
+    por número de página con el total de PaginadorConteo; `conteo_exacto` indica si
+    `count` es exacto o estimado.
+
+    `?conteo=exacto|estimado|ninguno` controla el total (`count`) en modo cursor;
+    por defecto no se cuenta.
+    """
+    django_paginator_class = PaginadorConteo
+    conteo_cursor_por_defecto = 'ninguno'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginador_cursor = None
+        campo = getattr(view, 'campo_cursor', None)
+        if campo and (request.query_params.get('cursor') or request.query_params.get('paginacion') == 'cursor'):
+            modo = request.query_params.get('conteo', self.conteo_cursor_por_defecto)
+            if modo not in MODOS_CONTEO:
+                modo = self.conteo_cursor_por_defecto
+            # ?ordering=campo invierte el sentido; cualquier otro orden se reemplaza por la clave
+            descendente = request.query_params.get('ordering') != campo
+            self.paginador_cursor = PaginadorCursor(campo, self.get_page_size(request), descendente, modo)
+            return self.paginador_cursor.paginar(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.paginador_cursor is not None:
+            return self.paginador_cursor.respuesta(data)
+        response = super().get_paginated_response(data)
+        response.data['conteo_exacto'] = self.page.paginator.conteo_exacto
+        return response
+
+
+class PaginacionEstandar(CursorOpcionalMixin, PageNumberPagination):
     """
     Paginación estándar optimizada para la mayoría de endpoints
     - 20 items por página por defecto (balance entre UX y performance)
     - Permite hasta 100 items por página máximo
     - Mejora significativa en tiempo de carga con datasets grandes
+    - Total cacheado por filtros y estimado en tablas grandes (ver PaginadorConteo)
+    - Modo cursor opcional en vistas con `campo_cursor` (ver CursorOpcionalMixin)
     """
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class PaginacionGrande(PageNumberPagination):
+class PaginacionGrande(CursorOpcionalMixin, PageNumberPagination):
     """
     Paginación para listados extensos (reportes, exportaciones)
     - 50 items por página
     - Límite de 500 items para prevenir timeouts
+    - Total cacheado por filtros y estimado en tablas grandes (ver PaginadorConteo)
+    - Modo cursor opcional en vistas con `campo_cursor` (ver CursorOpcionalMixin)
     """
     page_size = 50
     page_size_query_param = 'page_size'
@@ -0,0 +1,209 @@
+"""
+Planificador de sondeo por dispositivo para el modo daemon de poll_devices.
+Cola de prioridad (heap) ordenada por la próxima hora de lectura de cada dispositivo:
+- Cada dispositivo usa su propio intervalo (Device.intervalo_sondeo)
+- Los dispositivos que no responden retroceden exponencialmente hasta un máximo
+- Los dispositivos cuyos consumibles bajan rápido se leen más seguido
+Los tiempos son segundos de un reloj monótono entregados por quien llama.
+"""
+import heapq
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_MINIMO = 30
+BACKOFF_MAXIMO = 3600
+CAIDA_RAPIDA = 0.05  # caída de nivel (fracción 0..1) entre dos lecturas que acelera el sondeo
+
+# Clave de caché donde el daemon publica sus métricas (ver publicar_metricas / leer_metricas)
+CLAVE_METRICAS = 'poll_devices_daemon_metricas'
+
+
+class _EstadoDispositivo:
+    __slots__ = ('intervalo_base', 'intervalo', 'fallos', 'programado')
+
+    def __init__(self, intervalo_base):
+        self.intervalo_base = intervalo_base
+        self.intervalo = intervalo_base
+        self.fallos = 0
+        self.programado = None
+
+
+class PlanificadorSondeo:
+    """
+    Cola de lecturas pendientes con intervalo adaptativo por dispositivo
+
+    Example:
+        >>> planificador = PlanificadorSondeo()
+        >>> planificador.agregar(device.pk, 300, ahora=0)
+        >>> planificador.extraer_vencidos(ahora=0)
+        [device.pk]
+        >>> planificador.registrar_exito(device.pk, ahora=1, caida=0.0)
+    """
+
+    def __init__(self, intervalo_minimo=INTERVALO_MINIMO, backoff_maximo=BACKOFF_MAXIMO,
+                 caida_rapida=CAIDA_RAPIDA, max_muestras=1000):
+        self.intervalo_minimo = intervalo_minimo
+        self.backoff_maximo = backoff_maximo
+        self.caida_rapida = caida_rapida
+        self._heap = []
+        self._estados = {}
+        self._retrasos = deque(maxlen=max_muestras)
+
+    def __len__(self):
+        return len(self._estados)
+
+    def ids(self):
+        """Ids de los dispositivos planificados"""
+        return list(self._estados)
+
+    def _programar(self, device_id, cuando):
+        estado = self._estados[device_id]
+        estado.programado = cuando
+        heapq.heappush(self._heap, (cuando, device_id))
+
+    def agregar(self, device_id, intervalo, ahora):
+        """Agrega (o actualiza el intervalo de) un dispositivo; los nuevos quedan vencidos de inmediato"""
+        intervalo = max(self.intervalo_minimo, intervalo)
+        estado = self._estados.get(device_id)
+        if estado is not None:
+            if estado.intervalo_base != intervalo:
+                estado.intervalo_base = intervalo
+                estado.intervalo = min(estado.intervalo, intervalo)
+            return
+        self._estados[device_id] = _EstadoDispositivo(intervalo)
+        self._programar(device_id, ahora)
+
+    def quitar(self, device_id):
+        """Saca un dispositivo de la planificación (la entrada del heap se descarta al salir)"""
+        self._estados.pop(device_id, None)
+
+    def extraer_vencidos(self, ahora):
+        """Retira de la cola los dispositivos cuya hora de lectura ya pasó, registrando su retraso"""
+        vencidos = []
+        while self._heap and self._heap[0][0] <= ahora:
+            cuando, device_id = heapq.heappop(self._heap)
+            estado = self._estados.get(device_id)
+            # Entradas obsoletas: dispositivo quitado o reprogramado después de encolar
+            if estado is None or estado.programado != cuando:
+                continue
+            estado.programado = None
+            self._retrasos.append(ahora - cuando)
+            vencidos.append(device_id)
+        return vencidos
+
+    def espera(self, ahora):
+        """Segundos hasta la próxima lectura programada (None si la cola está vacía)"""
+        while self._heap:
+            cuando, device_id = self._heap[0]
+            estado = self._estados.get(device_id)
+            if estado is not None and estado.programado == cuando:
+                return max(0.0, cuando - ahora)
+            heapq.heappop(self._heap)
+        return None
+
+    def registrar_exito(self, device_id, ahora, caida=0.0):
+        """
+        Reprograma tras una lectura válida
+
+        Args:
+            caida: Mayor descenso de nivel (fracción 0..1) observado entre esta lectura
+                y la anterior. Si supera `caida_rapida` el intervalo se reduce a la mitad;
+                si no, vuelve gradualmente al intervalo base
+        """
+        estado = self._estados.get(device_id)
+        if estado is None:
+            return
+        estado.fallos = 0
+        if caida >= self.caida_rapida:
+            estado.intervalo = max(self.intervalo_minimo, estado.intervalo / 2)
+        else:
+            estado.intervalo = min(estado.intervalo_base, estado.intervalo * 2)
+        self._programar(device_id, ahora + estado.intervalo)
+
+    def registrar_fallo(self, device_id, ahora):
+        """Reprograma con retroceso exponencial tras una lectura fallida"""
+        estado = self._estados.get(device_id)
+        if estado is None:
+            return
+        estado.fallos += 1
+        espera = max(estado.intervalo_base, min(self.backoff_maximo, estado.intervalo_base * (2 ** estado.fallos)))
+        self._programar(device_id, ahora + espera)
+
+    def metricas(self, ahora):
+        """Profundidad de la cola y retraso de las lecturas respecto de su hora programada"""
+        retrasos = sorted(self._retrasos)
+
+        def percentil(p):
+            if not retrasos:
+                return 0
+            return round(retrasos[min(len(retrasos) - 1, int(len(retrasos) * p))] * 1000, 2)
+
+        espera = self.espera(ahora)
+        return {
+            'dispositivos': len(self),
+            'profundidad_cola': sum(
+                1 for estado in self._estados.values() if estado.programado is not None and estado.programado <= ahora
+            ),
+            'en_backoff': sum(1 for estado in self._estados.values() if estado.fallos > 0),
+            'proxima_lectura_s': round(espera, 2) if espera is not None else None,
+            'retraso_ms': {
+                'p50': percentil(0.50),
+                'p95': percentil(0.95),
+                'max': round(retrasos[-1] * 1000, 2) if retrasos else 0,
+            }
+        }
+
+
+def _archivo_metricas():
+    from django.conf import settings
+    return getattr(settings, 'SONDEO_METRICAS_ARCHIVO', None)
+
+
+def publicar_metricas(metricas, vigencia):
+    """
+    Publica las métricas del daemon por `vigencia` segundos en el caché y en un archivo
+    JSON (SONDEO_METRICAS_ARCHIVO). Con el caché en memoria (por proceso) el servidor web
+    no ve lo que escribe el daemon: el archivo las comparte entre procesos del mismo host.
+    """
+    import json
+    import os
+    import time
+    from django.core.cache import cache
+
+    cache.set(CLAVE_METRICAS, metricas, vigencia)
+    archivo = _archivo_metricas()
+    if not archivo:
+        return
+    temporal = f'{archivo}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(archivo) or '.', exist_ok=True)
+        with open(temporal, 'w', encoding='utf-8') as salida:
+            json.dump({'expira': time.time() + vigencia, 'metricas': metricas}, salida)
+        # Reemplazo atómico: un lector nunca ve el archivo a medio escribir
+        os.replace(temporal, archivo)
+    except OSError as e:
+        logger.error(f"No se pudieron publicar las métricas de sondeo en {archivo}: {str(e)}")
+
+
+def leer_metricas():
+    """Métricas publicadas por el daemon (caché o archivo), o None si no hay vigentes"""
+    import json
+    import time
+    from django.core.cache import cache
+
+    metricas = cache.get(CLAVE_METRICAS)
+    if metricas is not None:
+        return metricas
+    archivo = _archivo_metricas()
+    if not archivo:
+        return None
+    try:
+        with open(archivo, encoding='utf-8') as entrada:
+            publicado = json.load(entrada)
+    except (OSError, ValueError):
+        return None
+    if publicado.get('expira', 0) < time.time():
+        return None
+    return publicado.get('metricas')
@@ -0,0 +1,124 @@
+"""
+Mantenimiento incremental de los resúmenes de movimientos por producto.
+
+ResumenProducto (totales) y ResumenDiarioProducto (por día local) se actualizan con
+UPDATE ... SET campo = campo + n dentro de la transacción que escribe los movimientos,
+de modo que nunca quedan desfasados respecto de la tabla Movimiento. Si la fila aún
+no existe se crea; una carrera con otro escritor se resuelve reintentando el UPDATE.
+
+`ultimo_movimiento` no admite resta: al sumar se conserva el mayor y al descontar
+(edición o eliminación) se recalcula con Max('fecha') de los movimientos restantes.
+"""
+import logging
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+from .models import Movimiento, ResumenProducto, ResumenDiarioProducto
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ('entradas', 'salidas', 'unidades_entrada', 'unidades_salida')
+
+
+def _incrementar(modelo, clave, deltas, maximos=None):
+    """
+    UPDATE con F() sobre la fila identificada por `clave`, creándola si no existe; los
+    campos de `maximos` conservan el mayor entre el valor guardado y el nuevo
+    """
+    cambios = {campo: F(campo) + valor for campo, valor in deltas.items() if valor}
+    cambios.update({
+        campo: Greatest(Coalesce(F(campo), Value(valor)), Value(valor)) for campo, valor in (maximos or {}).items()
+    })
+    if not cambios:
+        return
+    if modelo.objects.filter(**clave).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**clave, **deltas, **(maximos or {}))
+    except IntegrityError:
+        # Otro escritor creó la fila entre el UPDATE y el INSERT
+        modelo.objects.filter(**clave).update(**cambios)
+
+
+def acumular_movimientos(movimientos, signo=1):
+    """
+    Suma (signo=1) o descuenta (signo=-1) movimientos en los resúmenes
+
+    Debe llamarse dentro de la transacción que crea o elimina los movimientos.
+    Los movimientos se agrupan antes de escribir: el costo es de dos UPDATE por
+    producto tocado, no por movimiento (más uno al descontar, para `ultimo_movimiento`).
+    """
+    diarios = defaultdict(lambda: dict.fromkeys(CAMPOS, 0))
+    ultimos = {}
+    descontados = []
+    for movimiento in movimientos:
+        fecha = movimiento.fecha or timezone.now()
+        fila = diarios[(movimiento.producto_id, timezone.localdate(fecha))]
+        if movimiento.tipo == 'ENTRADA':
+            fila['entradas'] += signo
+            fila['unidades_entrada'] += signo * movimiento.cantidad
+        else:
+            fila['salidas'] += signo
+            fila['unidades_salida'] += signo * movimiento.cantidad
+        if signo < 0:
+            descontados.append(movimiento.pk)
+        elif movimiento.producto_id not in ultimos or fecha > ultimos[movimiento.producto_id]:
+            ultimos[movimiento.producto_id] = fecha
+
+    totales = defaultdict(lambda: dict.fromkeys(CAMPOS, 0))
+    for (producto_id, fecha), deltas in diarios.items():
+        _incrementar(ResumenDiarioProducto, {'producto_id': producto_id, 'fecha': fecha}, deltas)
+        for campo, valor in deltas.items():
+            totales[producto_id][campo] += valor
+
+    for producto_id, deltas in totales.items():
+        deltas['movimientos'] = deltas['entradas'] + deltas['salidas']
+        maximos = {'ultimo_movimiento': ultimos[producto_id]} if producto_id in ultimos else None
+        _incrementar(ResumenProducto, {'producto_id': producto_id}, deltas, maximos)
+
+    if descontados:
+        # Puede llamarse antes de eliminar o editar los movimientos: se excluyen por id
+        restantes = Movimiento.objects.filter(producto=OuterRef('producto_id')).exclude(pk__in=descontados)
+        ResumenProducto.objects.filter(producto_id__in=list(totales)).update(ultimo_movimiento=Subquery(
+            restantes.order_by().values('producto').annotate(ultimo=Max('fecha')).values('ultimo')
+        ))
+
+
+def reconstruir_resumenes():
+    """
+    Recalcula todos los resúmenes desde la tabla Movimiento (carga inicial o reparación
+    tras escrituras que no pasan por el modelo, como restauraciones de respaldo)
+
+    Returns:
+        Cantidad de productos con resumen
+    """
+    por_tipo = {
+        'entradas': Count('id', filter=Q(tipo='ENTRADA')),
+        'salidas': Count('id', filter=Q(tipo='SALIDA')),
+        'unidades_entrada': Sum('cantidad', filter=Q(tipo='ENTRADA'), default=0),
+        'unidades_salida': Sum('cantidad', filter=Q(tipo='SALIDA'), default=0),
+    }
+    with transaction.atomic():
+        ResumenDiarioProducto.objects.all().delete()
+        ResumenProducto.objects.all().delete()
+
+        diarios = Movimiento.objects.annotate(dia=TruncDate('fecha')).values(
+            'producto_id', 'dia'
+        ).annotate(**por_tipo).order_by()
+        ResumenDiarioProducto.objects.bulk_create(
+            [ResumenDiarioProducto(fecha=fila.pop('dia'), **fila) for fila in diarios],
+            batch_size=1000,
+        )
+        resumenes = [
+            ResumenProducto(movimientos=fila['entradas'] + fila['salidas'], **fila)
+            for fila in Movimiento.objects.values('producto_id').annotate(
+                ultimo_movimiento=Max('fecha'), **por_tipo
+            ).order_by()
+        ]
+        ResumenProducto.objects.bulk_create(resumenes, batch_size=1000)
+
+    logger.info(f"Resúmenes de movimientos reconstruidos - Productos: {len(resumenes)}")
+    return len(resumenes)
@@ -0,0 +1,28 @@
+"""
+Router de base de datos para el caché SQLite local (CACHE_BACKEND=sqlite).
+La tabla de DatabaseCache vive en la base 'cache'; el resto de los modelos
+sigue en 'default'.
+"""
+
+BASE_CACHE = 'cache'
+APP_CACHE = 'django_cache'
+
+
+class RouterCache:
+    """Envía las consultas de DatabaseCache a la base SQLite de caché"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == APP_CACHE:
+            return BASE_CACHE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # createcachetable consulta allow_migrate con app_label='django_cache'
+        if app_label == APP_CACHE:
+            return db == BASE_CACHE
+        if db == BASE_CACHE:
+            return False
+        return None
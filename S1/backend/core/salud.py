@@ -32,7 +32,7 @@ def verificar_cache():
         cache.delete(clave_test)
         
         if valor == 'test':
-            return {'status': 'ok'}
+            return {'status': 'ok', 'backend': getattr(settings, 'CACHE_BACKEND', 'memoria')}
         return {'status': 'error', 'mensaje': 'Cache no retorna valores correctos'}
     except Exception as e:
         return {'status': 'error', 'mensaje': str(e)}
@@ -69,6 +69,7 @@ def obtener_metricas_sistema():
 def obtener_metricas_aplicacion():
     """Obtiene métricas específicas de la aplicación"""
     from core.models import Producto, Movimiento, Alerta
+    from core.planificador import leer_metricas
     
     try:
         return {
@@ -77,6 +78,8 @@ def obtener_metricas_aplicacion():
                 'movimientos': Movimiento.objects.count(),
                 'alertas_activas': Alerta.objects.filter(activa=True).count()
             },
+            # Publicado por poll_devices --daemon (None si no está corriendo)
+            'sondeo': leer_metricas(),
             'configuracion': {
                 'debug': settings.DEBUG,
                 'base_datos': settings.DATABASES['default']['ENGINE'].split('.')[-1]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Producto, Movimiento, Alerta
+from django.db.models import Exists, OuterRef, Prefetch
+from .models import Producto, Movimiento, Alerta, Tarea
 from .validators import validar_stock, validar_precio, validar_cantidad_movimiento, validar_codigo_barras
 from django.db import transaction
 from decimal import Decimal
@@ -14,6 +15,9 @@ class ProductoSerializer(serializers.ModelSerializer):
         'Tambor', 'Kit', 'Repuesto', 'Otro'
     ]
     
+    # Cantidad de movimientos recientes incluidos por producto
+    ULTIMOS_MOVIMIENTOS = 3
+    
     # Campos calculados
     valor_total = serializers.SerializerMethodField()
     estado_stock = serializers.SerializerMethodField()
@@ -25,6 +29,24 @@ class ProductoSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['fecha_creacion']
     
+    @classmethod
+    def preparar_queryset(cls, queryset):
+        """
+        Agrega al queryset lo que necesitan los campos calculados, para que serializar
+        una página cueste un número fijo de consultas sin importar su tamaño:
+        - `con_alertas_activas`: EXISTS correlacionado en la misma consulta de productos
+        - `ultimos_movimientos_precargados`: los últimos N movimientos de todos los productos
+          de la página en una sola consulta con ROW_NUMBER() OVER (PARTITION BY producto)
+        """
+        recientes = Movimiento.objects.only(
+            'id', 'producto_id', 'tipo', 'cantidad', 'fecha', 'usuario'
+        ).order_by('-fecha', '-id')[:cls.ULTIMOS_MOVIMIENTOS]
+        return queryset.annotate(
+            con_alertas_activas=Exists(Alerta.objects.filter(producto=OuterRef('pk'), activa=True))
+        ).prefetch_related(
+            Prefetch('movimientos', queryset=recientes, to_attr='ultimos_movimientos_precargados')
+        )
+    
     def get_valor_total(self, obj):
         """Calcula valor total del inventario de este producto"""
         return float(obj.stock * obj.precio)
@@ -39,11 +61,15 @@ class ProductoSerializer(serializers.ModelSerializer):
     
     def get_tiene_alertas_activas(self, obj):
         """Indica si el producto tiene alertas activas"""
+        if hasattr(obj, 'con_alertas_activas'):
+            return obj.con_alertas_activas
         return obj.alertas.filter(activa=True).exists()
     
     def get_ultimos_movimientos(self, obj):
         """Retorna los últimos 3 movimientos"""
-        movimientos = obj.movimientos.order_by('-fecha')[:3]
+        movimientos = getattr(obj, 'ultimos_movimientos_precargados', None)
+        if movimientos is None:
+            movimientos = obj.movimientos.order_by('-fecha', '-id')[:self.ULTIMOS_MOVIMIENTOS]
         return [{
             'id': m.id,
             'tipo': m.tipo,
@@ -153,6 +179,20 @@ class MovimientoSerializer(serializers.ModelSerializer):
         return data
 
 
+class MovimientoLoteSerializer(serializers.Serializer):
+    """Un ítem de POST /api/movimientos/lote/ (la existencia y el stock se validan al aplicar el lote)"""
+    producto = serializers.IntegerField()
+    tipo = serializers.ChoiceField(choices=Movimiento.TIPO_CHOICES)
+    cantidad = serializers.IntegerField(validators=[validar_cantidad_movimiento])
+    descripcion = serializers.CharField()
+    
+    def to_internal_value(self, data):
+        # Se aceptan tipos en minúsculas como en los endpoints de escaneo
+        if isinstance(data, dict) and isinstance(data.get('tipo'), str):
+            data = {**data, 'tipo': data['tipo'].upper()}
+        return super().to_internal_value(data)
+
+
 class AlertaSerializer(serializers.ModelSerializer):
     """Serializer para el modelo Alerta con validaciones extendidas"""
     producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
@@ -191,3 +231,26 @@ class AlertaSerializer(serializers.ModelSerializer):
         
         return data
 
+
+class TareaSerializer(serializers.ModelSerializer):
+    """Serializer de solo lectura para consultar el estado de una tarea en segundo plano"""
+    url = serializers.HyperlinkedIdentityField(view_name='tarea-detail')
+    progreso = serializers.IntegerField(read_only=True)
+    url_descarga = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Tarea
+        fields = [
+            'id', 'url', 'tipo', 'estado', 'progreso', 'procesados', 'total', 'resultado', 'error',
+            'usuario', 'intentos', 'fecha_creacion', 'fecha_inicio', 'fecha_fin', 'url_descarga'
+        ]
+        read_only_fields = fields
+    
+    def get_url_descarga(self, obj):
+        """URL del archivo generado, disponible cuando la tarea terminó"""
+        if obj.estado != 'COMPLETADA' or not obj.archivo_resultado:
+            return None
+        from django.urls import reverse
+        url = reverse('tarea-descargar', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,169 @@
+"""
+Consolidación y poda de la serie de tiempo de niveles de consumibles.
+
+Niveles de resolución:
+- LecturaSuministro: lecturas crudas, se conservan `RETENCION_CRUDAS_DIAS`
+- ResumenLecturaSuministro HORA: mín/máx/promedio por hora, se conservan `RETENCION_HORAS_DIAS`
+- ResumenLecturaSuministro DIA: mín/máx/promedio por día, se conservan `RETENCION_DIAS_DIAS`
+
+Todas las operaciones son conjuntos (GROUP BY + upsert + DELETE por rango), idempotentes
+y seguras de re-ejecutar; el comando `compactar_lecturas` las orquesta.
+"""
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from .models import LecturaSuministro, ResumenLecturaSuministro
+
+logger = logging.getLogger(__name__)
+
+RETENCION_CRUDAS_DIAS = 7
+RETENCION_HORAS_DIAS = 90
+RETENCION_DIAS_DIAS = 730
+TAMANO_LOTE = 1000
+
+
+def _guardar_resumenes(periodo, filas):
+    """Upsert de resúmenes (una sentencia por lote) usando la restricción única"""
+    resumenes = [
+        ResumenLecturaSuministro(
+            suministro_id=fila['suministro_id'],
+            periodo=periodo,
+            inicio=fila['inicio'],
+            nivel_min=fila['nivel_min'],
+            nivel_max=fila['nivel_max'],
+            nivel_promedio=float(fila['nivel_promedio']),
+            muestras=fila['muestras'],
+        )
+        for fila in filas
+    ]
+    ResumenLecturaSuministro.objects.bulk_create(
+        resumenes,
+        batch_size=TAMANO_LOTE,
+        update_conflicts=True,
+        unique_fields=['suministro', 'periodo', 'inicio'],
+        update_fields=['nivel_min', 'nivel_max', 'nivel_promedio', 'muestras'],
+    )
+    return len(resumenes)
+
+
+def _inicio_pendiente(periodo):
+    """Inicio del último periodo ya consolidado (se recalcula por si quedó incompleto)"""
+    return ResumenLecturaSuministro.objects.filter(periodo=periodo).aggregate(ultimo=Max('inicio'))['ultimo']
+
+
+def consolidar_por_hora(hasta=None):
+    """
+    Resume las lecturas crudas por (suministro, hora) para las horas completas anteriores a `hasta`
+
+    Returns:
+        Cantidad de resúmenes horarios escritos
+    """
+    hasta = (hasta or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    lecturas = LecturaSuministro.objects.filter(fecha__lt=hasta)
+    desde = _inicio_pendiente('HORA')
+    if desde:
+        lecturas = lecturas.filter(fecha__gte=desde)
+
+    filas = lecturas.annotate(inicio=TruncHour('fecha')).values('suministro_id', 'inicio').annotate(
+        nivel_min=Min('nivel'),
+        nivel_max=Max('nivel'),
+        nivel_promedio=Avg('nivel'),
+        muestras=Count('id'),
+    ).order_by()
+
+    with transaction.atomic():
+        return _guardar_resumenes('HORA', filas)
+
+
+def consolidar_por_dia(hasta=None):
+    """
+    Resume los resúmenes horarios por (suministro, día) para los días completos anteriores a `hasta`.
+    El promedio diario se pondera por la cantidad de lecturas de cada hora.
+
+    Returns:
+        Cantidad de resúmenes diarios escritos
+    """
+    hasta = timezone.localtime(hasta or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    horas = ResumenLecturaSuministro.objects.filter(periodo='HORA', inicio__lt=hasta)
+    desde = _inicio_pendiente('DIA')
+    if desde:
+        horas = horas.filter(inicio__gte=desde)
+
+    filas = []
+    for fila in horas.annotate(dia=TruncDay('inicio')).values('suministro_id', 'dia').annotate(
+        nivel_min=Min('nivel_min'),
+        nivel_max=Max('nivel_max'),
+        suma_ponderada=Sum(F('nivel_promedio') * F('muestras')),
+        muestras=Sum('muestras'),
+    ).order_by():
+        fila['inicio'] = fila.pop('dia')
+        fila['nivel_promedio'] = fila.pop('suma_ponderada') / fila['muestras'] if fila['muestras'] else 0
+        filas.append(fila)
+
+    with transaction.atomic():
+        return _guardar_resumenes('DIA', filas)
+
+
+def podar(ahora=None, crudas_dias=RETENCION_CRUDAS_DIAS, horas_dias=RETENCION_HORAS_DIAS,
+          dias_dias=RETENCION_DIAS_DIAS):
+    """
+    Elimina los datos que superan su retención. Las lecturas crudas solo se borran
+    si su hora ya fue consolidada, para no perder información.
+
+    Returns:
+        Dict con la cantidad de filas eliminadas por nivel
+    """
+    ahora = ahora or timezone.now()
+    corte_crudas = ahora - timedelta(days=crudas_dias)
+    ultima_hora = _inicio_pendiente('HORA')
+    if ultima_hora is None:
+        corte_crudas = None
+    else:
+        corte_crudas = min(corte_crudas, ultima_hora)
+
+    eliminadas = {'crudas': 0, 'horas': 0, 'dias': 0}
+    if corte_crudas is not None:
+        eliminadas['crudas'], _ = LecturaSuministro.objects.filter(fecha__lt=corte_crudas).delete()
+    eliminadas['horas'], _ = ResumenLecturaSuministro.objects.filter(
+        periodo='HORA', inicio__lt=ahora - timedelta(days=horas_dias)
+    ).delete()
+    eliminadas['dias'], _ = ResumenLecturaSuministro.objects.filter(
+        periodo='DIA', inicio__lt=ahora - timedelta(days=dias_dias)
+    ).delete()
+    logger.info(
+        f"Poda de lecturas - Crudas: {eliminadas['crudas']}, "
+        f"Horas: {eliminadas['horas']}, Días: {eliminadas['dias']}"
+    )
+    return eliminadas
+
+
+def serie_suministro(suministro_id, desde, hasta=None):
+    """
+    Serie de niveles de un consumible con la resolución disponible para el rango:
+    crudas si `desde` está dentro de la retención de crudas, horaria si está dentro de
+    la retención horaria, diaria en otro caso.
+
+    Returns:
+        Lista de dicts con `fecha`, `nivel_min`, `nivel_max` y `nivel_promedio`
+    """
+    hasta = hasta or timezone.now()
+    antiguedad = timezone.now() - desde
+
+    if antiguedad <= timedelta(days=RETENCION_CRUDAS_DIAS):
+        return [
+            {'fecha': fecha, 'nivel_min': nivel, 'nivel_max': nivel, 'nivel_promedio': float(nivel)}
+            for fecha, nivel in LecturaSuministro.objects.filter(
+                suministro_id=suministro_id, fecha__gte=desde, fecha__lt=hasta
+            ).order_by('fecha').values_list('fecha', 'nivel')
+        ]
+
+    periodo = 'HORA' if antiguedad <= timedelta(days=RETENCION_HORAS_DIAS) else 'DIA'
+    return [
+        {'fecha': inicio, 'nivel_min': nivel_min, 'nivel_max': nivel_max, 'nivel_promedio': promedio}
+        for inicio, nivel_min, nivel_max, promedio in ResumenLecturaSuministro.objects.filter(
+            suministro_id=suministro_id, periodo=periodo, inicio__gte=desde, inicio__lt=hasta
+        ).order_by('inicio').values_list('inicio', 'nivel_min', 'nivel_max', 'nivel_promedio')
+    ]
@@ -0,0 +1,85 @@
+"""
+Actualizaciones atómicas de stock en una sola sentencia.
+
+En lugar de SELECT ... FOR UPDATE, comparación en Python, save() y relectura, el stock
+se modifica en la propia base de datos:
+
+    UPDATE core_producto SET stock = stock - n WHERE id = %s AND stock >= n RETURNING stock
+
+- La condición `stock >= n` hace imposible dejar stock negativo aunque varios
+  escaneos concurrentes descuenten el mismo producto: si no alcanza, la sentencia no
+  afecta filas y la salida se rechaza sin haber bloqueado nada
+- La fila queda bloqueada solo desde el UPDATE hasta el commit (no desde una lectura
+  previa), y el nuevo stock vuelve en la misma ida y vuelta con RETURNING
+- Las entradas usan `stock = stock + n`: nunca pierden una actualización concurrente
+
+Solo PostgreSQL y SQLite >= 3.35 se tratan como motores con RETURNING en UPDATE (se
+comprueba el motor, no `can_return_columns_from_insert`: MariaDB la activa sin aceptar
+UPDATE ... RETURNING). En el resto se usa el UPDATE condicional con F() del ORM y se
+relee el stock por clave primaria.
+"""
+from django.db import connections, router
+from django.db.models import F
+from .models import Producto
+
+
+def _conexion():
+    return connections[router.db_for_write(Producto)]
+
+
+def _update_returning(conexion):
+    """Indica si el motor acepta UPDATE ... RETURNING"""
+    if conexion.vendor == 'postgresql':
+        return True
+    return conexion.vendor == 'sqlite' and conexion.Database.sqlite_version_info >= (3, 35)
+
+
+def _actualizar(producto_id, delta, minimo=None):
+    conexion = _conexion()
+    if _update_returning(conexion):
+        nombre = conexion.ops.quote_name
+        tabla = nombre(Producto._meta.db_table)
+        pk = nombre(Producto._meta.pk.column)
+        stock = nombre(Producto._meta.get_field('stock').column)
+        sql = f'UPDATE {tabla} SET {stock} = {stock} + %s WHERE {pk} = %s'
+        params = [delta, producto_id]
+        if minimo is not None:
+            sql += f' AND {stock} >= %s'
+            params.append(minimo)
+        with conexion.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING {stock}', params)
+            fila = cursor.fetchone()
+        return fila[0] if fila else None
+
+    filas = Producto.objects.filter(pk=producto_id)
+    if minimo is not None:
+        filas = filas.filter(stock__gte=minimo)
+    if not filas.update(stock=F('stock') + delta):
+        return None
+    return stock_actual(producto_id)
+
+
+def sumar_stock(producto_id, cantidad):
+    """
+    Suma `cantidad` al stock del producto
+
+    Returns:
+        El nuevo stock, o None si el producto no existe
+    """
+    return _actualizar(producto_id, cantidad)
+
+
+def descontar_stock(producto_id, cantidad):
+    """
+    Descuenta `cantidad` solo si hay stock suficiente (decremento condicional)
+
+    Returns:
+        El nuevo stock, o None si el stock no alcanza o el producto no existe
+        (ver `stock_actual` para distinguirlos)
+    """
+    return _actualizar(producto_id, -cantidad, minimo=cantidad)
+
+
+def stock_actual(producto_id):
+    """Stock guardado del producto, o None si no existe"""
+    return Producto.objects.filter(pk=producto_id).values_list('stock', flat=True).first()
@@ -0,0 +1,290 @@
+"""
+Cola de tareas en segundo plano sobre la tabla Tarea (sin broker externo).
+
+- `encolar` registra la tarea PENDIENTE y retorna de inmediato (el endpoint responde 202)
+- `tomar_siguiente` reclama la más antigua con un UPDATE condicional sobre estado=PENDIENTE:
+  si dos workers compiten por la misma fila solo uno obtiene rowcount 1
+- `ejecutar` corre el manejador registrado para el tipo; el manejador informa su avance
+  con `Progreso` (que también actúa de latido) y deja el archivo de resultado en
+  MEDIA_ROOT/tareas/resultado/
+- `recuperar_abandonadas` devuelve a la cola las tareas EN_PROCESO sin latido reciente
+  (worker caído) hasta `MAX_INTENTOS`; después quedan FALLIDAS
+
+Los workers son procesos del comando `procesar_tareas`, cada uno con un pool de hilos.
+Con TAREAS_EN_PROCESO=True el propio servidor ejecuta las tareas en un pool local de
+hilos al confirmar la transacción que las encola (útil en desarrollo, sin worker aparte).
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Producto, Tarea
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_PROGRESO = 1.0  # segundos mínimos entre escrituras de avance
+LATIDO_MAXIMO = 300  # segundos sin latido tras los que una tarea EN_PROCESO se da por abandonada
+MAX_INTENTOS = 3
+
+MANEJADORES = {}
+
+
+def manejador(tipo):
+    """Registra la función que ejecuta las tareas de `tipo`: funcion(tarea, progreso) -> resultado"""
+    def registrar(funcion):
+        MANEJADORES[tipo] = funcion
+        return funcion
+    return registrar
+
+
+class Progreso:
+    """
+    Avance de una tarea en ejecución. Las escrituras a la BD se limitan a una cada
+    `intervalo` segundos para que informar avance no pese en tareas con millones de filas.
+    """
+
+    def __init__(self, tarea, intervalo=INTERVALO_PROGRESO):
+        self.tarea = tarea
+        self.intervalo = intervalo
+        self.procesados = 0
+        self.total = None
+        self._ultima_escritura = time.monotonic()
+
+    def fijar_total(self, total):
+        self.total = total
+        self._escribir()
+
+    def avanzar(self, procesados=None, cantidad=1):
+        """Registra el avance absoluto (`procesados`) o relativo (`cantidad`)"""
+        self.procesados = procesados if procesados is not None else self.procesados + cantidad
+        if time.monotonic() - self._ultima_escritura >= self.intervalo:
+            self._escribir()
+
+    def contar(self, filas):
+        """Envuelve un iterable de filas avanzando una unidad por cada fila entregada"""
+        for fila in filas:
+            yield fila
+            self.avanzar()
+
+    def _escribir(self):
+        self._ultima_escritura = time.monotonic()
+        Tarea.objects.filter(pk=self.tarea.pk).update(
+            procesados=self.procesados, total=self.total, latido=timezone.now()
+        )
+
+
+def encolar(tipo, parametros=None, archivo=None, usuario=''):
+    """
+    Crea una tarea PENDIENTE
+
+    Args:
+        archivo: Archivo subido opcional que la tarea procesará (se guarda en MEDIA_ROOT)
+
+    Returns:
+        La Tarea creada
+    """
+    if tipo not in MANEJADORES:
+        raise ValueError(f'Tipo de tarea desconocido: {tipo}')
+    tarea = Tarea(tipo=tipo, parametros=parametros or {}, usuario=usuario)
+    if archivo is not None:
+        tarea.archivo_entrada.save(os.path.basename(archivo.name), archivo, save=False)
+    tarea.save()
+    logger.info(f"Tarea encolada - {tarea.tipo} #{tarea.pk}, Usuario: {usuario}")
+    if getattr(settings, 'TAREAS_EN_PROCESO', False):
+        transaction.on_commit(lambda: _pool_local().submit(_ejecutar_una_en_hilo))
+    return tarea
+
+
+def tomar_siguiente(worker):
+    """Reclama la tarea pendiente más antigua para `worker`; None si la cola está vacía"""
+    while True:
+        candidata = Tarea.objects.filter(estado='PENDIENTE').order_by('fecha_creacion', 'id').values_list(
+            'pk', flat=True
+        ).first()
+        if candidata is None:
+            return None
+        ahora = timezone.now()
+        tomada = Tarea.objects.filter(pk=candidata, estado='PENDIENTE').update(
+            estado='EN_PROCESO', worker=worker, fecha_inicio=ahora, latido=ahora, intentos=F('intentos') + 1
+        )
+        if tomada:
+            return Tarea.objects.get(pk=candidata)
+        # Otro worker la tomó entre la lectura y el UPDATE: probar con la siguiente
+
+
+def ejecutar(tarea):
+    """
+    Ejecuta una tarea ya reclamada y registra el resultado o el error
+
+    Returns:
+        True si la tarea terminó correctamente
+    """
+    progreso = Progreso(tarea)
+    inicio = time.time()
+    try:
+        funcion = MANEJADORES.get(tarea.tipo)
+        if funcion is None:
+            raise ValueError(f'Tipo de tarea desconocido: {tarea.tipo}')
+        resultado = funcion(tarea, progreso)
+    except Exception as e:
+        logger.error(f"Tarea fallida - {tarea.tipo} #{tarea.pk}: {str(e)}", exc_info=True)
+        Tarea.objects.filter(pk=tarea.pk, worker=tarea.worker, estado='EN_PROCESO').update(
+            estado='FALLIDA', error=str(e), fecha_fin=timezone.now(), latido=timezone.now()
+        )
+        return False
+
+    # Solo el worker que la tiene asignada la cierra (pudo ser reasignada por abandono)
+    Tarea.objects.filter(pk=tarea.pk, worker=tarea.worker, estado='EN_PROCESO').update(
+        estado='COMPLETADA',
+        resultado=resultado,
+        archivo_resultado=tarea.archivo_resultado.name or '',
+        procesados=progreso.procesados,
+        total=progreso.total if progreso.total is not None else progreso.procesados,
+        fecha_fin=timezone.now(),
+        latido=timezone.now()
+    )
+    logger.info(f"Tarea completada - {tarea.tipo} #{tarea.pk} en {time.time() - inicio:.2f}s")
+    return True
+
+
+def recuperar_abandonadas(latido_maximo=LATIDO_MAXIMO, max_intentos=MAX_INTENTOS):
+    """
+    Reencola las tareas EN_PROCESO cuyo worker dejó de dar señales
+
+    Returns:
+        Tupla (reencoladas, fallidas)
+    """
+    limite = timezone.now() - timedelta(seconds=latido_maximo)
+    abandonadas = Tarea.objects.filter(estado='EN_PROCESO', latido__lt=limite)
+    fallidas = abandonadas.filter(intentos__gte=max_intentos).update(
+        estado='FALLIDA', error='El worker dejó de responder', fecha_fin=timezone.now()
+    )
+    reencoladas = abandonadas.filter(intentos__lt=max_intentos).update(estado='PENDIENTE', worker='')
+    if reencoladas or fallidas:
+        logger.warning(f"Tareas abandonadas - Reencoladas: {reencoladas}, Fallidas: {fallidas}")
+    return reencoladas, fallidas
+
+
+def procesar_pendientes(worker, maximo=None):
+    """Ejecuta tareas pendientes hasta vaciar la cola (o hasta `maximo`); retorna cuántas tomó"""
+    procesadas = 0
+    while maximo is None or procesadas < maximo:
+        tarea = tomar_siguiente(worker)
+        if tarea is None:
+            break
+        ejecutar(tarea)
+        procesadas += 1
+    return procesadas
+
+
+def limpiar_terminadas(dias):
+    """Elimina las tareas terminadas hace más de `dias` días junto con sus archivos"""
+    limite = timezone.now() - timedelta(days=dias)
+    eliminadas = 0
+    for tarea in Tarea.objects.filter(estado__in=['COMPLETADA', 'FALLIDA'], fecha_fin__lt=limite).iterator():
+        for archivo in (tarea.archivo_entrada, tarea.archivo_resultado):
+            if archivo:
+                archivo.delete(save=False)
+        tarea.delete()
+        eliminadas += 1
+    return eliminadas
+
+
+# ========== Pool local (TAREAS_EN_PROCESO) ==========
+
+_pool = None
+_candado_pool = threading.Lock()
+
+
+def _pool_local():
+    global _pool
+    with _candado_pool:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TAREAS_HILOS', 2), thread_name_prefix='tareas'
+            )
+        return _pool
+
+
+def _ejecutar_una_en_hilo():
+    close_old_connections()
+    try:
+        procesar_pendientes(f'local-{os.getpid()}-{threading.get_ident()}', maximo=1)
+    finally:
+        close_old_connections()
+
+
+# ========== Manejadores ==========
+
+def _guardar_csv(tarea, prefijo, encabezado, filas):
+    """Escribe el CSV en un temporal y lo guarda como archivo de resultado de la tarea"""
+    from .exportacion import generar_csv
+
+    nombre = f'{prefijo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    with tempfile.TemporaryFile(mode='w+b') as temporal:
+        for bloque in generar_csv(encabezado, filas):
+            temporal.write(bloque.encode('utf-8'))
+        temporal.seek(0)
+        tarea.archivo_resultado.save(nombre, File(temporal), save=False)
+
+
+@manejador('IMPORTAR_PRODUCTOS')
+def _importar_productos(tarea, progreso):
+    from .importacion import importar_productos, importar_ruta
+
+    # Un commit por bloque para que el avance (en bytes leídos) y el latido sean visibles
+    progreso.fijar_total(tarea.archivo_entrada.size)
+    try:
+        ruta = tarea.archivo_entrada.path
+    except NotImplementedError:
+        ruta = None  # almacenamiento sin rutas locales: lectura secuencial del stream
+    if ruta:
+        return importar_ruta(ruta, al_avanzar=progreso.avanzar, atomico=False)
+    with tarea.archivo_entrada.open('rb') as archivo:
+        return importar_productos(archivo, al_avanzar=progreso.avanzar, atomico=False)
+
+
+@manejador('EXPORTAR_PRODUCTOS')
+def _exportar_productos(tarea, progreso):
+    from .exportacion import ENCABEZADO_PRODUCTOS, filas_productos
+
+    productos = Producto.objects.order_by('-fecha_creacion')
+    progreso.fijar_total(productos.count())
+    _guardar_csv(tarea, 'productos', ENCABEZADO_PRODUCTOS, progreso.contar(filas_productos(productos)))
+    return {'filas': progreso.procesados}
+
+
+@manejador('EXPORTAR_MOVIMIENTOS')
+def _exportar_movimientos(tarea, progreso):
+    from .exportacion import ENCABEZADO_MOVIMIENTOS, filas_movimientos
+    from .filters import MovimientoFilter
+    from .models import Movimiento
+
+    filtro = MovimientoFilter(tarea.parametros, queryset=Movimiento.objects.all())
+    if not filtro.is_valid():
+        raise ValueError(f'Filtros inválidos: {dict(filtro.errors)}')
+    movimientos = filtro.qs.order_by('-fecha')
+    progreso.fijar_total(movimientos.count())
+    _guardar_csv(tarea, 'movimientos', ENCABEZADO_MOVIMIENTOS, progreso.contar(filas_movimientos(movimientos)))
+    return {'filas': progreso.procesados}
+
+
+@manejador('EXPORTAR_REPORTE')
+def _exportar_reporte(tarea, progreso):
+    from .exportacion import ENCABEZADO_REPORTE, filas_reporte, productos_reporte
+
+    # El avance cuenta productos; las filas de encabezado y resumen no suman
+    progreso.fijar_total(productos_reporte(tarea.parametros).count())
+    _guardar_csv(
+        tarea, 'reporte_inventario', ENCABEZADO_REPORTE,
+        filas_reporte(tarea.parametros, al_avanzar=progreso.avanzar)
+    )
+    return {'productos': progreso.procesados}
@@ -1,7 +1,7 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Producto, Movimiento, Alerta
+from .models import Producto, Movimiento, Alerta, Device
 from decimal import Decimal
 
 
@@ -483,6 +483,55 @@ class PerformanceTestCase(APITestCase):
         print(f"  - Total productos: {response.data['resumen']['total_productos']}")
         print(f"  - Alertas activas: {response.data['resumen']['alertas_activas']}")
     
+    def test_dashboard_presupuesto_consultas(self):
+        """Verifica que el dashboard use un número fijo de consultas sin importar el volumen"""
+        from django.core.cache import cache
+        from .metricas import CONSULTAS_DASHBOARD
+    
+        cache.delete('metricas_dashboard')
+        with self.assertNumQueries(CONSULTAS_DASHBOARD):
+            response = self.client.get('/api/productos/metricas_dashboard/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['movimientos_semana']), 7)
+    
+        # Más productos y movimientos no agregan consultas
+        for producto in self.productos[:10]:
+            producto.registrar_entrada(3, "Reposición")
+        with self.assertNumQueries(CONSULTAS_DASHBOARD):
+            response = self.client.get('/api/productos/metricas_dashboard/?refresh=1')
+        self.assertEqual(response.data['actividad_hoy']['entradas'], 10)
+        self.assertEqual(response.data['movimientos_semana'][0]['entradas'], 10)
+    
+        print(f"[OK] Dashboard generado en {CONSULTAS_DASHBOARD} consultas")
+
+    def test_listado_productos_consultas_constantes(self):
+        """Verifica que el listado de productos no haga consultas por fila (sin N+1)"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+    
+        Alerta.objects.create(producto=self.productos[0], umbral=100, activa=True)
+        consultas = {}
+        for tamano in (5, 50):
+            with CaptureQueriesContext(connection) as contexto:
+                response = self.client.get(f'/api/productos/?page_size={tamano}')
+            self.assertEqual(len(response.data['results']), tamano)
+            consultas[tamano] = len(contexto.captured_queries)
+    
+        self.assertEqual(consultas[5], consultas[50])
+        self.assertLessEqual(consultas[50], 3)
+    
+        # Los campos precargados coinciden con los del camino por fila
+        from .serializers import ProductoSerializer
+        por_id = {p['id']: p for p in response.data['results']}
+        for producto in self.productos[:3]:
+            esperado = ProductoSerializer(Producto.objects.get(pk=producto.pk)).data
+            self.assertEqual(por_id[producto.pk]['ultimos_movimientos'], esperado['ultimos_movimientos'])
+            self.assertEqual(por_id[producto.pk]['tiene_alertas_activas'], esperado['tiene_alertas_activas'])
+        self.assertEqual(len(por_id[self.productos[0].pk]['ultimos_movimientos']), 2)
+        self.assertTrue(por_id[self.productos[0].pk]['tiene_alertas_activas'])
+    
+        print(f"[OK] Listado de productos en {consultas[50]} consultas para 5 y 50 filas")
+    
     def test_listar_productos_con_filtros_performance(self):
         """Verifica que filtrar productos sea rápido"""
         import time
@@ -1008,3 +1057,2299 @@ class NuevasFuncionalidadesTestCase(APITestCase):
         mov_db = Movimiento.objects.get(id=movimiento.id)
         self.assertEqual(mov_db.usuario, "JuanPerez")
 
+
+class PollDevicesTestCase(TestCase):
+    """Tests para el sondeo concurrente de dispositivos (poll_devices)"""
+    
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            nombre="Toner Monitoreado",
+            precio=20000,
+            stock=10,
+            categoria="Toner"
+        )
+    
+    def test_barrido_1000_dispositivos_simulados(self):
+        """Verifica que un barrido de 1000 impresoras simuladas sea concurrente"""
+        import time
+        from .adapters.snmp_simulado import AgenteSnmpSimulado
+        from .adapters.sondeo import leer_en_paralelo
+        
+        agente = AgenteSnmpSimulado(latencia=0.01)
+        dispositivos = [
+            Device(nombre=f"Impresora {i}", ip=f"10.0.{i // 250}.{i % 250 + 1}", producto=self.producto)
+            for i in range(1000)
+        ]
+        
+        start_time = time.time()
+        resultados = list(leer_en_paralelo(
+            dispositivos, lambda d, plazo: agente.read_supply(d, timeout=plazo), concurrencia=64, plazo=1.0
+        ))
+        elapsed_time = time.time() - start_time
+        
+        self.assertEqual(len(resultados), 1000)
+        self.assertEqual(agente.consultas, 1000)
+        # En secuencia serían >= 10s; con 64 hilos debe ser muy inferior
+        self.assertLess(elapsed_time, 3.0,
+            f"Barrido de 1000 dispositivos tomó {elapsed_time:.3f}s, debe ser < 3s")
+        
+        print(f"[OK] 1000 dispositivos simulados sondeados en {elapsed_time:.3f}s")
+    
+    def test_dispositivo_caido_no_bloquea_barrido(self):
+        """Verifica que un dispositivo sin respuesta solo ocupe un worker"""
+        import time
+        from .adapters.snmp_simulado import AgenteSnmpSimulado
+        from .adapters.sondeo import leer_en_paralelo
+        
+        agente = AgenteSnmpSimulado(latencia=0.01, caidos={'10.0.0.1'})
+        dispositivos = [
+            Device(nombre=f"Impresora {i}", ip=f"10.0.0.{i + 1}", producto=self.producto)
+            for i in range(40)
+        ]
+        
+        start_time = time.time()
+        resultados = dict(
+            (str(d.ip), res) for d, res in leer_en_paralelo(
+                dispositivos, lambda d, plazo: agente.read_supply(d, timeout=plazo / 2), concurrencia=4, plazo=0.5
+            )
+        )
+        elapsed_time = time.time() - start_time
+        
+        self.assertIsNone(resultados['10.0.0.1'])
+        self.assertEqual(resultados['10.0.0.2'], (100, 100))
+        self.assertLess(elapsed_time, 1.0)
+    
+    def test_comando_registra_salida(self):
+        """Verifica que poll_devices registre una salida a partir de la lectura"""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from .adapters.snmp_simulado import AgenteSnmpSimulado
+        
+        device = Device.objects.create(nombre="HP Oficina", ip="10.0.0.10", producto=self.producto)
+        agente = AgenteSnmpSimulado(latencia=0)
+        agente.fijar_nivel("10.0.0.10", 50, 100)
+        
+        salida = StringIO()
+        with mock.patch('core.management.commands.poll_devices.read_all_supplies', agente.read_all_supplies):
+            call_command('poll_devices', concurrencia=4, plazo=1.0, stdout=salida)
+        
+        self.producto.refresh_from_db()
+        device.refresh_from_db()
+        self.assertEqual(self.producto.stock, 5)
+        self.assertIsNotNone(device.ultima_lectura)
+        self.assertIn('Sondeo completado: 1 dispositivos', salida.getvalue())
+    
+    def test_comando_lee_todos_los_suministros(self):
+        """Verifica que un solo sondeo registre cada consumible y actualice los productos mapeados"""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from .adapters.snmp_simulado import AgenteSnmpSimulado
+        from .models import SuministroDispositivo
+        
+        cian = Producto.objects.create(nombre="Toner Cian", precio=20000, stock=10, categoria="Toner")
+        device = Device.objects.create(nombre="HP Color", ip="10.0.0.11", producto=self.producto)
+        SuministroDispositivo.objects.create(
+            dispositivo=device, indice=2, descripcion="Cyan", nivel=100, capacidad_maxima=100, producto=cian
+        )
+        agente = AgenteSnmpSimulado(latencia=0)
+        agente.fijar_suministros("10.0.0.11", [
+            ("Black Toner", 100, 100),
+            ("Cyan Toner", 30, 100),
+            ("Magenta Toner", -3, 100),
+            ("Yellow Toner", 80, 100),
+        ])
+        
+        with mock.patch('core.management.commands.poll_devices.read_all_supplies', agente.read_all_supplies):
+            call_command('poll_devices', stdout=StringIO())
+        
+        self.assertEqual(agente.consultas, 1)
+        self.assertEqual(device.suministros.count(), 4)
+        self.assertEqual(device.suministros.get(indice=2).descripcion, "Cyan Toner")
+        self.assertIsNone(device.suministros.get(indice=3).porcentaje)
+        cian.refresh_from_db()
+        self.producto.refresh_from_db()
+        self.assertEqual(cian.stock, 3)
+        self.assertEqual(self.producto.stock, 10)
+    
+    def test_lectura_sin_cambios_no_escribe(self):
+        """Verifica que una lectura idéntica a la anterior no genere escrituras por dispositivo"""
+        from .lecturas import ProcesadorLecturas
+        from .models import LecturaSuministro
+        
+        devices = [
+            Device.objects.create(nombre=f"Impresora {i}", ip=f"10.0.1.{i + 1}", producto=self.producto)
+            for i in range(10)
+        ]
+        lectura = [{'indice': 1, 'descripcion': 'Black Toner', 'nivel': 50, 'capacidad': 100}]
+        
+        procesador = ProcesadorLecturas()
+        procesador.cargar(devices)
+        for device in devices:
+            self.assertTrue(procesador.registrar(device, lectura))
+        resultado = procesador.aplicar()
+        self.assertEqual(resultado['con_cambios'], 10)
+        movimientos = Movimiento.objects.count()
+        
+        # Segundo barrido: nada cambió, solo se agrega la serie en bloque (más el savepoint)
+        for device in devices:
+            self.assertFalse(procesador.registrar(device, lectura))
+        with self.assertNumQueries(3):
+            resultado = procesador.aplicar()
+        self.assertEqual(resultado['sin_cambios'], 10)
+        self.assertEqual(resultado['movimientos'], [])
+        self.assertEqual(Movimiento.objects.count(), movimientos)
+        self.assertEqual(LecturaSuministro.objects.count(), 20)
+    
+    def test_ultima_lectura_sin_cambios_se_descarga_por_intervalo(self):
+        """Verifica que la ultima_lectura de dispositivos sin cambios se escriba cada N barridos"""
+        from .lecturas import ProcesadorLecturas
+        
+        device = Device.objects.create(nombre="Impresora Vista", ip="10.0.1.50", producto=self.producto)
+        lectura = [{'indice': 1, 'descripcion': 'Black Toner', 'nivel': 50, 'capacidad': 100}]
+        procesador = ProcesadorLecturas(descarga_cada=3)
+        procesador.registrar(device, lectura)
+        procesador.aplicar()
+        device.refresh_from_db()
+        primera = device.ultima_lectura
+        self.assertIsNotNone(primera)
+        
+        procesador.registrar(device, lectura)
+        procesador.aplicar()
+        device.refresh_from_db()
+        self.assertEqual(device.ultima_lectura, primera)
+        
+        # Tercer barrido: se descarga la fecha de la última lectura en memoria
+        procesador.registrar(device, lectura)
+        procesador.aplicar()
+        device.refresh_from_db()
+        self.assertGreater(device.ultima_lectura, primera)
+        self.assertEqual(device.suministros.get().ultima_lectura, device.ultima_lectura)
+        self.assertEqual(procesador.descargar_vistos(), 0)
+    
+    def test_cambios_aplicados_en_lote(self):
+        """Verifica que varios cambios del barrido generen movimientos en una sola transacción"""
+        from .lecturas import ProcesadorLecturas
+        
+        productos = [
+            Producto.objects.create(nombre=f"Toner Lote {i}", precio=10000, stock=20, categoria="Toner")
+            for i in range(5)
+        ]
+        devices = [
+            Device.objects.create(nombre=f"Impresora {i}", ip=f"10.0.2.{i + 1}", producto=p)
+            for i, p in enumerate(productos)
+        ]
+        procesador = ProcesadorLecturas()
+        procesador.cargar(devices)
+        for device in devices:
+            procesador.registrar(device, [{'indice': 1, 'descripcion': 'Black', 'nivel': 25, 'capacidad': 100}])
+        resultado = procesador.aplicar()
+        
+        self.assertEqual(len(resultado['movimientos']), 5)
+        for producto in productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, 5)
+            self.assertEqual(producto.movimientos.get().cantidad, 15)
+
+
+class AdaptadorSnmpTestCase(TestCase):
+    """Tests para la reutilización de motor y destinos en el adaptador SNMP"""
+    
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre="Toner Color", precio=30000, stock=4)
+        self.device = Device(nombre="Canon Piso 2", ip="10.0.0.20", comunidad_snmp="tisol", producto=self.producto)
+    
+    def _respuesta(self, *valores):
+        return iter([(None, 0, 0, [(None, v) for v in valores])])
+    
+    def test_reutiliza_motor_y_destinos(self):
+        """Verifica que lecturas repetidas compartan SnmpEngine, CommunityData y transporte"""
+        from unittest import mock
+        from .adapters.snmp_adapter import AdaptadorSnmp
+        
+        adaptador = AdaptadorSnmp()
+        with mock.patch('core.adapters.snmp_adapter.getCmd', side_effect=lambda *a: self._respuesta(40, 100)) as get_cmd:
+            self.assertEqual(adaptador.read_supply(self.device), (40, 100))
+            self.assertEqual(adaptador.read_supply(self.device, index=2), (40, 100))
+        
+        primera, segunda = get_cmd.call_args_list
+        self.assertIs(primera.args[0], segunda.args[0])
+        self.assertIs(primera.args[1], segunda.args[1])
+        self.assertIs(primera.args[2], segunda.args[2])
+        self.assertEqual(adaptador.estadisticas()['motores'], 1)
+    
+    def test_estadisticas_latencia(self):
+        """Verifica que se registren consultas exitosas y fallidas"""
+        from unittest import mock
+        from .adapters.snmp_adapter import AdaptadorSnmp
+        
+        adaptador = AdaptadorSnmp()
+        respuestas = [self._respuesta(40, 100), iter([('requestTimedOut', 0, 0, [])])]
+        with mock.patch('core.adapters.snmp_adapter.getCmd', side_effect=lambda *a: respuestas.pop(0)):
+            adaptador.read_supply(self.device)
+            self.assertIsNone(adaptador.read_supply(self.device))
+        
+        stats = adaptador.estadisticas()
+        self.assertEqual(stats['consultas'], 2)
+        self.assertEqual(stats['errores'], 1)
+        self.assertIn('p95', stats['latencia_ms'])
+    
+    def test_read_all_supplies_un_recorrido_bulk(self):
+        """Verifica que todos los consumibles se obtengan con un recorrido GETBULK"""
+        from unittest import mock
+        from .adapters.snmp_adapter import AdaptadorSnmp
+        
+        def fila(indice, descripcion, capacidad, nivel):
+            oid = (1, 3, 6, 1, 2, 1, 43, 11, 1, 1, 9, 1, indice)
+            return (None, 0, 0, [(None, descripcion), (None, capacidad), (oid, nivel)])
+        
+        filas = [fila(1, 'Black', 100, 40), fila(2, 'Cyan', 100, 75), fila(3, 'Magenta', 100, -3)]
+        adaptador = AdaptadorSnmp()
+        with mock.patch('core.adapters.snmp_adapter.bulkCmd', return_value=iter(filas)) as bulk_cmd:
+            suministros = adaptador.read_all_supplies(self.device)
+        
+        bulk_cmd.assert_called_once()
+        self.assertEqual([s['indice'] for s in suministros], [1, 2, 3])
+        self.assertEqual(suministros[1], {'indice': 2, 'descripcion': 'Cyan', 'nivel': 75, 'capacidad': 100})
+        stats = adaptador.estadisticas()
+        self.assertEqual(stats['consultas'], 1)
+        self.assertEqual(stats['errores'], 0)
+
+
+class PlanificadorSondeoTestCase(TestCase):
+    """Tests para la planificación por dispositivo del daemon de sondeo"""
+    
+    def test_intervalo_propio_por_dispositivo(self):
+        """Verifica que cada dispositivo se reprograme según su intervalo"""
+        from .planificador import PlanificadorSondeo
+        
+        planificador = PlanificadorSondeo(intervalo_minimo=10)
+        planificador.agregar(1, 60, ahora=0)
+        planificador.agregar(2, 600, ahora=0)
+        self.assertEqual(sorted(planificador.extraer_vencidos(ahora=0)), [1, 2])
+        planificador.registrar_exito(1, ahora=0)
+        planificador.registrar_exito(2, ahora=0)
+        
+        self.assertEqual(planificador.extraer_vencidos(ahora=59), [])
+        self.assertEqual(planificador.extraer_vencidos(ahora=60), [1])
+        self.assertEqual(planificador.espera(ahora=60), 540)
+    
+    def test_backoff_exponencial_dispositivo_caido(self):
+        """Verifica que los fallos consecutivos dupliquen la espera hasta el máximo"""
+        from .planificador import PlanificadorSondeo
+        
+        planificador = PlanificadorSondeo(intervalo_minimo=10, backoff_maximo=500)
+        planificador.agregar(1, 60, ahora=0)
+        esperas = []
+        ahora = 0
+        for _ in range(5):
+            planificador.extraer_vencidos(ahora)
+            planificador.registrar_fallo(1, ahora)
+            espera = planificador.espera(ahora)
+            esperas.append(espera)
+            ahora += espera
+        self.assertEqual(esperas, [120, 240, 480, 500, 500])
+        
+        planificador.extraer_vencidos(ahora)
+        planificador.registrar_exito(1, ahora)
+        self.assertEqual(planificador.espera(ahora), 60)
+    
+    def test_caida_rapida_acelera_sondeo(self):
+        """Verifica que una caída rápida de nivel acorte el intervalo y luego se recupere"""
+        from .planificador import PlanificadorSondeo
+        
+        planificador = PlanificadorSondeo(intervalo_minimo=30, caida_rapida=0.05)
+        planificador.agregar(1, 240, ahora=0)
+        planificador.extraer_vencidos(0)
+        planificador.registrar_exito(1, ahora=0, caida=0.10)
+        self.assertEqual(planificador.espera(0), 120)
+        planificador.extraer_vencidos(120)
+        planificador.registrar_exito(1, ahora=120, caida=0.20)
+        self.assertEqual(planificador.espera(120), 60)
+        planificador.extraer_vencidos(180)
+        planificador.registrar_exito(1, ahora=180, caida=0.0)
+        self.assertEqual(planificador.espera(180), 120)
+    
+    def test_metricas_cola_y_retraso(self):
+        """Verifica profundidad de cola y retraso respecto de la hora programada"""
+        from .planificador import PlanificadorSondeo
+        
+        planificador = PlanificadorSondeo()
+        for device_id in range(1, 4):
+            planificador.agregar(device_id, 300, ahora=0)
+        self.assertEqual(planificador.metricas(ahora=5)['profundidad_cola'], 3)
+        
+        planificador.extraer_vencidos(ahora=2)
+        metricas = planificador.metricas(ahora=2)
+        self.assertEqual(metricas['profundidad_cola'], 0)
+        self.assertEqual(metricas['retraso_ms']['max'], 2000)
+    
+    def test_daemon_un_ciclo(self):
+        """Verifica que poll_devices --daemon lea, reprograme y publique métricas"""
+        import os
+        import tempfile
+        from io import StringIO
+        from unittest import mock
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from django.test import override_settings
+        from .adapters.snmp_simulado import AgenteSnmpSimulado
+        from .planificador import CLAVE_METRICAS
+        
+        producto = Producto.objects.create(nombre="Toner Daemon", precio=20000, stock=10)
+        Device.objects.create(nombre="HP 1", ip="10.0.3.1", producto=producto, intervalo_sondeo=120)
+        Device.objects.create(nombre="HP 2", ip="10.0.3.2", producto=producto, intervalo_sondeo=120)
+        agente = AgenteSnmpSimulado(latencia=0, caidos={'10.0.3.2'})
+        cache.delete(CLAVE_METRICAS)
+        
+        salida = StringIO()
+        with tempfile.TemporaryDirectory() as directorio:
+            with override_settings(SONDEO_METRICAS_ARCHIVO=os.path.join(directorio, 'sondeo.json')):
+                with mock.patch('core.management.commands.poll_devices.read_all_supplies', agente.read_all_supplies):
+                    call_command('poll_devices', daemon=True, ciclos=1, plazo=0.1, stdout=salida)
+        
+        metricas = cache.get(CLAVE_METRICAS)
+        self.assertEqual(metricas['dispositivos'], 2)
+        self.assertEqual(metricas['en_backoff'], 1)
+        self.assertEqual(metricas['ultimo_ciclo']['leidos'], 2)
+        self.assertEqual(metricas['ultimo_ciclo']['fallidos'], 1)
+        self.assertIn('Daemon de sondeo detenido tras 1 ciclos', salida.getvalue())
+    
+    def test_metricas_del_daemon_visibles_desde_otro_proceso(self):
+        """Verifica que /api/metricas/ lea las métricas del archivo cuando el caché es por proceso"""
+        import os
+        import tempfile
+        from django.core.cache import cache
+        from django.test import override_settings
+        from .planificador import CLAVE_METRICAS, leer_metricas, publicar_metricas
+        
+        with tempfile.TemporaryDirectory() as directorio:
+            with override_settings(SONDEO_METRICAS_ARCHIVO=os.path.join(directorio, 'sondeo.json')):
+                publicar_metricas({'dispositivos': 3, 'profundidad_cola': 1}, 300)
+                # El caché del servidor web no es el del daemon
+                cache.delete(CLAVE_METRICAS)
+                
+                response = self.client.get('/api/metricas/')
+                self.assertEqual(response.json()['aplicacion']['sondeo']['dispositivos'], 3)
+                
+                # Vencida la vigencia ya no se informan
+                publicar_metricas({'dispositivos': 3}, -1)
+                cache.delete(CLAVE_METRICAS)
+                self.assertIsNone(leer_metricas())
+
+
+class SerieTiempoSuministrosTestCase(TestCase):
+    """Tests para la consolidación y poda de la serie de niveles de consumibles"""
+    
+    def setUp(self):
+        from datetime import datetime, timezone as tz
+        from .models import SuministroDispositivo
+        
+        producto = Producto.objects.create(nombre="Toner Serie", precio=20000, stock=10)
+        device = Device.objects.create(nombre="HP Serie", ip="10.0.4.1", producto=producto)
+        self.suministro = SuministroDispositivo.objects.create(
+            dispositivo=device, indice=1, descripcion="Black Toner", nivel=100, capacidad_maxima=100
+        )
+        self.base = datetime(2024, 3, 1, 10, 0, tzinfo=tz.utc)
+    
+    def _lecturas(self, *pares):
+        from datetime import timedelta
+        from .models import LecturaSuministro
+        
+        LecturaSuministro.objects.bulk_create([
+            LecturaSuministro(
+                suministro=self.suministro, fecha=self.base + timedelta(minutes=minutos),
+                nivel=nivel, capacidad_maxima=100
+            )
+            for minutos, nivel in pares
+        ])
+    
+    def test_consolidacion_horaria_y_diaria(self):
+        """Verifica mín/máx/promedio por hora y el promedio diario ponderado por muestras"""
+        from datetime import timedelta
+        from .models import ResumenLecturaSuministro
+        from .series_tiempo import consolidar_por_hora, consolidar_por_dia
+        
+        # 10:00 -> 3 lecturas; 11:00 -> 1 lectura; 12:00 es la hora en curso y no se consolida
+        self._lecturas((0, 90), (20, 80), (40, 70), (60, 40), (125, 10))
+        self.assertEqual(consolidar_por_hora(hasta=self.base + timedelta(hours=2, minutes=30)), 2)
+        
+        hora = ResumenLecturaSuministro.objects.get(periodo='HORA', inicio=self.base)
+        self.assertEqual((hora.nivel_min, hora.nivel_max, hora.muestras), (70, 90, 3))
+        self.assertAlmostEqual(hora.nivel_promedio, 80.0)
+        
+        # Re-ejecutar es idempotente y completa la hora pendiente
+        self.assertEqual(consolidar_por_hora(hasta=self.base + timedelta(hours=3)), 2)
+        self.assertEqual(ResumenLecturaSuministro.objects.filter(periodo='HORA').count(), 3)
+        
+        consolidar_por_dia(hasta=self.base + timedelta(days=1))
+        dia = ResumenLecturaSuministro.objects.get(periodo='DIA')
+        self.assertEqual((dia.nivel_min, dia.nivel_max, dia.muestras), (10, 90, 5))
+        self.assertAlmostEqual(dia.nivel_promedio, (90 + 80 + 70 + 40 + 10) / 5)
+    
+    def test_poda_respeta_consolidacion(self):
+        """Verifica que la poda solo borre lecturas crudas ya consolidadas y fuera de retención"""
+        from datetime import timedelta
+        from .models import LecturaSuministro
+        from .series_tiempo import consolidar_por_hora, podar
+        
+        self._lecturas((0, 90), (60, 80))
+        ahora = self.base + timedelta(days=30)
+        
+        # Sin consolidar no se pierde nada
+        self.assertEqual(podar(ahora=ahora)['crudas'], 0)
+        
+        consolidar_por_hora(hasta=ahora)
+        eliminadas = podar(ahora=ahora)
+        # La última hora consolidada se conserva porque se recalcula en la próxima pasada
+        self.assertEqual(eliminadas['crudas'], 1)
+        self.assertEqual(LecturaSuministro.objects.count(), 1)
+        self.assertEqual(podar(ahora=ahora + timedelta(days=365))['horas'], 2)
+
+
+class ResumenesProductoTestCase(APITestCase):
+    """Tests para los resúmenes desnormalizados de movimientos por producto"""
+    
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre="Toner Resumen", precio=25000, stock=20, categoria="Toner")
+    
+    def test_operaciones_actualizan_resumen(self):
+        """Verifica que entrada, salida y ajuste actualicen el resumen total y diario"""
+        from django.utils import timezone
+        from .models import ResumenProducto, ResumenDiarioProducto
+        
+        self.producto.registrar_entrada(5, "Compra")
+        self.producto.registrar_salida(3, "Entrega")
+        self.producto.ajustar_stock(30, "Inventario físico")
+        
+        resumen = ResumenProducto.objects.get(producto=self.producto)
+        self.assertEqual(resumen.movimientos, 3)
+        self.assertEqual((resumen.entradas, resumen.unidades_entrada), (2, 13))
+        self.assertEqual((resumen.salidas, resumen.unidades_salida), (1, 3))
+        self.assertIsNotNone(resumen.ultimo_movimiento)
+        
+        diario = ResumenDiarioProducto.objects.get(producto=self.producto)
+        self.assertEqual(diario.fecha, timezone.localdate())
+        self.assertEqual((diario.entradas, diario.salidas), (2, 1))
+    
+    def test_reconstruccion_coincide_con_incremental(self):
+        """Verifica que reconstruir desde Movimiento produzca los mismos valores"""
+        from .models import ResumenProducto, ResumenDiarioProducto
+        from .resumenes import reconstruir_resumenes
+        
+        otro = Producto.objects.create(nombre="Tinta Resumen", precio=9000, stock=5)
+        self.producto.registrar_salida(4, "Entrega")
+        otro.registrar_entrada(7, "Compra")
+        otro.registrar_entrada(1, "Compra")
+        campos = ('producto_id', 'movimientos', 'entradas', 'salidas', 'unidades_entrada', 'unidades_salida')
+        incremental = sorted(ResumenProducto.objects.values_list(*campos))
+        diarios = sorted(ResumenDiarioProducto.objects.values_list('producto_id', 'fecha', 'entradas', 'salidas'))
+        
+        self.assertEqual(reconstruir_resumenes(), 2)
+        self.assertEqual(sorted(ResumenProducto.objects.values_list(*campos)), incremental)
+        self.assertEqual(
+            sorted(ResumenDiarioProducto.objects.values_list('producto_id', 'fecha', 'entradas', 'salidas')), diarios
+        )
+    
+    def test_dashboard_lee_resumenes(self):
+        """Verifica que el dashboard refleje la actividad sin agregar la tabla Movimiento"""
+        from django.core.cache import cache
+        
+        cache.delete('metricas_dashboard')
+        self.producto.registrar_entrada(2, "Compra")
+        self.producto.registrar_salida(1, "Entrega")
+        self.producto.registrar_salida(1, "Entrega")
+        
+        response = self.client.get('/api/productos/metricas_dashboard/?refresh=1')
+        self.assertEqual(response.data['actividad_hoy'], {'entradas': 1, 'salidas': 2, 'total': 3})
+        self.assertEqual(response.data['movimientos_semana'][0]['salidas'], 2)
+        self.assertEqual(response.data['productos_mas_movidos'][0]['total_movimientos'], 3)
+    
+    def test_borrar_movimiento_descuenta_resumen(self):
+        """Verifica que eliminar un movimiento por la API lo descuente del resumen"""
+        from .models import ResumenProducto
+        
+        movimiento = self.producto.registrar_entrada(5, "Compra")
+        response = self.client.delete(f'/api/movimientos/{movimiento.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        
+        resumen = ResumenProducto.objects.get(producto=self.producto)
+        self.assertEqual((resumen.movimientos, resumen.entradas, resumen.unidades_entrada), (0, 0, 0))
+    
+    def test_ultimo_movimiento_al_borrar_o_editar(self):
+        """Verifica que ultimo_movimiento se recalcule al eliminar y no retroceda al editar"""
+        from datetime import timedelta
+        from .models import ResumenProducto
+        
+        anterior = self.producto.registrar_entrada(5, "Compra")
+        Movimiento.objects.filter(pk=anterior.pk).update(fecha=anterior.fecha - timedelta(days=2))
+        anterior.refresh_from_db()
+        ultimo = self.producto.registrar_salida(1, "Entrega")
+        
+        response = self.client.patch(f'/api/movimientos/{anterior.id}/', {'cantidad': 6}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ResumenProducto.objects.get(producto=self.producto).ultimo_movimiento, ultimo.fecha)
+        
+        self.client.delete(f'/api/movimientos/{ultimo.id}/')
+        self.assertEqual(ResumenProducto.objects.get(producto=self.producto).ultimo_movimiento, anterior.fecha)
+        
+        self.client.delete(f'/api/movimientos/{anterior.id}/')
+        self.assertIsNone(ResumenProducto.objects.get(producto=self.producto).ultimo_movimiento)
+
+
+class InvalidacionCacheTestCase(APITestCase):
+    """Tests para la invalidación de caché por eventos de escritura"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        self.producto = Producto.objects.create(nombre="Toner Cache", precio=20000, stock=12)
+        self.alerta = Alerta.objects.create(producto=self.producto, umbral=10, activa=False)
+        cache.set('metricas_dashboard', {'obsoleto': True}, 300)
+        cache.set('alertas_activas', {'obsoleto': True}, 300)
+    
+    def test_salida_invalida_dashboard_al_confirmar(self):
+        """Verifica que una salida elimine el dashboard cacheado solo tras el commit"""
+        from django.core.cache import cache
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.registrar_salida(1, "Entrega")
+            self.assertIsNotNone(cache.get('metricas_dashboard'))
+        
+        self.assertIsNone(cache.get('metricas_dashboard'))
+    
+    def test_cambio_de_alerta_invalida_alertas_activas(self):
+        """Verifica que cruzar el umbral invalide la lista de alertas activas"""
+        from django.core.cache import cache
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.registrar_salida(5, "Entrega")
+        
+        self.assertIsNone(cache.get('alertas_activas'))
+        response = self.client.get('/api/alertas/activas/')
+        self.assertEqual(response.data['total'], 1)
+    
+    def test_alertas_activas_reflejan_stock_y_bajas_de_productos(self):
+        """Verifica que el stock embebido en las alertas activas y su total no queden obsoletos"""
+        from django.core.cache import cache
+        
+        cache.delete('alertas_activas')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.registrar_salida(7, "Entrega")
+        self.assertEqual(self.client.get('/api/alertas/activas/').data['total'], 1)
+        
+        # La alerta sigue activa: solo cambia el stock del producto
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.registrar_salida(3, "Entrega")
+        response = self.client.get('/api/alertas/activas/')
+        self.assertEqual(response.data['alertas'][0]['producto_stock'], 2)
+        
+        # Eliminar el producto elimina su alerta en cascada
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/productos/{self.producto.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get('/api/alertas/activas/').data['total'], 0)
+    
+    def test_resolver_invalida_alertas_activas(self):
+        """Verifica que resolver una alerta la saque de la lista cacheada"""
+        from django.core.cache import cache
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/alertas/{self.alerta.id}/resolver/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get('alertas_activas'))
+        self.assertIsNone(cache.get('metricas_dashboard'))
+    
+    def test_rollback_no_invalida(self):
+        """Verifica que una escritura revertida no emita invalidaciones"""
+        from django.core.cache import cache
+        from django.db import transaction
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.producto.registrar_entrada(3, "Compra")
+                    raise RuntimeError("falla posterior")
+        
+        self.assertEqual(callbacks, [])
+        self.assertIsNotNone(cache.get('metricas_dashboard'))
+    
+    def test_router_cache_sqlite(self):
+        """Verifica que el router envíe solo la tabla de caché a la base 'cache'"""
+        from django.core.cache.backends.db import DatabaseCache
+        from .routers import RouterCache
+        
+        router = RouterCache()
+        modelo_cache = DatabaseCache('cache_inventario', {}).cache_model_class
+        self.assertEqual(router.db_for_write(modelo_cache), 'cache')
+        self.assertIsNone(router.db_for_read(Producto))
+        self.assertTrue(router.allow_migrate('cache', 'django_cache'))
+        self.assertFalse(router.allow_migrate('cache', 'core'))
+        self.assertFalse(router.allow_migrate('default', 'django_cache'))
+
+
+class CacheProtegidoTestCase(TestCase):
+    """Tests para single-flight, recálculo anticipado y stale-while-revalidate"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        self.clave = 'prueba_cache_protegido'
+        cache.delete_many([self.clave, f'{self.clave}:generacion'])
+        self.llamadas = 0
+    
+    def _calcular(self, valor='nuevo', demora=0):
+        import time
+        
+        def calcular():
+            self.llamadas += 1
+            time.sleep(demora)
+            return valor
+        return calcular
+    
+    def test_single_flight_con_concurrencia(self):
+        """Verifica que muchas lecturas simultáneas sin valor provoquen un solo cálculo"""
+        from concurrent.futures import ThreadPoolExecutor
+        from .cache_protegido import obtener_o_calcular
+        
+        calcular = self._calcular(demora=0.2)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            resultados = list(pool.map(lambda _: obtener_o_calcular(self.clave, calcular), range(8)))
+        
+        self.assertEqual(resultados, ['nuevo'] * 8)
+        self.assertEqual(self.llamadas, 1)
+    
+    def test_sirve_vencido_mientras_otro_recalcula(self):
+        """Verifica que con el candado tomado se sirva el valor vencido sin recalcular"""
+        import time
+        from django.core.cache import cache
+        from .cache_protegido import _clave_candado, _generacion, obtener_o_calcular
+        
+        cache.set(self.clave, ('anterior', time.time() - 1, 0.01), 300)
+        candado = _clave_candado(self.clave, _generacion(self.clave))
+        cache.add(candado, 'otro-worker', 10)
+        
+        self.assertEqual(obtener_o_calcular(self.clave, self._calcular()), 'anterior')
+        self.assertEqual(obtener_o_calcular(self.clave, self._calcular(), forzar=True), 'anterior')
+        self.assertEqual(self.llamadas, 0)
+        
+        # Liberado el candado, el siguiente lector recalcula
+        cache.delete(candado)
+        self.assertEqual(obtener_o_calcular(self.clave, self._calcular()), 'nuevo')
+        self.assertEqual(self.llamadas, 1)
+    
+    def test_invalidacion_durante_el_calculo_no_se_cachea(self):
+        """Verifica que un recálculo que leyó datos previos a una invalidación no guarde su valor"""
+        from django.core.cache import cache
+        from .cache_protegido import obtener_o_calcular
+        from .invalidacion import _invalidar
+        
+        def calcular():
+            self.llamadas += 1
+            # La escritura confirma mientras se calcula con los datos anteriores
+            _invalidar('prueba', [self.clave])
+            return 'anterior'
+        
+        self.assertEqual(obtener_o_calcular(self.clave, calcular), 'anterior')
+        self.assertIsNone(cache.get(self.clave))
+        # La invalidación liberó el candado: el siguiente lector recalcula sin esperar
+        self.assertEqual(obtener_o_calcular(self.clave, self._calcular(), espera_maxima=0), 'nuevo')
+        self.assertEqual(cache.get(self.clave)[0], 'nuevo')
+    
+    def test_candado_vencido_no_se_elimina(self):
+        """Verifica que un worker cuyo candado venció durante el cálculo no borre el de otro worker"""
+        import time
+        from django.core.cache import cache
+        from .cache_protegido import _clave_candado, _generacion, obtener_o_calcular
+        
+        candado = _clave_candado(self.clave, _generacion(self.clave))
+        
+        def calcular():
+            # El candado propio (1 s) está por vencer y otro worker toma uno nuevo
+            time.sleep(0.6)
+            cache.set(candado, 'otro-worker', 10)
+            return 'nuevo'
+        
+        self.assertEqual(obtener_o_calcular(self.clave, calcular, espera_maxima=0.2), 'nuevo')
+        self.assertEqual(cache.get(candado), 'otro-worker')
+        cache.delete(candado)
+    
+    def test_recalculo_anticipado_probabilistico(self):
+        """Verifica que el sorteo XFetch adelante el recálculo antes del vencimiento"""
+        import time
+        from unittest import mock
+        from django.core.cache import cache
+        from .cache_protegido import obtener_o_calcular
+        
+        # Vence en 10 s y el cálculo tarda 1 s
+        cache.set(self.clave, ('vigente', time.time() + 10, 1.0), 300)
+        with mock.patch('core.cache_protegido.random.random', return_value=1.0):
+            self.assertEqual(obtener_o_calcular(self.clave, self._calcular()), 'vigente')
+        # Un sorteo bajo (-ln(1e-6) ≈ 13.8 s de adelanto) dispara el recálculo
+        with mock.patch('core.cache_protegido.random.random', return_value=1e-6):
+            self.assertEqual(obtener_o_calcular(self.clave, self._calcular()), 'nuevo')
+        self.assertEqual(self.llamadas, 1)
+    
+    def test_dashboard_refresh_no_duplica_calculo(self):
+        """Verifica que ?refresh= con un recálculo en curso no vuelva a calcular el dashboard"""
+        import time
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        from .cache_protegido import _clave_candado, _generacion
+        
+        cache.set('metricas_dashboard', ({'resumen': 'anterior'}, time.time() + 300, 0.01), 600)
+        candado = _clave_candado('metricas_dashboard', _generacion('metricas_dashboard'))
+        cache.add(candado, 'otro-worker', 10)
+        try:
+            with self.assertNumQueries(0):
+                response = APIClient().get('/api/productos/metricas_dashboard/?refresh=1')
+            self.assertEqual(response.data, {'resumen': 'anterior'})
+        finally:
+            cache.delete_many(['metricas_dashboard', candado])
+
+
+class ExportacionCSVTestCase(APITestCase):
+    """Tests para la exportación CSV en streaming"""
+    
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            nombre='Toner "Alto", rendimiento', marca="HP", modelo="26X", precio=45000, stock=8, categoria="Toner"
+        )
+        self.producto.registrar_salida(2, "Entrega, piso 3")
+    
+    def _leer(self, response):
+        import csv
+        import io
+        
+        contenido = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(contenido.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(contenido[1:])))
+    
+    def test_exportar_productos_streaming(self):
+        """Verifica que el CSV de productos se transmita por bloques con comillas correctas"""
+        from django.utils import timezone
+        
+        response = self.client.get('/api/productos/exportar_csv/')
+        self.assertTrue(response.streaming)
+        filas = self._leer(response)
+        
+        self.assertEqual(filas[0][0], 'ID')
+        self.assertEqual(filas[1][1], 'Toner "Alto", rendimiento')
+        self.assertEqual(filas[1][5], '6')
+        esperado = timezone.localtime(self.producto.fecha_creacion).strftime('%Y-%m-%d %H:%M:%S')
+        self.assertEqual(filas[1][8], esperado)
+    
+    def test_exportar_movimientos_filtrados(self):
+        """Verifica que el CSV de movimientos respete los filtros y traiga el nombre del producto"""
+        self.producto.registrar_entrada(4, "Compra")
+        
+        filas = self._leer(self.client.get('/api/movimientos/exportar_csv/?tipo=SALIDA'))
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][1:4], ['Toner "Alto", rendimiento', 'SALIDA', '2'])
+        self.assertEqual(filas[1][5], 'Entrega, piso 3')
+    
+    def test_formateador_fecha_local_cambio_horario(self):
+        """Verifica que el desfase cacheado por hora respete el cambio de horario"""
+        from datetime import datetime, timedelta, timezone as tz
+        from zoneinfo import ZoneInfo
+        from .exportacion import formateador_fecha_local
+        
+        zona = ZoneInfo('America/Santiago')
+        formatear = formateador_fecha_local(zona)
+        # Chile vuelve al horario de invierno el 7 de abril de 2024 a las 03:00 UTC
+        inicio = datetime(2024, 4, 6, 23, 30, tzinfo=tz.utc)
+        for minutos in range(0, 8 * 60, 17):
+            fecha = inicio + timedelta(minutes=minutos)
+            self.assertEqual(formatear(fecha), fecha.astimezone(zona).strftime('%Y-%m-%d %H:%M:%S'))
+        self.assertEqual(formatear(None), '')
+
+
+class ImportacionCSVTestCase(APITestCase):
+    """Tests para la importación masiva de productos desde CSV"""
+    
+    def _subir(self, contenido, nombre='productos.csv'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        archivo = SimpleUploadedFile(nombre, ('\ufeff' + contenido).encode('utf-8'), content_type='text/csv')
+        return self.client.post('/api/productos/importar_csv/', {'archivo': archivo}, format='multipart')
+    
+    def test_campos_con_comillas_y_errores_por_linea(self):
+        """Verifica que se respeten campos entre comillas y se informen errores por línea"""
+        contenido = (
+            'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n'
+            '"Toner 85A, alto rendimiento",HP,85A,Toner,10,25000,"Negro, 1600 páginas",7790001112223\n'
+            'Tinta 664,Epson,T664,Tinta,abc,8000,,\n'
+            'Incompleto,HP\n'
+            '\n'
+            'Papel Carta,Chamex,A4,Papel,50,4500.50,,\n'
+        )
+        response = self._subir(contenido)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['creados'], 2)
+        self.assertEqual(len(response.data['errores']), 2)
+        self.assertTrue(response.data['errores'][0].startswith('Línea 3:'))
+        self.assertTrue(response.data['errores'][1].startswith('Línea 4: formato incorrecto'))
+        toner = Producto.objects.get(codigo_barras='7790001112223')
+        self.assertEqual(toner.nombre, 'Toner 85A, alto rendimiento')
+        self.assertEqual(toner.descripcion, 'Negro, 1600 páginas')
+        self.assertEqual(Producto.objects.get(nombre='Papel Carta').precio, Decimal('4500.50'))
+    
+    def test_actualiza_existentes_por_codigo_y_clave(self):
+        """Verifica que los existentes se actualicen por código o nombre+marca+modelo"""
+        por_codigo = Producto.objects.create(nombre="Toner Viejo", precio=1000, stock=1, codigo_barras="12345678")
+        por_clave = Producto.objects.create(nombre="Tambor", marca="Brother", modelo="DR-1060", precio=2000, stock=2)
+        contenido = (
+            'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n'
+            'Otro nombre,,,Toner,7,1500,,12345678\n'
+            'Tambor,Brother,DR-1060,Tambor,9,2500,Nuevo lote,\n'
+            'Kit Nuevo,HP,K1,Kit,3,900,,\n'
+            'Kit Nuevo,HP,K1,Kit,4,950,,\n'
+        )
+        response = self._subir(contenido)
+        
+        self.assertEqual((response.data['creados'], response.data['actualizados']), (1, 3))
+        por_codigo.refresh_from_db()
+        por_clave.refresh_from_db()
+        self.assertEqual((por_codigo.nombre, por_codigo.stock, por_codigo.precio), ("Toner Viejo", 7, Decimal('1500')))
+        self.assertEqual((por_clave.stock, por_clave.descripcion), (9, "Nuevo lote"))
+        # La fila repetida actualiza el producto creado en el mismo archivo
+        self.assertEqual(Producto.objects.get(nombre="Kit Nuevo").stock, 4)
+    
+    def test_consultas_por_bloque(self):
+        """Verifica que las consultas dependan de la cantidad de bloques y no de filas"""
+        import io
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .importacion import importar_productos
+        
+        filas = ''.join(f'Producto {i},Marca,M{i},Otro,{i},1000,,{10000000 + i}\n' for i in range(300))
+        archivo = io.BytesIO(('nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n' + filas).encode())
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = importar_productos(archivo, tamano_bloque=100)
+        
+        self.assertEqual(resultado['creados'], 300)
+        # Por bloque: una precarga, el INSERT de productos y el de sus cortes de apertura;
+        # más la transacción
+        self.assertLessEqual(len(contexto.captured_queries), 3 * 3 + 2)
+    
+    def test_importacion_masiva_performance(self):
+        """Verifica que importar 5.000 filas tome pocos segundos"""
+        import io
+        import time
+        from .importacion import importar_productos
+        
+        filas = ''.join(
+            f'"Producto {i}, serie {i % 7}",Marca {i % 5},M-{i},Toner,{i % 40},{1000 + i},,{20000000 + i}\n'
+            for i in range(5000)
+        )
+        archivo = io.BytesIO(('nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n' + filas).encode())
+        inicio = time.time()
+        resultado = importar_productos(archivo)
+        # Segunda pasada: todo son actualizaciones
+        archivo.seek(0)
+        resultado_actualizacion = importar_productos(archivo)
+        transcurrido = time.time() - inicio
+        
+        self.assertEqual(resultado['creados'], 5000)
+        self.assertEqual(resultado_actualizacion['actualizados'], 5000)
+        self.assertLess(transcurrido, 10.0, f"Importación tomó {transcurrido:.3f}s")
+        print(f"[OK] 5000 filas importadas y reimportadas en {transcurrido:.3f}s")
+    
+    def _archivo_temporal(self, contenido):
+        import os
+        import tempfile
+        
+        descriptor, ruta = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido.encode('utf-8'))
+        self.addCleanup(os.remove, ruta)
+        return ruta
+    
+    def test_validadores_de_la_api(self):
+        """Verifica que stock, precio y código de barras usen los validadores de la API"""
+        import io
+        from .importacion import importar_productos
+        
+        contenido = (
+            'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n'
+            'Negativo,HP,A,Toner,-3,1000,,\n'
+            'Sin precio,HP,B,Toner,3,0,,\n'
+            'Codigo corto,HP,C,Toner,3,1000,,123\n'
+            'Valido,HP,D,Toner,3,1000,,ABC-12345\n'
+        )
+        resultado = importar_productos(io.BytesIO(contenido.encode()))
+        
+        self.assertEqual(resultado['creados'], 1)
+        self.assertEqual(resultado['errores'], [
+            'Línea 2: El stock no puede ser negativo',
+            'Línea 3: El precio debe ser mayor a cero',
+            'Línea 4: El código de barras debe tener al menos 8 caracteres',
+        ])
+    
+    def test_rangos_respetan_registros_entre_comillas(self):
+        """Verifica que los rangos de bytes no corten campos con saltos de línea o comillas"""
+        import io
+        from .importacion import dividir_en_rangos, procesar_rango, leer_bloques
+        
+        filas = []
+        for i in range(200):
+            descripcion = f'"Línea uno\nlínea ""dos"", fin {i}"' if i % 3 == 0 else f'Simple {i}'
+            stock = 'x' if i % 17 == 0 else i
+            filas.append(f'Producto {i},Marca,M{i},Toner,{stock},1000,{descripcion},\n')
+        contenido = '\ufeffnombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n' + ''.join(filas)
+        ruta = self._archivo_temporal(contenido)
+        
+        esperadas, errores_esperados = [], []
+        for filas_bloque, errores_bloque, _ in leer_bloques(io.BytesIO(contenido.encode('utf-8'))):
+            esperadas.extend(filas_bloque)
+            errores_esperados.extend(errores_bloque)
+        
+        with open(ruta, 'rb') as archivo:
+            rangos = dividir_en_rangos(archivo, tamano_rango=64)
+        self.assertGreater(len(rangos), 20)
+        obtenidas, errores = [], []
+        for rango in rangos:
+            filas_rango, errores_rango = procesar_rango(ruta, *rango)
+            obtenidas.extend(filas_rango)
+            errores.extend(errores_rango)
+        
+        self.assertEqual(obtenidas, esperadas)
+        self.assertEqual(errores, errores_esperados)
+        self.assertEqual(len(obtenidas), 188)
+    
+    def test_importacion_paralela_un_escritor(self):
+        """Verifica que la importación paralela aplique las filas en el orden del archivo"""
+        from .importacion import importar_ruta
+        
+        Producto.objects.create(nombre="Existente", marca="HP", modelo="E1", precio=1000, stock=1)
+        filas = ''.join(f'Producto {i},Marca,M{i},Otro,{i},1000,,{30000000 + i}\n' for i in range(500))
+        contenido = (
+            'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n'
+            + filas
+            + 'Existente,HP,E1,Toner,77,1500,,\n'
+            + 'Producto 1,Marca,M1,Otro,99,1000,,30000001\n'
+            + 'Mala,Marca,X,Otro,abc,1000,,\n'
+        )
+        ruta = self._archivo_temporal(contenido)
+        
+        resultado = importar_ruta(ruta, procesos=2, tamano_bloque=100, tamano_rango=2048, umbral_paralelo=0)
+        
+        self.assertEqual((resultado['creados'], resultado['actualizados']), (500, 2))
+        self.assertEqual(resultado['errores'], ['Línea 504: El stock debe ser un número entero'])
+        self.assertEqual(Producto.objects.get(nombre="Existente").stock, 77)
+        # La última aparición en el archivo gana aunque esté en otro rango
+        self.assertEqual(Producto.objects.get(codigo_barras='30000001').stock, 99)
+    
+    def test_parseo_paralelo_performance(self):
+        """Compara el parseo y validación secuencial con el paralelo por rangos"""
+        import io
+        import os
+        import time
+        from .importacion import leer_bloques, leer_bloques_paralelo
+        
+        filas = ''.join(
+            f'"Producto {i}, serie {i % 7}",Marca {i % 5},M-{i},Toner,{i % 40},{1000 + i},Descripción {i},{40000000 + i}\n'
+            for i in range(30000)
+        )
+        contenido = 'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n' + filas
+        ruta = self._archivo_temporal(contenido)
+        
+        inicio = time.time()
+        secuencial = sum(len(f) for f, _, _ in leer_bloques(io.BytesIO(contenido.encode('utf-8'))))
+        tiempo_secuencial = time.time() - inicio
+        procesos = max(2, os.cpu_count() or 1)
+        inicio = time.time()
+        paralelo = sum(len(f) for f, _, _ in leer_bloques_paralelo(ruta, procesos, tamano_rango=256 * 1024))
+        tiempo_paralelo = time.time() - inicio
+        
+        self.assertEqual(secuencial, paralelo)
+        self.assertEqual(paralelo, 30000)
+        print(
+            f"[OK] Parseo de 30000 filas: secuencial {tiempo_secuencial:.3f}s, "
+            f"{procesos} procesos {tiempo_paralelo:.3f}s"
+        )
+
+
+class TareasSegundoPlanoTestCase(APITestCase):
+    """Tests para la cola de tareas en segundo plano (importaciones y exportaciones)"""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        
+        self.producto = Producto.objects.create(nombre="Toner 26X", marca="HP", modelo="26X", precio=45000, stock=20, categoria="Toner")
+        self.producto.registrar_salida(3, "Entrega")
+        self.producto.registrar_entrada(5, "Compra")
+    
+    def _leer(self, response):
+        import csv
+        import io
+        
+        contenido = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(io.StringIO(contenido.lstrip('\ufeff'))))
+    
+    def test_exportacion_encolada_se_descarga_al_terminar(self):
+        """Verifica el ciclo completo: encolar, consultar avance, procesar y descargar"""
+        from .tareas import procesar_pendientes
+        
+        response = self.client.get('/api/productos/exportar_csv/?asincrono=1')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['estado'], 'PENDIENTE')
+        self.assertIsNone(response.data['url_descarga'])
+        tarea_id = response.data['id']
+        self.assertTrue(response['Location'].endswith(f'/api/tareas/{tarea_id}/'))
+        
+        response = self.client.get(f'/api/tareas/{tarea_id}/descargar/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        
+        self.assertEqual(procesar_pendientes('test'), 1)
+        
+        response = self.client.get(f'/api/tareas/{tarea_id}/')
+        self.assertEqual(response.data['estado'], 'COMPLETADA')
+        self.assertEqual(response.data['progreso'], 100)
+        self.assertEqual(response.data['resultado'], {'filas': 1})
+        self.assertIsNotNone(response.data['url_descarga'])
+        
+        filas = self._leer(self.client.get(f'/api/tareas/{tarea_id}/descargar/'))
+        self.assertEqual(filas[0][:2], ['ID', 'Nombre'])
+        self.assertEqual(filas[1][1], "Toner 26X")
+    
+    def test_importacion_encolada(self):
+        """Verifica que la importación en segundo plano procese el archivo guardado"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .tareas import procesar_pendientes
+        
+        contenido = (
+            'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n'
+            'Toner 26X,HP,26X,Toner,40,47000,,\n'
+            'Papel Carta,Chamex,A4,Papel,50,4500,,\n'
+            'Mala,HP,X,Toner,abc,1,,\n'
+        ).encode('utf-8')
+        archivo = SimpleUploadedFile('productos.csv', contenido, content_type='text/csv')
+        response = self.client.post('/api/productos/importar_csv/?asincrono=1', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(Producto.objects.filter(nombre="Papel Carta").exists())
+        
+        procesar_pendientes('test')
+        
+        response = self.client.get(f"/api/tareas/{response.data['id']}/")
+        self.assertEqual(response.data['estado'], 'COMPLETADA')
+        self.assertEqual(response.data['resultado']['creados'], 1)
+        self.assertEqual(response.data['resultado']['actualizados'], 1)
+        self.assertEqual(len(response.data['resultado']['errores']), 1)
+        self.assertEqual(response.data['total'], len(contenido))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 40)
+    
+    def test_exportaciones_con_filtros(self):
+        """Verifica que movimientos y reporte conserven los filtros de la solicitud"""
+        from .tareas import procesar_pendientes
+        
+        movimientos = self.client.get('/api/movimientos/exportar_csv/?asincrono=1&tipo=SALIDA').data['id']
+        reporte = self.client.get('/api/productos/exportar_reporte/?asincrono=1&categoria=Toner').data['id']
+        self.assertEqual(procesar_pendientes('test'), 2)
+        
+        filas = self._leer(self.client.get(f'/api/tareas/{movimientos}/descargar/'))
+        self.assertEqual([fila[2] for fila in filas[1:]], ['SALIDA'])
+        filas = self._leer(self.client.get(f'/api/tareas/{reporte}/descargar/'))
+        self.assertEqual(filas[0], ['REPORTE DE INVENTARIO'])
+        self.assertIn(['Total Productos:', '1'], filas)
+        self.assertNotIn(['ANÁLISIS POR CATEGORÍA'], filas)
+    
+    def test_reclamo_exclusivo_y_recuperacion(self):
+        """Verifica que una tarea se asigne a un solo worker y que las abandonadas vuelvan a la cola"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Tarea
+        from .tareas import encolar, tomar_siguiente, recuperar_abandonadas, MAX_INTENTOS
+        
+        tarea = encolar('EXPORTAR_PRODUCTOS')
+        self.assertEqual(tomar_siguiente('a').pk, tarea.pk)
+        self.assertIsNone(tomar_siguiente('b'))
+        
+        # Worker caído: sin latido reciente se reencola; agotados los intentos queda fallida
+        Tarea.objects.filter(pk=tarea.pk).update(latido=timezone.now() - timedelta(hours=1))
+        self.assertEqual(recuperar_abandonadas(), (1, 0))
+        self.assertEqual(tomar_siguiente('b').worker, 'b')
+        Tarea.objects.filter(pk=tarea.pk).update(latido=timezone.now() - timedelta(hours=1), intentos=MAX_INTENTOS)
+        self.assertEqual(recuperar_abandonadas(), (0, 1))
+        self.assertEqual(Tarea.objects.get(pk=tarea.pk).estado, 'FALLIDA')
+    
+    def test_tarea_con_error_queda_fallida(self):
+        """Verifica que un error en el manejador se registre sin detener al worker"""
+        import io
+        from django.core.management import call_command
+        from .tareas import encolar
+        
+        tarea = encolar('EXPORTAR_MOVIMIENTOS', parametros={'fecha_desde': 'no-es-fecha'})
+        siguiente = encolar('EXPORTAR_PRODUCTOS')
+        call_command('procesar_tareas', '--una-vez', stdout=io.StringIO())
+        
+        tarea.refresh_from_db()
+        siguiente.refresh_from_db()
+        self.assertEqual(tarea.estado, 'FALLIDA')
+        self.assertTrue(tarea.error)
+        self.assertEqual(siguiente.estado, 'COMPLETADA')
+
+
+class PaginacionCursorTestCase(APITestCase):
+    """Tests para la paginación por cursor (keyset) de movimientos y productos"""
+    
+    def setUp(self):
+        from django.utils import timezone
+        
+        self.producto = Producto.objects.create(nombre="Toner Cursor", precio=1000, stock=0, categoria="Toner")
+        Movimiento.objects.bulk_create([
+            Movimiento(producto=self.producto, tipo='ENTRADA', cantidad=i + 1) for i in range(25)
+        ])
+        # Varios movimientos con la misma fecha: el id desempata
+        ids = list(Movimiento.objects.order_by('id').values_list('id', flat=True))
+        Movimiento.objects.filter(id__in=ids[5:15]).update(fecha=timezone.now())
+        self.esperados = list(Movimiento.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+    
+    def _recorrer(self, url, enlace='next'):
+        ids, paginas = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(m['id'] for m in response.data['results'])
+            url = response.data[enlace]
+            paginas += 1
+        return ids, paginas, response
+    
+    def test_recorrido_completo_sin_conteo(self):
+        """Verifica que el recorrido por cursor entregue todas las filas en orden y sin COUNT"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as contexto:
+            ids, paginas, ultima = self._recorrer('/api/movimientos/?paginacion=cursor&page_size=10')
+        
+        self.assertEqual(ids, self.esperados)
+        self.assertEqual(paginas, 3)
+        self.assertIsNone(ultima.data['count'])
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in contexto.captured_queries))
+        self.assertFalse(any('OFFSET' in q['sql'].upper() for q in contexto.captured_queries))
+        
+        # Desde la última página hacia atrás con los enlaces previous
+        ids_atras, _, primera = self._recorrer(ultima.data['previous'], enlace='previous')
+        self.assertEqual(ids_atras, self.esperados[10:20] + self.esperados[:10])
+        self.assertIsNone(primera.data['previous'])
+    
+    def test_pagina_anterior_y_siguiente_consistentes(self):
+        """Verifica que volver con previous entregue exactamente la página anterior"""
+        primera = self.client.get('/api/movimientos/?paginacion=cursor&page_size=10')
+        segunda = self.client.get(primera.data['next'])
+        de_vuelta = self.client.get(segunda.data['previous'])
+        
+        self.assertEqual([m['id'] for m in de_vuelta.data['results']], self.esperados[:10])
+        self.assertEqual([m['id'] for m in segunda.data['results']], self.esperados[10:20])
+        self.assertIsNone(de_vuelta.data['previous'])
+    
+    def test_conteo_opcional_y_filtros(self):
+        """Verifica el conteo exacto/estimado a pedido y que los filtros se respeten"""
+        Movimiento.objects.create(producto=self.producto, tipo='SALIDA', cantidad=1)
+        
+        response = self.client.get('/api/movimientos/?paginacion=cursor&conteo=exacto&tipo=SALIDA')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        
+        response = self.client.get('/api/movimientos/?paginacion=cursor&conteo=estimado')
+        self.assertEqual(response.data['count'], 26)
+    
+    def test_productos_ascendente_y_cursor_invalido(self):
+        """Verifica el orden ascendente por fecha_creacion y el rechazo de cursores inválidos"""
+        for i in range(4):
+            Producto.objects.create(nombre=f"Producto Cursor {i}", precio=1000, stock=5)
+        esperados = list(Producto.objects.order_by('fecha_creacion', 'id').values_list('id', flat=True))
+        
+        ids, _, _ = self._recorrer('/api/productos/?paginacion=cursor&ordering=fecha_creacion&page_size=2')
+        self.assertEqual(ids, esperados)
+        
+        response = self.client.get('/api/productos/?cursor=no-es-un-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_paginacion_por_numero_sin_cambios(self):
+        """Verifica que sin parámetros de cursor se mantenga la paginación por número"""
+        response = self.client.get('/api/movimientos/?page=2&page_size=10')
+        
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual([m['id'] for m in response.data['results']], self.esperados[10:20])
+
+
+class ConteoPaginacionTestCase(APITestCase):
+    """Tests para el proveedor de conteos de la paginación por número de página"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for i in range(30):
+            Producto.objects.create(
+                nombre=f"Producto Conteo {i}", precio=1000, stock=i, categoria='Toner' if i % 2 else 'Papel'
+            )
+    
+    def test_conteo_cacheado_por_filtros_e_invalidado(self):
+        """Verifica que el total se cachee por combinación de filtros y se renueve al escribir"""
+        from unittest.mock import patch
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with patch('core.conteo.UMBRAL_CACHE', 1):
+            self.assertEqual(self.client.get('/api/productos/?categoria=Toner').data['count'], 15)
+            self.assertEqual(self.client.get('/api/productos/?categoria=Papel').data['count'], 15)
+            with CaptureQueriesContext(connection) as contexto:
+                response = self.client.get('/api/productos/?categoria=Toner')
+            self.assertEqual(response.data['count'], 15)
+            self.assertTrue(response.data['conteo_exacto'])
+            self.assertFalse(any('COUNT(' in q['sql'].upper() for q in contexto.captured_queries))
+            
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/productos/', {
+                    'nombre': 'Toner Nuevo Conteo', 'precio': 1000, 'stock': 3, 'categoria': 'Toner'
+                }, format='json')
+            self.assertEqual(self.client.get('/api/productos/?categoria=Toner').data['count'], 16)
+    
+    def test_conjuntos_chicos_siempre_exactos(self):
+        """Verifica que bajo UMBRAL_CACHE el total se cuente siempre (escrituras sin eventos)"""
+        self.assertEqual(self.client.get('/api/productos/').data['count'], 30)
+        Producto.objects.create(nombre="Creado por ORM", precio=1000, stock=1)
+        self.assertEqual(self.client.get('/api/productos/').data['count'], 31)
+    
+    def test_total_estimado_en_tablas_grandes(self):
+        """Verifica que con total estimado la página siguiente dependa de las filas reales"""
+        from unittest.mock import patch
+        
+        with patch('core.conteo.filas_tabla', return_value=2_000_000):
+            primera = self.client.get('/api/productos/?page_size=20')
+            segunda = self.client.get('/api/productos/?page_size=20&page=2')
+            fuera = self.client.get('/api/productos/?page_size=20&page=5')
+            filtrada = self.client.get('/api/productos/?categoria=Papel')
+        
+        self.assertEqual(primera.data['count'], 2_000_000)
+        self.assertFalse(primera.data['conteo_exacto'])
+        self.assertIsNotNone(primera.data['next'])
+        self.assertEqual(len(segunda.data['results']), 10)
+        self.assertIsNone(segunda.data['next'])
+        self.assertEqual(fuera.status_code, status.HTTP_404_NOT_FOUND)
+        # Con filtros (y fuera de PostgreSQL) el total es exacto
+        self.assertEqual(filtrada.data['count'], 15)
+        self.assertTrue(filtrada.data['conteo_exacto'])
+
+
+class BusquedaProductosTestCase(APITestCase):
+    """Tests para la búsqueda de productos con índice de texto (FTS5 en SQLite)"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.toner = Producto.objects.create(
+            nombre="Toner HP 26X", marca="HP", modelo="CF226X", precio=45000, stock=5, categoria="Toner",
+            descripcion="Alto rendimiento para LaserJet Pro"
+        )
+        self.impresora = Producto.objects.create(
+            nombre="Impresora LaserJet Pro M402", marca="HP", modelo="M402dn", precio=250000, stock=2,
+            categoria="Impresora", descripcion="Compatible con toner 26X"
+        )
+        self.tinta = Producto.objects.create(
+            nombre="Tinta Canon PG-145", marca="Canon", modelo="PG145", precio=15000, stock=10,
+            categoria="Tinta", descripcion="Cartucho negro"
+        )
+    
+    def _nombres(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['nombre'] for p in response.data['results']]
+    
+    def test_usa_indice_fts5(self):
+        """Verifica que en SQLite la búsqueda consulte la tabla FTS5 y no haga LIKE"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .busqueda import motor
+        
+        self.assertEqual(motor(), 'fts5')
+        with CaptureQueriesContext(connection) as contexto:
+            self._nombres('/api/productos/?search=laserjet')
+        sql = ' '.join(q['sql'] for q in contexto.captured_queries)
+        self.assertIn('core_producto_fts', sql)
+        self.assertNotIn('LIKE', sql.upper())
+    
+    def test_orden_por_relevancia(self):
+        """Verifica que la coincidencia en el nombre pese más que en la descripción"""
+        self.assertEqual(self._nombres('/api/productos/?search=26X'), ["Toner HP 26X", "Impresora LaserJet Pro M402"])
+        self.assertEqual(
+            self._nombres('/api/productos/?search=laserjet'), ["Impresora LaserJet Pro M402", "Toner HP 26X"]
+        )
+        # Con ordering explícito se respeta el orden pedido
+        self.assertEqual(
+            self._nombres('/api/productos/?search=laserjet&ordering=precio'),
+            ["Toner HP 26X", "Impresora LaserJet Pro M402"]
+        )
+    
+    def test_prefijos_acentos_y_varias_palabras(self):
+        """Verifica búsqueda por prefijo, sin acentos y con todas las palabras requeridas"""
+        Producto.objects.create(nombre="Cámara Térmica", precio=1000, stock=1, categoria="Repuesto")
+        
+        self.assertEqual(self._nombres('/api/productos/?search=lase'), [
+            "Impresora LaserJet Pro M402", "Toner HP 26X"
+        ])
+        self.assertEqual(self._nombres('/api/productos/?search=camara termica'), ["Cámara Térmica"])
+        self.assertEqual(self._nombres('/api/productos/?search=hp canon'), [])
+        self.assertEqual(self._nombres('/api/productos/?search=pg-145'), ["Tinta Canon PG-145"])
+        # Los signos de la sintaxis FTS no rompen la consulta
+        response = self.client.get('/api/productos/', {'search': '"canon*" ^('})
+        self.assertEqual([p['nombre'] for p in response.data['results']], ["Tinta Canon PG-145"])
+    
+    def test_indice_sincronizado_con_escrituras(self):
+        """Verifica que altas, cambios y bajas (API, ORM y bulk) se reflejen en la búsqueda"""
+        self.client.post('/api/productos/', {
+            'nombre': 'Fusor Brother', 'precio': 30000, 'stock': 1, 'categoria': 'Repuesto'
+        }, format='json')
+        self.assertEqual(self._nombres('/api/productos/?search=fusor'), ['Fusor Brother'])
+        
+        self.client.patch(f'/api/productos/{self.tinta.id}/', {
+            'nombre': 'Tinta Epson 664', 'marca': 'Epson', 'modelo': 'T664'
+        }, format='json')
+        self.assertEqual(self._nombres('/api/productos/?search=canon'), [])
+        self.assertEqual(self._nombres('/api/productos/?search=epson'), ['Tinta Epson 664'])
+        
+        Producto.objects.bulk_create([Producto(nombre=f'Rodillo {i}', precio=100, stock=1) for i in range(3)])
+        Producto.objects.filter(nombre__startswith='Rodillo').update(descripcion='pieza de arrastre')
+        self.assertEqual(len(self._nombres('/api/productos/?search=arrastre')), 3)
+        
+        # Cambios de stock no tocan el texto indexado y la búsqueda sigue igual
+        self.toner.registrar_salida(1, "Venta", "admin")
+        self.assertEqual(self._nombres('/api/productos/?search=cf226x'), ["Toner HP 26X"])
+        
+        self.toner.delete()
+        self.assertEqual(self._nombres('/api/productos/?search=cf226x'), [])
+    
+    def test_combinada_con_filtros_y_cursor(self):
+        """Verifica que la búsqueda conviva con los filtros y la paginación por cursor"""
+        self.assertEqual(self._nombres('/api/productos/?search=hp&categoria=Toner'), ["Toner HP 26X"])
+        response = self.client.get('/api/productos/?search=hp&paginacion=cursor')
+        self.assertEqual(len(response.data['results']), 2)
+    
+    def test_respaldo_sin_indice(self):
+        """Verifica que sin índice de texto se use LIKE sobre los campos de búsqueda"""
+        from unittest.mock import patch
+        
+        with patch('core.busqueda.motor', return_value=None):
+            self.assertEqual(self._nombres('/api/productos/?search=226'), ["Toner HP 26X"])
+            self.assertEqual(len(self._nombres('/api/productos/?search=hp pro')), 2)
+    
+    def test_busqueda_performance(self):
+        """Verifica que la búsqueda con índice no recorra el catálogo completo"""
+        import time
+        
+        Producto.objects.bulk_create([
+            Producto(nombre=f"Repuesto genérico {i}", marca="Genérica", modelo=f"R{i}", precio=1000, stock=i % 50,
+                     categoria="Repuesto", descripcion="Pieza de reemplazo estándar")
+            for i in range(5000)
+        ])
+        
+        inicio = time.time()
+        response = self.client.get('/api/productos/?search=toner cf226')
+        transcurrido = time.time() - inicio
+        
+        self.assertEqual([p['nombre'] for p in response.data['results']], ["Toner HP 26X"])
+        self.assertLess(transcurrido, 1.0, f"Búsqueda tomó {transcurrido:.3f}s, debe ser < 1s")
+        print(f"[OK] Busqueda indexada sobre 5003 productos en {transcurrido:.3f}s")
+
+
+class IndiceCodigosTestCase(APITestCase):
+    """Tests para la búsqueda por código de barras con índice en memoria por worker"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from .codigos import indice
+        
+        cache.clear()
+        indice.limpiar()
+        self.addCleanup(cache.clear)
+        self.addCleanup(indice.limpiar)
+        self.producto = Producto.objects.create(
+            nombre="Toner Escaneo", precio=20000, stock=10, categoria="Toner", codigo_barras="7800000000017"
+        )
+    
+    def test_busqueda_por_clave_primaria_tras_primer_escaneo(self):
+        """Verifica que el segundo escaneo del mismo código solo lea el stock por clave primaria"""
+        response = self.client.get('/api/productos/por_codigo/7800000000017/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.producto.id)
+        self.assertEqual(response.data['stock'], 10)
+        self.assertEqual(set(response.data), {'id', 'nombre', 'codigo_barras', 'stock', 'precio'})
+        
+        with self.assertNumQueries(1) as contexto:
+            response = self.client.get('/api/productos/por_codigo/7800000000017/')
+        self.assertNotIn('codigo_barras', contexto.captured_queries[0]['sql'])
+        self.assertEqual(response.data['nombre'], "Toner Escaneo")
+    
+    def test_codigo_inexistente(self):
+        """Verifica el 404 y que un producto creado después se encuentre de inmediato"""
+        response = self.client.get('/api/productos/por_codigo/7800000000024/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        Producto.objects.create(nombre="Nuevo", precio=1000, stock=1, codigo_barras="7800000000024")
+        response = self.client.get('/api/productos/por_codigo/7800000000024/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_invalidacion_por_escrituras(self):
+        """Verifica que los movimientos conserven el índice y los cambios de productos lo descarten"""
+        from .codigos import indice
+        
+        self.client.get('/api/productos/por_codigo/7800000000017/')
+        aciertos, fallos = indice.aciertos, indice.fallos
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.registrar_salida(3, "Venta", "admin")
+        # Un movimiento no invalida el índice: la entrada sigue y el stock es el actual
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/productos/por_codigo/7800000000017/')
+        self.assertEqual(response.data['stock'], 7)
+        self.assertEqual((indice.aciertos, indice.fallos), (aciertos + 1, fallos))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/productos/{self.producto.id}/', {'codigo_barras': '7800000000031'}, format='json')
+        self.assertEqual(
+            self.client.get('/api/productos/por_codigo/7800000000017/').status_code, status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(
+            self.client.get('/api/productos/por_codigo/7800000000031/').data['id'], self.producto.id
+        )
+    
+    def test_lru_acotado(self):
+        """Verifica que el índice descarte los códigos menos usados al superar la capacidad"""
+        from .codigos import IndiceCodigos
+        
+        for i in range(5):
+            Producto.objects.create(nombre=f"P{i}", precio=100, stock=1, codigo_barras=f"78100000000{i:02d}")
+        indice = IndiceCodigos(capacidad=3)
+        for i in range(5):
+            indice.buscar(f"78100000000{i:02d}")
+        self.assertEqual(len(indice), 3)
+        with self.assertNumQueries(1):
+            indice.buscar("7810000000000")
+    
+    def test_escanear_y_mover(self):
+        """Verifica el movimiento por código en una sola petición"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/productos/por_codigo/7800000000017/movimiento/', {'tipo': 'salida'}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['tipo'], 'SALIDA')
+        self.assertEqual(response.data['cantidad'], 1)
+        self.assertEqual(response.data['producto_stock_actual'], 9)
+        self.assertEqual(response.data['descripcion'], 'Escaneo 7800000000017')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/productos/por_codigo/7800000000017/movimiento/',
+                {'tipo': 'ENTRADA', 'cantidad': 5, 'descripcion': 'Recepción'}, format='json'
+            )
+        self.assertEqual(response.data['producto_stock_actual'], 14)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 14)
+        self.assertEqual(self.client.get('/api/productos/por_codigo/7800000000017/').data['stock'], 14)
+    
+    def test_escanear_y_mover_errores(self):
+        """Verifica tipo inválido, stock insuficiente y código inexistente"""
+        url = '/api/productos/por_codigo/7800000000017/movimiento/'
+        self.assertEqual(self.client.post(url, {'tipo': 'otro'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'tipo': 'SALIDA', 'cantidad': 'x'}, format='json').status_code, 400)
+        
+        response = self.client.post(url, {'tipo': 'SALIDA', 'cantidad': 50}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['stock_disponible'], 10)
+        
+        response = self.client.post('/api/productos/por_codigo/0000000000000/movimiento/', {'tipo': 'SALIDA'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Movimiento.objects.count(), 0)
+
+
+class MovimientosLoteTestCase(APITestCase):
+    """Tests para el registro de movimientos por lote"""
+    
+    def setUp(self):
+        self.toner = Producto.objects.create(nombre="Toner Lote", precio=20000, stock=5, categoria="Toner")
+        self.papel = Producto.objects.create(nombre="Papel Lote", precio=3000, stock=50, categoria="Papel")
+        Alerta.objects.create(producto=self.toner, umbral=10, activa=True)
+    
+    def test_lote_aplica_en_orden_y_actualiza_todo(self):
+        """Verifica stock, movimientos, alertas y resúmenes de un lote mixto"""
+        from .models import ResumenProducto
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/movimientos/lote/', {'movimientos': [
+                {'producto': self.toner.id, 'tipo': 'ENTRADA', 'cantidad': 20, 'descripcion': 'Pallet'},
+                # La salida usa lo que ingresó el ítem anterior del mismo lote
+                {'producto': self.toner.id, 'tipo': 'salida', 'cantidad': 22, 'descripcion': 'Despacho'},
+                {'producto': self.papel.id, 'tipo': 'SALIDA', 'cantidad': 10, 'descripcion': 'Despacho'},
+            ]}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([m['tipo'] for m in response.data['movimientos']], ['ENTRADA', 'SALIDA', 'SALIDA'])
+        self.toner.refresh_from_db()
+        self.papel.refresh_from_db()
+        self.assertEqual(self.toner.stock, 3)
+        self.assertEqual(self.papel.stock, 40)
+        self.assertEqual(Movimiento.objects.count(), 3)
+        self.assertTrue(self.toner.alertas.get().activa)
+        self.assertEqual(ResumenProducto.objects.get(producto=self.toner).movimientos, 2)
+        self.assertEqual(ResumenProducto.objects.get(producto=self.papel).unidades_salida, 10)
+    
+    def test_lote_todo_o_nada(self):
+        """Verifica que un ítem inválido rechace el lote completo con errores por ítem"""
+        response = self.client.post('/api/movimientos/lote/', [
+            {'producto': self.papel.id, 'tipo': 'SALIDA', 'cantidad': 1, 'descripcion': 'Ok'},
+            {'producto': self.toner.id, 'tipo': 'SALIDA', 'cantidad': 6, 'descripcion': 'Sin stock'},
+            {'producto': 999999, 'tipo': 'ENTRADA', 'cantidad': 1, 'descripcion': 'No existe'},
+        ], format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([e['indice'] for e in response.data['errores']], [1, 2])
+        self.assertIn('Stock insuficiente', response.data['errores'][0]['error'])
+        self.papel.refresh_from_db()
+        self.assertEqual(self.papel.stock, 50)
+        self.assertEqual(Movimiento.objects.count(), 0)
+    
+    def test_lote_validacion_de_formato(self):
+        """Verifica los errores de formato por ítem y los límites del lote"""
+        from unittest.mock import patch
+        
+        response = self.client.post('/api/movimientos/lote/', {'movimientos': [
+            {'producto': self.papel.id, 'tipo': 'SALIDA', 'cantidad': 1, 'descripcion': 'Ok'},
+            {'producto': self.papel.id, 'tipo': 'OTRO', 'cantidad': 0},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['errores']), 1)
+        self.assertEqual(set(response.data['errores'][0]['error']), {'tipo', 'cantidad', 'descripcion'})
+        
+        self.assertEqual(self.client.post('/api/movimientos/lote/', {'movimientos': []}, format='json').status_code, 400)
+        with patch('core.lotes.MAX_ITEMS_LOTE', 2):
+            response = self.client.post('/api/movimientos/lote/', [
+                {'producto': self.papel.id, 'tipo': 'SALIDA', 'cantidad': 1, 'descripcion': 'Ok'}
+            ] * 3, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_lote_performance(self):
+        """Verifica que las consultas no crezcan con la cantidad de ítems del lote"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f"Lote {i}", precio=100, stock=100) for i in range(15)
+        ])
+        items = [
+            {'producto': p.id, 'tipo': 'SALIDA' if i % 2 else 'ENTRADA', 'cantidad': 1, 'descripcion': 'Toma'}
+            for i in range(10) for p in productos
+        ]
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.post('/api/movimientos/lote/', items, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Movimiento.objects.count(), 150)
+        # Un bloqueo, un INSERT y un UPDATE para los 150 ítems; el resto es por producto
+        escrituras_movimiento = [q for q in contexto.captured_queries if q['sql'].startswith('INSERT INTO "core_movimiento"')]
+        self.assertEqual(len(escrituras_movimiento), 1)
+        print(f"[OK] Lote de 150 movimientos sobre 15 productos en {len(contexto.captured_queries)} consultas")
+
+
+class EvaluacionAlertasTestCase(TestCase):
+    """Tests para la evaluación de alertas por conjuntos (UPDATE condicional)"""
+    
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre="Toner Alertas", precio=1000, stock=20)
+        self.baja = Alerta.objects.create(producto=self.producto, umbral=5, activa=False)
+        self.alta = Alerta.objects.create(producto=self.producto, umbral=15, activa=False)
+    
+    def _estados(self, producto):
+        return dict(producto.alertas.values_list('umbral', 'activa'))
+    
+    def test_un_update_por_producto(self):
+        """Verifica que la evaluación de un producto sea una sola sentencia sin importar sus alertas"""
+        from .alertas import evaluar_alertas_producto
+        
+        for umbral in range(20, 30):
+            Alerta.objects.create(producto=self.producto, umbral=umbral, activa=False)
+        self.producto.stock = 10
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(1):
+            cambiaron = evaluar_alertas_producto(self.producto)
+        self.assertEqual(cambiaron, 11)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._estados(self.producto), {5: False, 15: True, **{u: True for u in range(20, 30)}})
+        
+        # Sin cambios de estado: no se escribe ni se invalida el caché de alertas
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(evaluar_alertas_producto(self.producto), 0)
+        self.assertEqual(callbacks, [])
+    
+    def test_movimientos_actualizan_alertas(self):
+        """Verifica el camino de registrar_salida/entrada sobre las alertas"""
+        self.producto.registrar_salida(17, "Venta", "admin")
+        self.assertEqual(self._estados(self.producto), {5: True, 15: True})
+        self.producto.refresh_from_db()
+        self.producto.registrar_entrada(5, "Reposición", "admin")
+        self.assertEqual(self._estados(self.producto), {5: False, 15: True})
+    
+    def test_alerta_por_defecto(self):
+        """Verifica que un producto sin alertas reciba la de umbral 10 al moverse"""
+        sin_alertas = Producto.objects.create(nombre="Sin Alertas", precio=1000, stock=12)
+        sin_alertas.registrar_salida(4, "Venta", "admin")
+        self.assertEqual(self._estados(sin_alertas), {10: True})
+        sin_alertas.registrar_entrada(1, "Ajuste", "admin")
+        self.assertEqual(sin_alertas.alertas.count(), 1)
+    
+    def test_reevaluacion_masiva(self):
+        """Verifica que la variante masiva corrija varios productos en una sentencia"""
+        from .alertas import reevaluar_alertas
+        
+        otro = Producto.objects.create(nombre="Otro", precio=1000, stock=1)
+        Alerta.objects.create(producto=otro, umbral=3, activa=False)
+        nuevo = Producto.objects.create(nombre="Nuevo", precio=1000, stock=2)
+        # Cambios de stock que no pasaron por el modelo
+        Producto.objects.filter(pk=self.producto.pk).update(stock=8)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(reevaluar_alertas([self.producto.pk, otro.pk], crear_faltantes=False), 2)
+        self.assertEqual(self._estados(self.producto), {5: False, 15: True})
+        self.assertEqual(self._estados(otro), {3: True})
+        self.assertFalse(nuevo.alertas.exists())
+        
+        self.assertEqual(reevaluar_alertas(), 1)
+        self.assertEqual(self._estados(nuevo), {10: True})
+        self.assertEqual(reevaluar_alertas(), 0)
+        self.assertEqual(reevaluar_alertas([]), 0)
+    
+    def test_importacion_reevalua_alertas(self):
+        """Verifica que la importación que cambia stock deje las alertas al día"""
+        import io
+        from .importacion import importar_productos
+        
+        Producto.objects.filter(pk=self.producto.pk).update(codigo_barras='7800000000123')
+        archivo = io.BytesIO(
+            'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n'
+            'Toner Alertas,,,Toner,3,1000,,7800000000123\n'.encode()
+        )
+        importar_productos(archivo)
+        self.assertEqual(self._estados(self.producto), {5: True, 15: True})
+
+
+class StockAtomicoTestCase(TestCase):
+    """Tests para las actualizaciones de stock con UPDATE atómico y decremento condicional"""
+    
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre="Toner Atómico", precio=1000, stock=10)
+        Alerta.objects.create(producto=self.producto, umbral=3, activa=False)
+    
+    def test_salida_en_una_sentencia(self):
+        """Verifica que la salida no bloquee con SELECT FOR UPDATE ni relea el producto"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as contexto:
+            self.producto.registrar_salida(4, "Venta", "admin")
+        
+        self.assertEqual(self.producto.stock, 6)
+        sentencias = [q['sql'] for q in contexto.captured_queries if 'core_producto"' in q['sql'].split('FROM')[0]]
+        self.assertEqual(len(sentencias), 1)
+        self.assertIn('RETURNING', sentencias[0])
+        self.assertFalse(any('FOR UPDATE' in q['sql'] for q in contexto.captured_queries))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 6)
+    
+    def test_stock_insuficiente_por_filas_afectadas(self):
+        """Verifica que el decremento condicional rechace la salida sin escribir nada"""
+        from .stock import descontar_stock
+        
+        self.assertIsNone(descontar_stock(self.producto.pk, 11))
+        self.assertEqual(descontar_stock(self.producto.pk, 10), 0)
+        self.assertIsNone(descontar_stock(999999, 1))
+        
+        Producto.objects.filter(pk=self.producto.pk).update(stock=2)
+        with self.assertRaisesMessage(ValueError, 'Disponible: 2, Solicitado: 5'):
+            self.producto.registrar_salida(5, "Venta", "admin")
+        self.assertEqual(self.producto.stock, 2)
+        self.assertEqual(Movimiento.objects.count(), 0)
+    
+    def test_instancias_desactualizadas_no_pierden_movimientos(self):
+        """Verifica que entradas, salidas y ajustes desde copias viejas no pisen el stock"""
+        copia_a = Producto.objects.get(pk=self.producto.pk)
+        copia_b = Producto.objects.get(pk=self.producto.pk)
+        
+        copia_a.registrar_entrada(5, "Compra", "admin")
+        copia_b.registrar_entrada(3, "Compra", "admin")
+        self.assertEqual(copia_b.stock, 18)
+        copia_a.registrar_salida(15, "Venta", "admin")
+        self.assertEqual(copia_a.stock, 3)
+        
+        # El ajuste calcula la diferencia sobre el stock guardado, no sobre la copia (18)
+        movimiento = copia_b.ajustar_stock(1, usuario="admin")
+        self.assertEqual((movimiento.tipo, movimiento.cantidad), ('SALIDA', 2))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+        self.assertTrue(self.producto.alertas.get().activa)
+    
+    def test_respaldo_sin_returning(self):
+        """Verifica el camino con F() y relectura en motores sin RETURNING en UPDATE"""
+        from unittest.mock import patch
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .stock import descontar_stock, sumar_stock
+        
+        with patch.object(connection.Database, 'sqlite_version_info', (3, 34, 1)):
+            self.assertEqual(sumar_stock(self.producto.pk, 5), 15)
+            self.assertIsNone(descontar_stock(self.producto.pk, 16))
+            self.assertEqual(descontar_stock(self.producto.pk, 15), 0)
+        
+        # MariaDB activa can_return_columns_from_insert sin aceptar UPDATE ... RETURNING
+        with patch.object(connection, 'vendor', 'mysql'):
+            with patch.object(connection.features, 'can_return_columns_from_insert', True):
+                with CaptureQueriesContext(connection) as contexto:
+                    self.assertEqual(sumar_stock(self.producto.pk, 2), 2)
+        self.assertFalse(any('RETURNING' in q['sql'] for q in contexto.captured_queries))
+    
+    def test_producto_inexistente(self):
+        """Verifica que mover un producto borrado no cree movimientos huérfanos"""
+        fantasma = Producto(pk=999999, nombre="Borrado", stock=5)
+        with self.assertRaises(Producto.DoesNotExist):
+            fantasma.registrar_entrada(1, "Compra", "admin")
+        with self.assertRaises(Producto.DoesNotExist):
+            fantasma.registrar_salida(1, "Venta", "admin")
+        self.assertEqual(Movimiento.objects.count(), 0)
+
+
+class EstresConcurrenciaTestCase(TransactionTestCase):
+    """Tests de estrés con hilos reales (TransactionTestCase: los datos deben confirmarse)"""
+    
+    def test_invariantes_bajo_concurrencia(self):
+        """Verifica stock = suma de movimientos y sin negativos con escrituras simultáneas"""
+        from .estres import ejecutar_estres
+        
+        reporte = ejecutar_estres(hilos=4, operaciones=25, productos=2, stock_inicial=5, semilla=7)
+        
+        self.assertEqual(reporte['errores'], 0)
+        self.assertEqual(reporte['operaciones'], 100)
+        self.assertTrue(reporte['invariantes']['stock_igual_movimientos'], reporte['invariantes'])
+        self.assertTrue(reporte['invariantes']['stock_no_negativo'])
+        # Con stock inicial bajo y mucha contención algunas salidas deben rechazarse
+        self.assertGreater(reporte['rechazadas_stock_insuficiente'], 0)
+        self.assertLessEqual(reporte['latencias']['p50_ms'], reporte['latencias']['p99_ms'])
+        # Los productos de prueba se eliminan al terminar
+        self.assertFalse(Producto.objects.exists())
+        print(
+            f"[OK] Estres: {reporte['operaciones']} operaciones en 4 hilos, "
+            f"{reporte['operaciones_por_segundo']} op/s, p95 {reporte['latencias']['p95_ms']} ms, "
+            f"{reporte['esperas_bloqueo']} esperas por bloqueo"
+        )
+    
+    def test_detecta_invariante_violada(self):
+        """Verifica que una escritura de stock sin movimiento se informe como diferencia"""
+        from .estres import crear_productos, verificar_invariantes
+        
+        ids = crear_productos(2, stock_inicial=10)
+        self.assertTrue(verificar_invariantes(ids)['stock_igual_movimientos'])
+        
+        Producto.objects.filter(pk=ids[0]).update(stock=7)
+        resultado = verificar_invariantes(ids)
+        self.assertFalse(resultado['stock_igual_movimientos'])
+        self.assertEqual(resultado['diferencias'], [{'producto': ids[0], 'stock': 7, 'movimientos': 10}])
+        
+        Producto.objects.filter(pk=ids[1]).update(stock=-1)
+        self.assertFalse(verificar_invariantes(ids)['stock_no_negativo'])
+    
+    def test_percentiles(self):
+        """Verifica el cálculo de percentiles por rango más cercano"""
+        from .estres import percentil
+        
+        valores = list(range(1, 101))
+        self.assertEqual(percentil(valores, 50), 50)
+        self.assertEqual(percentil(valores, 95), 95)
+        self.assertEqual(percentil(valores, 99), 99)
+        self.assertEqual(percentil([3], 99), 3)
+        self.assertIsNone(percentil([], 50))
+    
+    def test_comando(self):
+        """Verifica el reporte del comando estres_stock"""
+        import io
+        from django.core.management import call_command
+        
+        salida = io.StringIO()
+        call_command('estres_stock', hilos=2, operaciones=10, productos=1, semilla=3, stdout=salida)
+        texto = salida.getvalue()
+        self.assertIn('p95', texto)
+        self.assertIn('Invariantes OK', texto)
+
+
+class LibroStockTestCase(APITestCase):
+    """Tests para el libro de stock: cortes, stock a una fecha y reconciliación"""
+    
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        self.ahora = timezone.now()
+        self.dias = lambda n: self.ahora - timedelta(days=n)
+        self.toner = Producto.objects.create(nombre="Toner Libro", precio=20000, stock=0, categoria="Toner")
+        self.papel = Producto.objects.create(nombre="Papel Libro", precio=3000, stock=0, categoria="Papel")
+        Producto.objects.filter(pk__in=[self.toner.pk, self.papel.pk]).update(fecha_creacion=self.dias(11))
+        # Historia: +10 hace 10 días, -3 hace 8, +5 hace 5, -4 hace 2
+        for dias, metodo, cantidad in ((10, 'registrar_entrada', 10), (8, 'registrar_salida', 3),
+                                       (5, 'registrar_entrada', 5), (2, 'registrar_salida', 4)):
+            movimiento = getattr(self.toner, metodo)(cantidad, 'Historia')
+            Movimiento.objects.filter(pk=movimiento.pk).update(fecha=self.dias(dias))
+        self.papel.registrar_entrada(20, 'Historia')
+    
+    def test_stock_a_fecha_sin_cortes(self):
+        """Verifica el stock a distintas fechas sumando la historia de movimientos"""
+        from .libro_stock import stock_a_fecha
+        
+        self.assertEqual(stock_a_fecha(self.toner.pk, self.dias(11)), 0)
+        self.assertEqual(stock_a_fecha(self.toner.pk, self.dias(9)), 10)
+        self.assertEqual(stock_a_fecha(self.toner.pk, self.dias(6)), 7)
+        self.assertEqual(stock_a_fecha(self.toner.pk, self.dias(3)), 12)
+        self.assertEqual(stock_a_fecha(self.toner.pk), 8)
+        self.assertIsNone(stock_a_fecha(999999))
+    
+    def test_cortes_acotan_los_movimientos_leidos(self):
+        """Verifica que después de un corte solo se lean los movimientos posteriores"""
+        from .libro_stock import stock_a_fecha, tomar_cortes
+        from .models import CorteStock
+        
+        self.assertEqual(tomar_cortes(hasta=self.dias(6)), 1)  # el papel aún no tenía movimientos
+        self.assertEqual(CorteStock.objects.get(producto=self.toner).stock, 7)
+        
+        # Alterar un movimiento anterior al corte no cambia el stock posterior: se parte del corte
+        Movimiento.objects.filter(producto=self.toner, fecha__lt=self.dias(9)).update(cantidad=100)
+        self.assertEqual(stock_a_fecha(self.toner.pk, self.dias(3)), 12)
+        self.assertEqual(stock_a_fecha(self.toner.pk), 8)
+        # Antes del corte se recorre la historia
+        self.assertEqual(stock_a_fecha(self.toner.pk, self.dias(9)), 100)
+    
+    def test_tomar_cortes_incremental(self):
+        """Verifica que solo se escriban cortes de productos con movimientos nuevos"""
+        from datetime import timedelta
+        from .libro_stock import tomar_cortes
+        from .models import CorteStock
+        
+        self.assertEqual(tomar_cortes(hasta=self.dias(1)), 1)  # el papel aún no tenía movimientos
+        self.assertEqual(tomar_cortes(hasta=self.dias(1)), 0)
+        movimiento = self.toner.registrar_salida(1, 'Nueva venta')
+        Movimiento.objects.filter(pk=movimiento.pk).update(fecha=self.ahora - timedelta(hours=12))
+        self.assertEqual(tomar_cortes(hasta=self.ahora - timedelta(hours=1)), 1)
+        
+        self.assertEqual(
+            list(CorteStock.objects.filter(producto=self.toner).values_list('stock', flat=True)), [7, 8]
+        )
+        self.assertFalse(CorteStock.objects.filter(producto=self.papel).exists())
+        
+        # Un corte futuro quedaría desactualizado por los movimientos que aún no ocurren
+        with self.assertRaises(ValueError):
+            tomar_cortes(hasta=self.ahora + timedelta(minutes=1))
+    
+    def test_reconciliar_detecta_y_repara_desde_el_libro(self):
+        """Verifica que en modo estricto un stock escrito sin movimiento se corrija al valor del libro"""
+        from django.test import override_settings
+        from .libro_stock import reconciliar, tomar_cortes
+        
+        tomar_cortes(hasta=self.dias(1))
+        Producto.objects.filter(pk=self.toner.pk).update(stock=50)
+        
+        resultado = reconciliar()
+        self.assertEqual(resultado['revisados'], 2)
+        self.assertEqual(resultado['desfases'], [
+            {'producto': self.toner.pk, 'stock': 50, 'stock_libro': 8, 'diferencia': -42}
+        ])
+        self.assertEqual(resultado['reparados'], 0)
+        
+        # Fuera del modo estricto el stock editado es legítimo: no se pisa con el libro
+        with self.assertRaises(ValueError):
+            reconciliar(reparar=True, fuente='libro')
+        
+        with override_settings(LIBRO_STOCK_ESTRICTO=True), self.captureOnCommitCallbacks(execute=True):
+            resultado = reconciliar(reparar=True, fuente='libro', tamano_lote=1)
+        self.assertEqual((resultado['reparados'], resultado['omitidos']), (1, []))
+        self.toner.refresh_from_db()
+        self.assertEqual(self.toner.stock, 8)
+        # El stock volvió bajo el umbral: la alerta por defecto sigue activa
+        self.assertTrue(self.toner.alertas.get().activa)
+        self.assertEqual(reconciliar()['desfases'], [])
+    
+    def test_reconciliar_conserva_stock_con_movimiento_compensatorio(self):
+        """Verifica que la fuente 'stock' agregue al libro la diferencia en lugar de tocar el stock"""
+        from .libro_stock import DESCRIPCION_RECONCILIACION, reconciliar, stock_a_fecha
+        
+        Producto.objects.filter(pk=self.papel.pk).update(stock=17)  # conteo físico
+        resultado = reconciliar(reparar=True, fuente='stock')
+        
+        self.assertEqual(resultado['reparados'], 1)
+        self.papel.refresh_from_db()
+        self.assertEqual(self.papel.stock, 17)
+        compensatorio = self.papel.movimientos.get(descripcion=DESCRIPCION_RECONCILIACION)
+        self.assertEqual((compensatorio.tipo, compensatorio.cantidad), ('SALIDA', 3))
+        self.assertEqual(stock_a_fecha(self.papel.pk), 17)
+        self.assertEqual(self.papel.resumen.unidades_salida, 3)
+        
+        with self.assertRaises(ValueError):
+            reconciliar(fuente='otra')
+    
+    def test_reconciliar_no_deja_stock_negativo(self):
+        """Verifica que la corrección al libro omita los productos que quedarían con stock negativo"""
+        from django.test import override_settings
+        from .libro_stock import reconciliar
+        
+        # Salida escrita en el libro sin pasar por el stock: el libro queda en -10
+        Movimiento.objects.create(producto=self.papel, tipo='SALIDA', cantidad=30, descripcion='Error')
+        Producto.objects.filter(pk=self.toner.pk).update(stock=50)
+        
+        with override_settings(LIBRO_STOCK_ESTRICTO=True):
+            resultado = reconciliar(reparar=True, fuente='libro')
+        
+        self.assertEqual((resultado['reparados'], resultado['omitidos']), (1, [self.papel.pk]))
+        self.papel.refresh_from_db()
+        self.toner.refresh_from_db()
+        self.assertEqual((self.papel.stock, self.toner.stock), (20, 8))
+    
+    def test_saldo_de_apertura_de_producto_creado_con_stock(self):
+        """Verifica que el stock inicial quede como corte de apertura y el libro coincida tras una salida"""
+        from .libro_stock import reconciliar, stock_a_fecha
+        from .models import CorteStock
+        
+        tinta = Producto.objects.create(nombre="Tinta Apertura", precio=1000, stock=50, categoria="Tinta")
+        tinta.registrar_salida(5, 'Venta')
+        
+        apertura = CorteStock.objects.get(producto=tinta)
+        self.assertEqual((apertura.fecha, apertura.stock), (tinta.fecha_creacion, 50))
+        self.assertEqual(stock_a_fecha(tinta.pk), 45)
+        self.assertEqual(reconciliar()['desfases'], [])
+        
+        resultado = reconciliar(reparar=True)
+        self.assertEqual(resultado['reparados'], 0)
+        tinta.refresh_from_db()
+        self.assertEqual(tinta.stock, 45)
+        
+        # Cambiar la historia invalida los cortes posteriores, no el de apertura
+        self.client.delete(f'/api/movimientos/{tinta.movimientos.get().pk}/')
+        self.assertEqual(stock_a_fecha(tinta.pk), 50)
+    
+    def test_reconciliar_completo_ignora_cortes(self):
+        """Verifica que --completo compare contra toda la historia aunque haya cortes"""
+        from .libro_stock import reconciliar, tomar_cortes
+        
+        tomar_cortes(hasta=self.dias(1))
+        Movimiento.objects.filter(producto=self.toner, fecha__lt=self.dias(9)).update(cantidad=11)
+        
+        self.assertEqual(reconciliar()['desfases'], [])
+        desfases = reconciliar(usar_cortes=False)['desfases']
+        self.assertEqual([(d['producto'], d['diferencia']) for d in desfases], [(self.toner.pk, 1)])
+    
+    def test_anotar_stock_libro_por_conjunto(self):
+        """Verifica el stock del libro de todos los productos en una sola consulta"""
+        from .libro_stock import anotar_stock_libro, tomar_cortes
+        
+        tomar_cortes(hasta=self.dias(6))
+        with self.assertNumQueries(1):
+            stocks = dict(anotar_stock_libro(Producto.objects.all(), hasta=self.dias(3)).values_list('pk', 'stock_libro'))
+        self.assertEqual(stocks, {self.toner.pk: 12, self.papel.pk: 0})
+    
+    def test_editar_o_borrar_movimiento_invalida_cortes(self):
+        """Verifica que cambiar la historia elimine los cortes posteriores al movimiento"""
+        from .libro_stock import stock_a_fecha, tomar_cortes
+        from .models import CorteStock
+        
+        tomar_cortes(hasta=self.dias(6))
+        tomar_cortes(hasta=self.dias(1))
+        self.assertEqual(CorteStock.objects.filter(producto=self.toner).count(), 2)
+        
+        movimiento = self.toner.movimientos.get(fecha__lt=self.dias(4), fecha__gt=self.dias(6))
+        response = self.client.delete(f'/api/movimientos/{movimiento.pk}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(CorteStock.objects.filter(producto=self.toner).values_list('stock', flat=True)), [7])
+        self.assertEqual(stock_a_fecha(self.toner.pk), 3)
+    
+    def test_endpoint_stock_a_fecha(self):
+        """Verifica GET /api/productos/{id}/stock_a_fecha/"""
+        fecha = self.dias(6).date().isoformat()
+        response = self.client.get(f'/api/productos/{self.toner.pk}/stock_a_fecha/', {'fecha': fecha})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock'], 7)
+        self.assertEqual(response.data['stock_actual'], 8)
+        
+        response = self.client.get(
+            f'/api/productos/{self.toner.pk}/stock_a_fecha/', {'fecha': self.dias(3).isoformat()}
+        )
+        self.assertEqual(response.data['stock'], 12)
+        
+        for fecha in ('', 'ayer', '2024-02-30'):
+            response = self.client.get(f'/api/productos/{self.toner.pk}/stock_a_fecha/', {'fecha': fecha})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_modo_estricto(self):
+        """Verifica que en modo estricto todo cambio de stock quede en el libro y no se edite la historia"""
+        from django.test import override_settings
+        from .libro_stock import reconciliar
+        
+        with override_settings(LIBRO_STOCK_ESTRICTO=True):
+            movimiento = self.toner.movimientos.first()
+            self.assertEqual(self.client.delete(f'/api/movimientos/{movimiento.pk}/').status_code, 403)
+            response = self.client.patch(f'/api/movimientos/{movimiento.pk}/', {'cantidad': 1}, format='json')
+            self.assertEqual(response.status_code, 403)
+            
+            response = self.client.post('/api/productos/', {
+                'nombre': 'Tinta Libro', 'precio': 5000, 'stock': 7, 'categoria': 'Tinta'
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            tinta = Producto.objects.get(pk=response.data['id'])
+            # El stock inicial es el corte de apertura, no un movimiento
+            self.assertFalse(tinta.movimientos.exists())
+            self.assertEqual(tinta.cortes.get().stock, 7)
+            
+            response = self.client.patch(f'/api/productos/{tinta.pk}/', {'stock': 4, 'precio': 5500}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            tinta.refresh_from_db()
+            self.assertEqual((tinta.stock, tinta.precio), (4, Decimal('5500')))
+            
+            # Un movimiento directo se aplica al stock del producto
+            response = self.client.post('/api/movimientos/', {
+                'producto': tinta.pk, 'tipo': 'SALIDA', 'cantidad': 1
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data['producto_stock_actual'], 3)
+        
+        self.assertEqual(reconciliar()['desfases'], [])
+    
+    def test_importacion_en_modo_estricto(self):
+        """Verifica que el stock importado quede registrado como movimientos o corte de apertura"""
+        import io
+        from django.test import override_settings
+        from .importacion import importar_productos, DESCRIPCION_IMPORTACION
+        from .libro_stock import reconciliar
+        
+        Producto.objects.filter(pk=self.toner.pk).update(codigo_barras='7800000000011')
+        csv = (
+            'nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras\n'
+            'Toner Libro,,,Toner,2,20000,,7800000000011\n'
+            'Kit Libro,Brother,K1,Kit,6,9000,,\n'
+        )
+        with override_settings(LIBRO_STOCK_ESTRICTO=True):
+            resultado = importar_productos(io.BytesIO(csv.encode('utf-8')))
+        
+        self.assertEqual((resultado['creados'], resultado['actualizados']), (1, 1))
+        movimientos = Movimiento.objects.filter(descripcion=DESCRIPCION_IMPORTACION)
+        self.assertEqual(
+            sorted(movimientos.values_list('producto__nombre', 'tipo', 'cantidad')),
+            [('Toner Libro', 'SALIDA', 6)]
+        )
+        self.assertEqual(Producto.objects.get(nombre='Kit Libro').cortes.get().stock, 6)
+        self.assertEqual(reconciliar()['desfases'], [])
+    
+    def test_comando_reconciliar_stock(self):
+        """Verifica el reporte y la reparación del comando reconciliar_stock"""
+        import io
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        
+        Producto.objects.filter(pk=self.papel.pk).update(stock=25)
+        salida = io.StringIO()
+        call_command('reconciliar_stock', stdout=salida)
+        self.assertIn(f'Producto {self.papel.pk}: stock 25, libro 20 (-5)', salida.getvalue())
+        self.assertIn('--reparar', salida.getvalue())
+        
+        with self.assertRaises(CommandError):
+            call_command('reconciliar_stock', reparar=True, fuente='libro', stdout=io.StringIO())
+        
+        # Por defecto se conserva el stock y el libro recibe el movimiento compensatorio
+        salida = io.StringIO()
+        call_command('reconciliar_stock', reparar=True, stdout=salida)
+        self.assertIn('Desfases reparados: 1', salida.getvalue())
+        self.papel.refresh_from_db()
+        self.assertEqual(self.papel.stock, 25)
+        
+        salida = io.StringIO()
+        call_command('tomar_cortes_stock', stdout=salida)
+        call_command('reconciliar_stock', stdout=salida)
+        self.assertIn('Stock y libro coinciden', salida.getvalue())
+
+
+class ValorizacionInventarioTestCase(APITestCase):
+    """Tests para el inventario diario y la valorización a una fecha"""
+    
+    def setUp(self):
+        from datetime import datetime, time, timedelta
+        from django.utils import timezone
+        
+        hoy = timezone.localdate()
+        self.dia = lambda n: hoy - timedelta(days=n)
+        mediodia = lambda n: timezone.make_aware(datetime.combine(self.dia(n), time(12)))
+        self.toner = Producto.objects.create(nombre="Toner Valor", precio=20000, stock=0, categoria="Toner")
+        self.papel = Producto.objects.create(nombre="Papel Valor", precio=3000, stock=0, categoria="Papel")
+        Producto.objects.filter(pk__in=[self.toner.pk, self.papel.pk]).update(fecha_creacion=mediodia(10))
+        # Toner: +10 hace 5 días, -3 hace 3; papel: +20 hace 5, +5 hace 1
+        for producto, dias, metodo, cantidad in ((self.toner, 5, 'registrar_entrada', 10),
+                                                 (self.toner, 3, 'registrar_salida', 3),
+                                                 (self.papel, 5, 'registrar_entrada', 20),
+                                                 (self.papel, 1, 'registrar_entrada', 5)):
+            movimiento = getattr(producto, metodo)(cantidad, 'Historia')
+            Movimiento.objects.filter(pk=movimiento.pk).update(fecha=mediodia(dias))
+    
+    def _stocks(self, dia):
+        from .models import InventarioDiario
+        return dict(InventarioDiario.objects.filter(fecha=dia).values_list('producto_id', 'stock'))
+    
+    def test_generacion_incremental(self):
+        """Verifica que el primer día salga de la proyección y los siguientes del día anterior más sus movimientos"""
+        from .valorizacion import generar_inventario_diario
+        
+        self.assertEqual(generar_inventario_diario(hasta=self.dia(3)), 1)
+        self.assertEqual(self._stocks(self.dia(3)), {self.toner.pk: 7, self.papel.pk: 20})
+        
+        # Los días siguientes no releen la historia: alterar un movimiento ya incluido no los cambia
+        Movimiento.objects.filter(producto=self.papel, cantidad=20).update(cantidad=99)
+        self.assertEqual(generar_inventario_diario(), 2)
+        self.assertEqual(self._stocks(self.dia(2)), {self.toner.pk: 7, self.papel.pk: 20})
+        self.assertEqual(self._stocks(self.dia(1)), {self.toner.pk: 7, self.papel.pk: 25})
+        self.assertEqual(generar_inventario_diario(), 0)
+        
+        # Regenerar desde un día sin día anterior vuelve a partir del stock guardado (conteo físico)
+        Producto.objects.filter(pk=self.papel.pk).update(stock=30)
+        self.assertEqual(generar_inventario_diario(desde=self.dia(3), hasta=self.dia(3)), 1)
+        self.assertEqual(self._stocks(self.dia(3))[self.papel.pk], 25)
+    
+    def test_producto_creado_con_stock(self):
+        """Verifica el stock inicial en el primer día y en productos nuevos desde la última fila"""
+        from datetime import datetime, time
+        from django.utils import timezone
+        from .models import InventarioDiario
+        from .valorizacion import generar_inventario_diario, valorizacion
+        
+        generar_inventario_diario(hasta=self.dia(4))
+        tinta = Producto.objects.create(nombre="Tinta Valor", precio=1000, stock=50, categoria="Tinta")
+        Producto.objects.filter(pk=tinta.pk).update(
+            fecha_creacion=timezone.make_aware(datetime.combine(self.dia(3), time(9)))
+        )
+        venta = tinta.registrar_salida(5, 'Venta')
+        Movimiento.objects.filter(pk=venta.pk).update(
+            fecha=timezone.make_aware(datetime.combine(self.dia(2), time(12)))
+        )
+        
+        generar_inventario_diario()
+        self.assertEqual(self._stocks(self.dia(3))[tinta.pk], 50)
+        self.assertEqual(self._stocks(self.dia(1))[tinta.pk], 45)
+        
+        # Primer día sin filas previas
+        InventarioDiario.objects.all().delete()
+        self.assertEqual(generar_inventario_diario(), 1)
+        categorias = {c['categoria']: c for c in valorizacion(self.dia(1))['por_categoria']}
+        self.assertEqual((categorias['Tinta']['valor'], categorias['Tinta']['unidades']), (45000.0, 45))
+    
+    def test_solo_dias_cerrados(self):
+        """Verifica que no se generen el día en curso ni rangos invertidos"""
+        from .valorizacion import generar_inventario_diario
+        
+        with self.assertRaises(ValueError):
+            generar_inventario_diario(hasta=self.dia(0))
+        with self.assertRaises(ValueError):
+            generar_inventario_diario(desde=self.dia(2), hasta=self.dia(3))
+    
+    def test_valorizacion_una_consulta_con_precio_del_dia(self):
+        """Verifica totales y categorías desde las filas del día, con el precio al generarlas"""
+        from .valorizacion import generar_inventario_diario, valorizacion
+        
+        generar_inventario_diario(hasta=self.dia(3))
+        Producto.objects.filter(pk=self.toner.pk).update(precio=50000)
+        
+        with self.assertNumQueries(1):
+            datos = valorizacion(self.dia(3))
+        self.assertEqual(datos['valor_total'], 7 * 20000 + 20 * 3000)
+        self.assertEqual(datos['unidades'], 27)
+        self.assertEqual(datos['productos'], 2)
+        self.assertEqual(
+            [(c['categoria'], c['valor']) for c in datos['por_categoria']],
+            [('Toner', 140000.0), ('Papel', 60000.0)]
+        )
+        self.assertIsNone(valorizacion(self.dia(4)))
+    
+    def test_endpoint_valorizacion(self):
+        """Verifica GET /api/productos/valorizacion/"""
+        from .valorizacion import generar_inventario_diario
+        
+        response = self.client.get('/api/productos/valorizacion/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(response.data['ultima_fecha'])
+        
+        generar_inventario_diario(hasta=self.dia(3))
+        generar_inventario_diario()
+        
+        response = self.client.get('/api/productos/valorizacion/', {'fecha': self.dia(3).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['valor_total'], 200000.0)
+        
+        # Sin fecha: el último día generado
+        response = self.client.get('/api/productos/valorizacion/')
+        self.assertEqual(response.data['fecha'], self.dia(1).isoformat())
+        self.assertEqual(response.data['valor_total'], 7 * 20000 + 25 * 3000)
+        
+        response = self.client.get('/api/productos/valorizacion/', {'fecha': self.dia(8).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['ultima_fecha'], self.dia(1).isoformat())
+        
+        for fecha in ('ayer', '2024-02-30'):
+            response = self.client.get('/api/productos/valorizacion/', {'fecha': fecha})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_borrar_movimiento_corrige_dias_generados(self):
+        """Verifica que eliminar un movimiento ya incluido corrija stock y valor desde su día"""
+        from .valorizacion import generar_inventario_diario, valorizacion
+        
+        generar_inventario_diario(hasta=self.dia(4))
+        generar_inventario_diario()
+        salida = self.toner.movimientos.get(tipo='SALIDA')
+        
+        response = self.client.delete(f'/api/movimientos/{salida.pk}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._stocks(self.dia(4))[self.toner.pk], 10)
+        self.assertEqual(self._stocks(self.dia(3))[self.toner.pk], 10)
+        self.assertEqual(valorizacion(self.dia(1))['valor_total'], 10 * 20000 + 25 * 3000)
+    
+    def test_historia_conservada_al_eliminar_producto(self):
+        """Verifica que eliminar un producto no cambie la valorización de días pasados"""
+        from .valorizacion import generar_inventario_diario, valorizacion
+        
+        generar_inventario_diario(hasta=self.dia(3))
+        self.toner.delete()
+        
+        self.assertEqual(valorizacion(self.dia(3))['valor_total'], 200000.0)
+        # Los días siguientes ya no lo incluyen
+        generar_inventario_diario()
+        self.assertEqual(valorizacion(self.dia(1))['valor_total'], 25 * 3000)
+    
+    def test_comando_generar_inventario_diario(self):
+        """Verifica el comando generar_inventario_diario"""
+        import io
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        
+        salida = io.StringIO()
+        call_command('generar_inventario_diario', desde=self.dia(5).isoformat(), stdout=salida)
+        self.assertIn('Días de inventario generados: 5', salida.getvalue())
+        self.assertEqual(self._stocks(self.dia(5)), {self.toner.pk: 10, self.papel.pk: 20})
+        
+        with self.assertRaises(CommandError):
+            call_command('generar_inventario_diario', hasta='mañana', stdout=io.StringIO())
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductoViewSet, MovimientoViewSet, AlertaViewSet, reset_database, populate_database
+from .views import ProductoViewSet, MovimientoViewSet, AlertaViewSet, TareaViewSet, reset_database, populate_database
 from .salud import verificacion_rapida, verificacion_detallada, obtener_metricas, estado_completo
 
 # Router de Django Rest Framework para generar URLs automáticamente
@@ -8,6 +8,7 @@ router = DefaultRouter()
 router.register(r'productos', ProductoViewSet, basename='producto')
 router.register(r'movimientos', MovimientoViewSet, basename='movimiento')
 router.register(r'alertas', AlertaViewSet, basename='alerta')
+router.register(r'tareas', TareaViewSet, basename='tarea')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,196 @@
+"""
+Valorización del inventario a una fecha desde filas diarias.
+
+`generar_inventario_diario` (comando del mismo nombre, programado cada noche) escribe
+una fila InventarioDiario por producto y día cerrado con el stock al cierre y su valor.
+Cada día se calcula desde las filas del día anterior más los movimientos de ese día, de
+modo que el trabajo solo lee los movimientos nuevos. El primer día, y los productos sin
+fila el día anterior, parten de la proyección: `Producto.stock` menos el neto de los
+movimientos posteriores al cierre del día (el stock guardado es la fuente de verdad
+también fuera del modo estricto, ver core/libro_stock.py).
+
+`valorizacion` responde el valor del inventario a una fecha (p. ej. el cierre de mes)
+con un GROUP BY sobre las filas de ese día (índice (fecha, categoria)), sin recorrer la
+historia de movimientos ni usar el precio actual de los productos.
+
+Editar o eliminar un movimiento ya incluido corrige el stock y el valor de las filas
+del producto desde ese día (`corregir_inventario_diario`).
+"""
+import logging
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .libro_stock import neto_movimientos
+from .models import InventarioDiario, Movimiento, Producto
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 1000
+
+
+def _inicio(dia):
+    """Comienzo del día local `dia` como datetime con zona horaria"""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _stock_proyectado(dia, productos):
+    """Stock al cierre de `dia` de los productos indicados: el actual menos los movimientos posteriores"""
+    posteriores = Movimiento.objects.filter(
+        producto=OuterRef('pk'), fecha__gte=_inicio(dia + timedelta(days=1))
+    ).order_by().values('producto').annotate(neto=neto_movimientos()).values('neto')
+    return dict(
+        Producto.objects.filter(pk__in=productos).order_by().annotate(
+            posterior=Coalesce(Subquery(posteriores, output_field=IntegerField()), 0)
+        ).values_list('pk', F('stock') - F('posterior'))
+    )
+
+
+def _netos_del_dia(dia):
+    """Entradas menos salidas de cada producto durante `dia`"""
+    return dict(
+        Movimiento.objects.filter(
+            fecha__gte=_inicio(dia), fecha__lt=_inicio(dia + timedelta(days=1))
+        ).values('producto_id').annotate(neto=neto_movimientos()).order_by().values_list('producto_id', 'neto')
+    )
+
+
+def _generar_dia(dia, anteriores):
+    """
+    Escribe (o reescribe) las filas de `dia` a partir del stock del día anterior
+
+    Args:
+        anteriores: {producto_id: stock} del día anterior, o None para partir de la proyección
+
+    Returns:
+        {producto_id: stock} del día, para generar el siguiente
+    """
+    anteriores = anteriores or {}
+    productos = list(Producto.objects.filter(
+        fecha_creacion__lt=_inicio(dia + timedelta(days=1))
+    ).order_by().values_list('pk', 'precio', 'categoria'))
+    netos = _netos_del_dia(dia) if anteriores else {}
+    # Sin fila el día anterior (primer día o producto nuevo) se parte de la proyección
+    sin_fila = [producto_id for producto_id, _, _ in productos if producto_id not in anteriores]
+    proyectados = {}
+    for inicio in range(0, len(sin_fila), TAMANO_LOTE):
+        proyectados.update(_stock_proyectado(dia, sin_fila[inicio:inicio + TAMANO_LOTE]))
+
+    stocks = {}
+    filas = []
+    for producto_id, precio, categoria in productos:
+        if producto_id in anteriores:
+            stocks[producto_id] = anteriores[producto_id] + netos.get(producto_id, 0)
+        else:
+            stocks[producto_id] = proyectados.get(producto_id, 0)
+        stock = stocks[producto_id]
+        filas.append(InventarioDiario(
+            producto_id=producto_id, fecha=dia, categoria=categoria, stock=stock, precio=precio, valor=stock * precio
+        ))
+    InventarioDiario.objects.bulk_create(
+        filas,
+        batch_size=TAMANO_LOTE,
+        update_conflicts=True,
+        unique_fields=['producto', 'fecha'],
+        update_fields=['categoria', 'stock', 'precio', 'valor'],
+    )
+    return stocks
+
+
+def generar_inventario_diario(hasta=None, desde=None):
+    """
+    Genera las filas diarias pendientes hasta el día cerrado `hasta` (por defecto ayer)
+
+    Sin `desde` continúa desde el día siguiente al último generado (o genera solo
+    `hasta` si aún no hay filas); con `desde` regenera desde ese día. Es idempotente.
+
+    Returns:
+        Cantidad de días generados
+
+    Raises:
+        ValueError: Si `hasta` no es un día cerrado o `desde` es posterior a `hasta`
+    """
+    ayer = timezone.localdate() - timedelta(days=1)
+    hasta = hasta or ayer
+    if hasta > ayer:
+        raise ValueError('Solo se generan días cerrados (hasta ayer)')
+    if desde is None:
+        ultimo = InventarioDiario.objects.aggregate(ultimo=Max('fecha'))['ultimo']
+        desde = ultimo + timedelta(days=1) if ultimo else hasta
+        if desde > hasta:
+            return 0
+    elif desde > hasta:
+        raise ValueError('La fecha inicial es posterior a la final')
+
+    anteriores = None
+    previas = InventarioDiario.objects.filter(fecha=desde - timedelta(days=1))
+    if previas.exists():
+        anteriores = dict(previas.filter(producto__isnull=False).values_list('producto_id', 'stock'))
+
+    dias = 0
+    dia = desde
+    while dia <= hasta:
+        with transaction.atomic():
+            anteriores = _generar_dia(dia, anteriores)
+        dias += 1
+        dia += timedelta(days=1)
+
+    logger.info(f"Inventario diario generado - Desde: {desde}, Hasta: {hasta}, Días: {dias}")
+    return dias
+
+
+def corregir_inventario_diario(movimiento, signo):
+    """
+    Quita (signo=-1) o agrega (signo=1) un movimiento a las filas diarias ya generadas
+    de su producto desde el día del movimiento. Debe llamarse en la transacción que
+    edita o elimina el movimiento.
+    """
+    delta = signo * (movimiento.cantidad if movimiento.tipo == 'ENTRADA' else -movimiento.cantidad)
+    return InventarioDiario.objects.filter(
+        producto_id=movimiento.producto_id, fecha__gte=timezone.localdate(movimiento.fecha)
+    ).update(
+        stock=F('stock') + delta,
+        valor=ExpressionWrapper(
+            (F('stock') + delta) * F('precio'), output_field=DecimalField(max_digits=16, decimal_places=2)
+        ),
+    )
+
+
+def ultima_fecha():
+    """Último día con inventario generado, o None"""
+    return InventarioDiario.objects.aggregate(ultimo=Max('fecha'))['ultimo']
+
+
+def valorizacion(dia):
+    """
+    Valor del inventario al cierre de `dia`, total y por categoría, en una consulta
+
+    Returns:
+        Dict con fecha, valor_total, unidades, productos y por_categoria; None si no hay
+        inventario generado para ese día
+    """
+    categorias = list(
+        InventarioDiario.objects.filter(fecha=dia).values('categoria').annotate(
+            valor=Sum('valor'),
+            unidades=Sum('stock'),
+            productos=Count('id'),
+        ).order_by('-valor', 'categoria')
+    )
+    if not categorias:
+        return None
+    return {
+        'fecha': dia.isoformat(),
+        'valor_total': round(float(sum(fila['valor'] for fila in categorias)), 2),
+        'unidades': sum(fila['unidades'] for fila in categorias),
+        'productos': sum(fila['productos'] for fila in categorias),
+        'por_categoria': [
+            {
+                'categoria': fila['categoria'],
+                'valor': round(float(fila['valor']), 2),
+                'unidades': fila['unidades'],
+                'productos': fila['productos'],
+            }
+            for fila in categorias
+        ],
+    }
@@ -1,23 +1,66 @@
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
-from django.http import HttpResponse
+from django.http import FileResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Prefetch
 from django.utils import timezone
 from django.core.cache import cache
-from .models import Producto, Movimiento, Alerta
-from .serializers import ProductoSerializer, MovimientoSerializer, AlertaSerializer
+from .models import Producto, Movimiento, Alerta, ResumenDiarioProducto, Tarea
+from .serializers import ProductoSerializer, MovimientoSerializer, AlertaSerializer, TareaSerializer
 from .pagination import PaginacionEstandar
 from .filters import ProductoFilter, MovimientoFilter, AlertaFilter
-import csv
-from datetime import datetime
-import pytz
+from .busqueda import BusquedaProductosFilter
 import logging
 
 # Configurar logger para esta aplicación
 logger = logging.getLogger(__name__)
 
+
+def _en_segundo_plano(request):
+    """Indica si el cliente pidió ejecutar la operación como tarea (?asincrono=1)"""
+    return request.query_params.get('asincrono', '').lower() in ('1', 'true', 'si')
+
+
+def _parametros_consulta(request):
+    """Parámetros de la consulta que se guardan con la tarea (sin los de control)"""
+    return {clave: valor for clave, valor in request.query_params.items() if clave != 'asincrono'}
+
+
+def _encolar_tarea(request, tipo, parametros=None, archivo=None):
+    """Encola una tarea y responde 202 con su estado y la URL para consultarla"""
+    from .tareas import encolar
+    
+    usuario = str(request.user) if request.user.is_authenticated else 'Anónimo'
+    tarea = encolar(tipo, parametros=parametros, archivo=archivo, usuario=usuario)
+    serializer = TareaSerializer(tarea, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers={'Location': serializer.data['url']})
+
+
+def _fecha_consulta(valor):
+    """
+    Fecha de un parámetro de consulta como datetime con zona horaria: una fecha sin hora
+    es el cierre de ese día local. None si falta o no es válida
+    """
+    from datetime import datetime, time
+    from django.utils.dateparse import parse_date, parse_datetime
+    
+    if not valor:
+        return None
+    try:
+        fecha = parse_datetime(valor)
+        if fecha is None:
+            dia = parse_date(valor)
+            if dia is None:
+                return None
+            fecha = datetime.combine(dia, time.max)
+    except ValueError:
+        return None
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
 class ProductoViewSet(viewsets.ModelViewSet):
     """
     ViewSet para operaciones CRUD de productos con paginación y filtros
@@ -33,6 +76,10 @@ class ProductoViewSet(viewsets.ModelViewSet):
     - GET /api/productos/exportar_csv/ - Exporta productos a CSV
     - POST /api/productos/{id}/registrar_entrada/ - Registra entrada de stock
     - POST /api/productos/{id}/registrar_salida/ - Registra salida de stock
+    - GET /api/productos/{id}/stock_a_fecha/?fecha= - Stock a una fecha según el libro
+    - GET /api/productos/valorizacion/?fecha= - Valor del inventario al cierre de un día
+    - GET /api/productos/por_codigo/{codigo}/ - Búsqueda rápida por código de barras
+    - POST /api/productos/por_codigo/{codigo}/movimiento/ - Escanea y registra el movimiento
     
     Filtros disponibles:
     - categoria: Filtra por categoría exacta
@@ -40,21 +87,60 @@ class ProductoViewSet(viewsets.ModelViewSet):
     - stock_min: Filtra productos con stock mayor o igual
     - stock_max: Filtra productos con stock menor o igual
     
-    Búsqueda (search): Busca en nombre, marca, modelo, descripción, categoría
+    Búsqueda (search): Busca en nombre, marca, modelo, descripción, categoría con índice de
+    texto (tsvector/pg_trgm en PostgreSQL, FTS5 en SQLite) ordenando por relevancia salvo
+    que se indique ?ordering= (ver core/busqueda.py)
     
     Ordenamiento (ordering): nombre, stock, precio, fecha_creacion, categoria
+    
+    Paginación por cursor (opcional): ?paginacion=cursor y luego los enlaces next/previous;
+    ordena por (fecha_creacion, id) y ?conteo=exacto|estimado|ninguno controla el total
     """
-    queryset = Producto.objects.select_related().prefetch_related(
-        'alertas',
-        'movimientos'
-    ).all().order_by('-fecha_creacion')
+    queryset = Producto.objects.all().order_by('-fecha_creacion')
     serializer_class = ProductoSerializer
     pagination_class = PaginacionEstandar
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, BusquedaProductosFilter]
     filterset_class = ProductoFilter
     search_fields = ['nombre', 'marca', 'modelo', 'descripcion', 'categoria']
     ordering_fields = ['nombre', 'stock', 'precio', 'fecha_creacion', 'categoria']
     ordering = ['-fecha_creacion']
+    campo_cursor = 'fecha_creacion'
+    
+    def get_queryset(self):
+        """Precarga alertas activas y últimos movimientos sin N+1 (ver ProductoSerializer)"""
+        return ProductoSerializer.preparar_queryset(super().get_queryset())
+    
+    # Crear, editar o borrar productos cambia las métricas cacheadas del inventario.
+    # El stock inicial queda como corte de apertura (Producto.save) y en modo libro
+    # estricto el stock editado queda como movimiento
+    def perform_create(self, serializer):
+        from .invalidacion import emitir
+        serializer.save()
+        emitir('productos')
+    
+    def perform_update(self, serializer):
+        from django.db import transaction
+        from .invalidacion import emitir
+        from .libro_stock import modo_estricto
+        
+        usuario_str = str(self.request.user) if self.request.user.is_authenticated else 'Anónimo'
+        nuevo_stock = serializer.validated_data.pop('stock', None) if modo_estricto() else None
+        with transaction.atomic():
+            if modo_estricto():
+                # save() escribe todos los campos: el stock debe ser el de la fila bloqueada
+                serializer.instance.stock = Producto.objects.select_for_update().values_list(
+                    'stock', flat=True
+                ).get(pk=serializer.instance.pk)
+            producto = serializer.save()
+            if nuevo_stock is not None:
+                # El ajuste bloquea la fila y registra la diferencia como movimiento
+                producto.ajustar_stock(nuevo_stock, 'Edición de producto', usuario=usuario_str)
+            emitir('productos')
+    
+    def perform_destroy(self, instance):
+        from .invalidacion import emitir
+        instance.delete()
+        emitir('productos')
     
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
@@ -72,47 +158,12 @@ class ProductoViewSet(viewsets.ModelViewSet):
             - valor_inventario: Valor total del inventario
             - por_categoria: Estadísticas agrupadas por categoría
         """
-        from django.db.models import Sum, Count, Q, F
-        from decimal import Decimal
-        
-        # Optimización: usar agregaciones en lugar de iterar
-        productos = Producto.objects.all()
-        
-        # Contadores de stock
-        total = productos.count()
-        critico = productos.filter(stock__lte=5).count()
-        bajo = productos.filter(stock__gt=5, stock__lte=10).count()
-        normal = productos.filter(stock__gt=10).count()
-        
-        # Calcular valor total usando agregación de base de datos
-        valor_total = productos.aggregate(
-            total=Sum(F('stock') * F('precio'))
-        )['total'] or Decimal('0')
-        
-        # Productos por categoría usando agregación
-        categorias_stats = productos.values('categoria').annotate(
-            cantidad=Count('id'),
-            stock_total=Sum('stock'),
-            valor_total=Sum(F('stock') * F('precio'))
-        ).order_by('-cantidad')
-        
-        categorias = {
-            stat['categoria']: {
-                'cantidad': stat['cantidad'],
-                'stock_total': stat['stock_total'] or 0,
-                'valor_total': float(stat['valor_total'] or 0)
-            }
-            for stat in categorias_stats
-        }
+        from .metricas import construir_estadisticas
+        from .invalidacion import CLAVE_ESTADISTICAS
+        from .cache_protegido import obtener_o_calcular
         
-        return Response({
-            'total_productos': total,
-            'stock_critico': critico,
-            'stock_bajo': bajo,
-            'stock_normal': normal,
-            'valor_inventario': round(float(valor_total), 2),
-            'por_categoria': categorias
-        })
+        # Caché compartido con single-flight; las escrituras de stock lo invalidan
+        return Response(obtener_o_calcular(CLAVE_ESTADISTICAS, construir_estadisticas))
     
     @action(detail=False, methods=['get'])
     def metricas_dashboard(self, request):
@@ -120,168 +171,43 @@ class ProductoViewSet(viewsets.ModelViewSet):
         Endpoint completo para el dashboard con todas las métricas necesarias
         Optimizado con caché y consultas eficientes
         """
-        from django.db.models import Sum, Count, Q, F, Avg, Max, Min
-        from decimal import Decimal
-        
-        # Verificar si hay datos en caché (TTL 5 minutos)
-        cache_key = 'metricas_dashboard'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data is not None and not request.query_params.get('refresh'):
-            logger.info("Métricas dashboard obtenidas desde caché")
-            return Response(cached_data)
-        
-        logger.info("Generando métricas dashboard (no en caché)")
-        
-        # Optimización: usar select_related y prefetch_related para reducir queries
-        productos = Producto.objects.only('id', 'nombre', 'stock', 'precio', 'categoria')
-        movimientos = Movimiento.objects.select_related('producto').only(
-            'id', 'producto__nombre', 'tipo', 'fecha', 'cantidad'
-        )
-        alertas = Alerta.objects.only('activa')
-        
-        # Métricas básicas de productos (optimizado con una sola query)
-        stats = productos.aggregate(
-            total_productos=Count('id'),
-            stock_total=Sum('stock'),
-            valor_total=Sum(F('stock') * F('precio')),
-            precio_promedio=Avg('precio'),
-            precio_max=Max('precio'),
-            precio_min=Min('precio')
-        )
-        
-        # Clasificación por stock (optimizado con una sola query)
-        stock_clasificacion = productos.aggregate(
-            critico=Count('id', filter=Q(stock__lte=5)),
-            bajo=Count('id', filter=Q(stock__gt=5, stock__lte=10)),
-            normal=Count('id', filter=Q(stock__gt=10))
-        )
-        
-        # Alertas activas
-        alertas_activas = alertas.filter(activa=True).count()
-        
-        # Top 5 productos más movidos
-        from django.db.models import Count as CountAgg
-        productos_mas_movidos = list(
-            movimientos.values('producto__nombre').annotate(
-                total_movimientos=CountAgg('id')
-            ).order_by('-total_movimientos')[:5]
-        )
-        
-        # Movimientos del día (optimizado)
-        hoy = timezone.now().date()
-        movimientos_hoy_stats = movimientos.filter(fecha__date=hoy).aggregate(
-            entradas=Count('id', filter=Q(tipo='ENTRADA')),
-            salidas=Count('id', filter=Q(tipo='SALIDA'))
+        from .metricas import construir_metricas_dashboard
+        from .invalidacion import CLAVE_DASHBOARD
+        from .cache_protegido import obtener_o_calcular
+        
+        # TTL 5 minutos con recálculo anticipado y sin estampidas: aunque muchos clientes
+        # pidan ?refresh= a la vez, solo un worker recalcula y el resto recibe el valor vigente.
+        # Las escrituras de stock y alertas lo invalidan (ver core/invalidacion.py)
+        data = obtener_o_calcular(
+            CLAVE_DASHBOARD,
+            construir_metricas_dashboard,
+            forzar=bool(request.query_params.get('refresh'))
         )
-        
-        # Top 3 categorías por cantidad
-        top_categorias = list(
-            productos.values('categoria').annotate(
-                cantidad=CountAgg('id')
-            ).order_by('-cantidad')[:3]
-        )
-        
-        # Top 3 categorías por valor
-        top_valor_categoria = [
-            {
-                'categoria': item['categoria'],
-                'valor': round(float(item['valor'] or 0), 2)
-            }
-            for item in productos.values('categoria').annotate(
-                valor=Sum(F('stock') * F('precio'))
-            ).order_by('-valor')[:3]
-        ]
-        
-        # Movimientos de última semana (optimizado con una query)
-        hace_7_dias = timezone.now() - timezone.timedelta(days=7)
-        movimientos_semana = movimientos.filter(fecha__gte=hace_7_dias)
-        
-        # Generar datos por día usando agregación
-        movimientos_por_dia = []
-        for i in range(7):
-            dia = timezone.now() - timezone.timedelta(days=i)
-            stats_dia = movimientos_semana.filter(fecha__date=dia.date()).aggregate(
-                entradas=Count('id', filter=Q(tipo='ENTRADA')),
-                salidas=Count('id', filter=Q(tipo='SALIDA'))
-            )
-            movimientos_por_dia.append({
-                'fecha': dia.strftime('%Y-%m-%d'),
-                'entradas': stats_dia['entradas'],
-                'salidas': stats_dia['salidas']
-            })
-        
-        data = {
-            'resumen': {
-                'total_productos': stats['total_productos'] or 0,
-                'stock_total': stats['stock_total'] or 0,
-                'valor_total': round(float(stats['valor_total'] or 0), 2),
-                'alertas_activas': alertas_activas,
-            },
-            'stock': {
-                'critico': stock_clasificacion['critico'],
-                'bajo': stock_clasificacion['bajo'],
-                'normal': stock_clasificacion['normal']
-            },
-            'actividad_hoy': {
-                'entradas': movimientos_hoy_stats['entradas'],
-                'salidas': movimientos_hoy_stats['salidas'],
-                'total': movimientos_hoy_stats['entradas'] + movimientos_hoy_stats['salidas']
-            },
-            'productos_mas_movidos': productos_mas_movidos,
-            'top_categorias': top_categorias,
-            'top_valor_categoria': top_valor_categoria,
-            'precio_stats': {
-                'promedio': round(float(stats['precio_promedio'] or 0), 2),
-                'maximo': round(float(stats['precio_max'] or 0), 2),
-                'minimo': round(float(stats['precio_min'] or 0), 2)
-            },
-            'movimientos_semana': movimientos_por_dia
-        }
-        
-        # Guardar en caché por 5 minutos (300 segundos)
-        cache.set(cache_key, data, 300)
-        logger.info("Métricas dashboard guardadas en caché")
-        
         return Response(data)
     
     @action(detail=False, methods=['get'])
     def exportar_csv(self, request):
-        """Exporta todos los productos a CSV"""
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="productos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        response.write('\ufeff')  # BOM para UTF-8 en Excel
+        """
+        Exporta todos los productos a CSV en streaming (memoria constante)
+        Con ?asincrono=1 encola la exportación y responde 202 con la tarea
+        """
+        from .exportacion import respuesta_csv, ENCABEZADO_PRODUCTOS, filas_productos
         
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Nombre', 'Marca', 'Modelo', 'Categoría', 'Stock', 'Precio', 'Descripción', 'Fecha Creación'])
+        if _en_segundo_plano(request):
+            return _encolar_tarea(request, 'EXPORTAR_PRODUCTOS')
         
         # Forzar consulta fresca desde la base de datos
-        productos = Producto.objects.all().order_by('-fecha_creacion')
-        tz_chile = pytz.timezone('America/Santiago')
-        
-        for producto in productos:
-            # Convertir UTC a hora local de Chile
-            fecha_local = producto.fecha_creacion.astimezone(tz_chile)
-            
-            writer.writerow([
-                producto.id,
-                producto.nombre,
-                producto.marca,
-                producto.modelo,
-                producto.categoria,
-                producto.stock,
-                producto.precio,
-                producto.descripcion,
-                fecha_local.strftime('%Y-%m-%d %H:%M:%S')
-            ])
-        
-        return response
+        productos = Producto.objects.order_by('-fecha_creacion')
+        return respuesta_csv('productos', ENCABEZADO_PRODUCTOS, filas_productos(productos))
 
     @action(detail=False, methods=['post'])
     def importar_csv(self, request):
         """
         Importa productos desde un archivo CSV
         Formato esperado: nombre,marca,modelo,categoria,stock,precio,descripcion,codigo_barras
+        Los campos pueden ir entre comillas (y contener comas)
+        Con ?asincrono=1 el archivo se guarda y la importación corre en segundo plano
+        (responde 202 con la tarea para consultar su avance en /api/tareas/{id}/)
         """
         if 'archivo' not in request.FILES:
             return Response(
@@ -297,78 +223,18 @@ class ProductoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if _en_segundo_plano(request):
+            return _encolar_tarea(request, 'IMPORTAR_PRODUCTOS', archivo=archivo)
+        
         try:
-            # Leer el archivo CSV
-            contenido = archivo.read().decode('utf-8-sig')  # utf-8-sig maneja el BOM
-            lineas = contenido.split('\n')
-            
-            creados = 0
-            actualizados = 0
-            errores = []
+            from .importacion import importar_productos, importar_ruta
             
-            # Procesar cada línea (saltando la cabecera)
-            for i, linea in enumerate(lineas[1:], start=2):
-                if not linea.strip():
-                    continue
-                
-                try:
-                    partes = linea.strip().split(',')
-                    if len(partes) < 5:
-                        errores.append(f'Línea {i}: formato incorrecto (faltan campos)')
-                        continue
-                    
-                    nombre = partes[0].strip()
-                    marca = partes[1].strip() if len(partes) > 1 else ''
-                    modelo = partes[2].strip() if len(partes) > 2 else ''
-                    categoria = partes[3].strip() if len(partes) > 3 else ''
-                    stock = int(partes[4].strip()) if len(partes) > 4 and partes[4].strip() else 0
-                    precio = float(partes[5].strip()) if len(partes) > 5 and partes[5].strip() else 0
-                    descripcion = partes[6].strip() if len(partes) > 6 else ''
-                    codigo_barras = partes[7].strip() if len(partes) > 7 else None
-                    
-                    # Buscar si existe el producto (por código de barras o nombre+marca+modelo)
-                    producto_existente = None
-                    if codigo_barras:
-                        producto_existente = Producto.objects.filter(codigo_barras=codigo_barras).first()
-                    
-                    if not producto_existente and nombre and marca and modelo:
-                        producto_existente = Producto.objects.filter(
-                            nombre=nombre,
-                            marca=marca,
-                            modelo=modelo
-                        ).first()
-                    
-                    if producto_existente:
-                        # Actualizar producto existente
-                        producto_existente.stock = stock
-                        producto_existente.precio = precio
-                        if descripcion:
-                            producto_existente.descripcion = descripcion
-                        producto_existente.save()
-                        actualizados += 1
-                    else:
-                        # Crear nuevo producto
-                        Producto.objects.create(
-                            nombre=nombre,
-                            marca=marca,
-                            modelo=modelo,
-                            categoria=categoria,
-                            stock=stock,
-                            precio=precio,
-                            descripcion=descripcion,
-                            codigo_barras=codigo_barras if codigo_barras else None
-                        )
-                        creados += 1
-                
-                except Exception as e:
-                    errores.append(f'Línea {i}: {str(e)}')
-            
-            return Response({
-                'creados': creados,
-                'actualizados': actualizados,
-                'errores': errores,
-                'total_procesados': creados + actualizados
-            })
+            # Lectura con el módulo csv por bloques y escrituras en bulk (ver core/importacion.py);
+            # los archivos grandes quedan en disco y se parsean en paralelo por rangos
+            if hasattr(archivo, 'temporary_file_path'):
+                return Response(importar_ruta(archivo.temporary_file_path()))
+            archivo.seek(0)
+            return Response(importar_productos(archivo.file))
         
         except Exception as e:
             return Response(
@@ -385,102 +251,14 @@ class ProductoViewSet(viewsets.ModelViewSet):
         - fecha_desde: fecha inicio (YYYY-MM-DD)
         - fecha_hasta: fecha fin (YYYY-MM-DD)
         - formato: csv (por defecto)
+        - asincrono: 1 para generarlo en segundo plano (responde 202 con la tarea)
         """
-        from django.db.models import Sum, F
-        
-        categoria = request.query_params.get('categoria')
-        fecha_desde = request.query_params.get('fecha_desde')
-        fecha_hasta = request.query_params.get('fecha_hasta')
-        
-        productos = Producto.objects.all()
+        from .exportacion import respuesta_csv, ENCABEZADO_REPORTE, filas_reporte
         
-        if categoria and categoria != 'todas':
-            productos = productos.filter(categoria=categoria)
+        if _en_segundo_plano(request):
+            return _encolar_tarea(request, 'EXPORTAR_REPORTE', parametros=_parametros_consulta(request))
         
-        if fecha_desde:
-            productos = productos.filter(fecha_creacion__gte=fecha_desde)
-        
-        if fecha_hasta:
-            productos = productos.filter(fecha_creacion__lte=fecha_hasta + ' 23:59:59')
-        
-        productos = productos.order_by('categoria', 'nombre')
-        
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="reporte_inventario_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        
-        # Encabezado del reporte
-        writer.writerow(['REPORTE DE INVENTARIO'])
-        writer.writerow(['Generado:', datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
-        writer.writerow(['Categoría:', categoria if categoria and categoria != 'todas' else 'Todas'])
-        writer.writerow([])
-        
-        # Datos de productos
-        writer.writerow(['ID', 'Nombre', 'Marca', 'Modelo', 'Categoría', 'Stock', 'Precio Unit.', 'Valor Total', 'Estado Stock'])
-        
-        total_productos = 0
-        stock_total = 0
-        valor_total = 0
-        tz_chile = pytz.timezone('America/Santiago')
-        
-        for producto in productos:
-            valor_producto = float(producto.precio) * producto.stock
-            
-            # Determinar estado del stock
-            if producto.stock <= 5:
-                estado = 'CRÍTICO'
-            elif producto.stock <= 10:
-                estado = 'BAJO'
-            else:
-                estado = 'NORMAL'
-            
-            writer.writerow([
-                producto.id,
-                producto.nombre,
-                producto.marca,
-                producto.modelo,
-                producto.categoria,
-                producto.stock,
-                f"${producto.precio:,.0f}",
-                f"${valor_producto:,.0f}",
-                estado
-            ])
-            
-            total_productos += 1
-            stock_total += producto.stock
-            valor_total += valor_producto
-        
-        # Resumen
-        writer.writerow([])
-        writer.writerow(['RESUMEN'])
-        writer.writerow(['Total Productos:', total_productos])
-        writer.writerow(['Stock Total:', stock_total])
-        writer.writerow(['Valor Total Inventario:', f"${valor_total:,.0f}"])
-        
-        # Análisis por categoría
-        if not categoria or categoria == 'todas':
-            writer.writerow([])
-            writer.writerow(['ANÁLISIS POR CATEGORÍA'])
-            writer.writerow(['Categoría', 'Cantidad Productos', 'Stock Total', 'Valor Total'])
-            
-            from django.db.models import Count
-            categorias = Producto.objects.values('categoria').annotate(
-                cantidad=Count('id'),
-                stock_total=Sum('stock'),
-                valor=Sum(F('stock') * F('precio'))
-            ).order_by('-valor')
-            
-            for cat in categorias:
-                writer.writerow([
-                    cat['categoria'],
-                    cat['cantidad'],
-                    cat['stock_total'],
-                    f"${cat['valor']:,.0f}"
-                ])
-        
-        return response
+        return respuesta_csv('reporte_inventario', ENCABEZADO_REPORTE, filas_reporte(request.query_params))
     
     @action(detail=True, methods=['post'])
     def registrar_entrada(self, request, pk=None):
@@ -586,6 +364,175 @@ class ProductoViewSet(viewsets.ModelViewSet):
                 {'error': 'Error interno al procesar la salida'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    @action(detail=False, methods=['get'])
+    def valorizacion(self, request):
+        """
+        Valor del inventario al cierre de un día, total y por categoría
+        
+        Parámetros:
+        - fecha: YYYY-MM-DD (por defecto el último día generado)
+        
+        Se lee de las filas diarias que escribe el comando generar_inventario_diario, con
+        el stock al cierre y el precio de ese día (ver core/valorizacion.py)
+        
+        Raises:
+            400: Si la fecha no es válida
+            404: Si no hay inventario generado para esa fecha
+        """
+        from django.utils.dateparse import parse_date
+        from .valorizacion import ultima_fecha, valorizacion
+        
+        valor = request.query_params.get('fecha')
+        try:
+            dia = parse_date(valor) if valor else ultima_fecha()
+        except ValueError:
+            dia = None
+        if valor and dia is None:
+            return Response(
+                {'error': 'Fecha inválida, use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        datos = valorizacion(dia) if dia else None
+        if datos is None:
+            ultima = ultima_fecha()
+            return Response(
+                {
+                    'error': 'No hay inventario diario generado para esa fecha',
+                    'ultima_fecha': ultima.isoformat() if ultima else None,
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(datos)
+    
+    @action(detail=True, methods=['get'])
+    def stock_a_fecha(self, request, pk=None):
+        """
+        Stock del producto a una fecha según el libro de movimientos
+        
+        Parámetros:
+        - fecha: YYYY-MM-DD (al cierre de ese día) o fecha y hora ISO 8601
+        
+        Se calcula desde el último corte de stock anterior a la fecha más los movimientos
+        posteriores a ese corte (ver core/libro_stock.py)
+        
+        Raises:
+            400: Si falta la fecha o no es válida
+        """
+        from .libro_stock import stock_a_fecha
+        
+        producto = self.get_object()
+        fecha = _fecha_consulta(request.query_params.get('fecha'))
+        if fecha is None:
+            return Response(
+                {'error': 'Se requiere una fecha válida (YYYY-MM-DD o ISO 8601)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'producto': producto.pk,
+            'fecha': fecha.isoformat(),
+            'stock': stock_a_fecha(producto.pk, fecha),
+            'stock_actual': producto.stock,
+        })
+    
+    @action(detail=False, methods=['get'], url_path=r'por_codigo/(?P<codigo>[^/]+)')
+    def por_codigo(self, request, codigo=None):
+        """
+        Búsqueda rápida por código de barras para estaciones de escaneo
+        
+        Responde solo id, nombre, codigo_barras, stock y precio desde el índice en memoria
+        del worker (ver core/codigos.py), sin filtros ni serializer completo.
+        
+        Raises:
+            404: Si no hay producto con ese código
+        """
+        from .codigos import buscar_por_codigo
+        
+        datos = buscar_por_codigo(codigo)
+        if datos is None:
+            return Response(
+                {'error': f'No existe producto con código de barras {codigo}'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(datos)
+    
+    @action(detail=False, methods=['post'], url_path=r'por_codigo/(?P<codigo>[^/]+)/movimiento')
+    def movimiento_por_codigo(self, request, codigo=None):
+        """
+        Escanear y mover en una sola petición: resuelve el código y registra el movimiento
+        
+        Args:
+            tipo (str): ENTRADA o SALIDA
+            cantidad (int): Cantidad (por defecto 1)
+            descripcion (str): Descripción del movimiento (por defecto "Escaneo <código>")
+        
+        Returns:
+            MovimientoSerializer con el movimiento creado (incluye el stock resultante)
+        
+        Raises:
+            404: Si no hay producto con ese código
+            400: Si el tipo o la cantidad son inválidos o hay stock insuficiente
+        """
+        from .codigos import buscar_por_codigo
+        
+        tipo = str(request.data.get('tipo', '')).upper()
+        if tipo not in ('ENTRADA', 'SALIDA'):
+            return Response({'error': 'El tipo debe ser ENTRADA o SALIDA'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            cantidad = int(request.data.get('cantidad', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'La cantidad debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+        descripcion = request.data.get('descripcion') or f'Escaneo {codigo}'
+        
+        datos = buscar_por_codigo(codigo)
+        no_encontrado = Response(
+            {'error': f'No existe producto con código de barras {codigo}'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+        if datos is None:
+            return no_encontrado
+        # El stock se modifica con UPDATE atómico (ver core/stock.py): basta con el id del
+        # índice, sin leer la fila antes del movimiento
+        producto = Producto(pk=datos['id'], nombre=datos['nombre'], stock=datos['stock'])
+        
+        usuario_str = str(request.user) if request.user.is_authenticated else 'Anónimo'
+        try:
+            if tipo == 'ENTRADA':
+                movimiento = producto.registrar_entrada(cantidad, descripcion, usuario=usuario_str)
+            else:
+                movimiento = producto.registrar_salida(cantidad, descripcion, usuario=usuario_str)
+        except Producto.DoesNotExist:
+            return no_encontrado
+        except ValueError as e:
+            logger.warning(
+                f"Error al registrar movimiento por código - Código: {codigo}, Tipo: {tipo}, "
+                f"Cantidad: {cantidad}, Error: {str(e)}"
+            )
+            return Response(
+                {
+                    'error': str(e),
+                    'producto': producto.nombre,
+                    'stock_disponible': producto.stock,
+                    'cantidad_solicitada': cantidad
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        logger.info(f"Movimiento por código registrado - Código: {codigo}, Movimiento ID: {movimiento.id}")
+        return Response(MovimientoSerializer(movimiento).data)
+
+
+def _rechazar_en_modo_estricto():
+    """403 al editar o eliminar movimientos cuando el libro de stock es de solo inserción"""
+    from .excepciones import OperacionNoPermitidaError
+    from .libro_stock import modo_estricto
+    
+    if modo_estricto():
+        raise OperacionNoPermitidaError(
+            'Los movimientos no se pueden editar ni eliminar (libro de stock estricto). '
+            'Registre un movimiento o ajuste compensatorio.'
+        )
+
 
 class MovimientoViewSet(viewsets.ModelViewSet):
     """
@@ -597,6 +544,7 @@ class MovimientoViewSet(viewsets.ModelViewSet):
     - GET /api/movimientos/{id}/ - Obtiene un movimiento específico
     - DELETE /api/movimientos/{id}/ - Elimina un movimiento
     - GET /api/movimientos/exportar_csv/ - Exporta movimientos a CSV
+    - POST /api/movimientos/lote/ - Registra muchos movimientos en una transacción
     
     Filtros disponibles:
     - tipo: Filtra por tipo de movimiento (ENTRADA/SALIDA)
@@ -606,6 +554,9 @@ class MovimientoViewSet(viewsets.ModelViewSet):
     
     Ordenamiento (ordering): fecha, cantidad
     
+    Paginación por cursor (opcional): ?paginacion=cursor y luego los enlaces next/previous;
+    ordena por (fecha, id) sin OFFSET ni COUNT(*) (?conteo=exacto|estimado para el total)
+    
     Nota: Se recomienda usar los endpoints registrar_entrada y registrar_salida
     del ProductoViewSet en lugar de crear movimientos directamente.
     """
@@ -616,40 +567,136 @@ class MovimientoViewSet(viewsets.ModelViewSet):
     filterset_class = MovimientoFilter
     ordering_fields = ['fecha', 'cantidad']
     ordering = ['-fecha']
+    campo_cursor = 'fecha'
+    
+    # Los movimientos creados, editados o borrados directamente también se reflejan
+    # en los resúmenes del dashboard, en la misma transacción. Editar o borrar cambia la
+    # historia: los cortes de stock desde ese movimiento dejan de valer y el inventario
+    # diario ya generado se corrige. En modo libro estricto los movimientos solo se
+    # agregan, y aplicados al stock del producto
+    def perform_create(self, serializer):
+        from django.db import transaction
+        from rest_framework.exceptions import ValidationError
+        from .invalidacion import emitir
+        from .libro_stock import modo_estricto
+        from .resumenes import acumular_movimientos
+        
+        if modo_estricto():
+            datos = serializer.validated_data
+            producto = datos['producto']
+            registrar = producto.registrar_entrada if datos['tipo'] == 'ENTRADA' else producto.registrar_salida
+            try:
+                serializer.instance = registrar(
+                    datos['cantidad'],
+                    datos.get('descripcion') or 'Movimiento directo',
+                    usuario=datos.get('usuario') or (
+                        str(self.request.user) if self.request.user.is_authenticated else 'Anónimo'
+                    )
+                )
+            except ValueError as e:
+                raise ValidationError({'cantidad': str(e)})
+            return
+        
+        with transaction.atomic():
+            acumular_movimientos([serializer.save()])
+            emitir('stock')
+    
+    def perform_update(self, serializer):
+        from django.db import transaction
+        from .invalidacion import emitir
+        from .libro_stock import invalidar_cortes
+        from .resumenes import acumular_movimientos
+        from .valorizacion import corregir_inventario_diario
+        
+        _rechazar_en_modo_estricto()
+        with transaction.atomic():
+            anterior = Movimiento.objects.select_for_update().get(pk=serializer.instance.pk)
+            acumular_movimientos([anterior], signo=-1)
+            corregir_inventario_diario(anterior, signo=-1)
+            movimiento = serializer.save()
+            acumular_movimientos([movimiento])
+            corregir_inventario_diario(movimiento, signo=1)
+            invalidar_cortes(anterior.producto_id, anterior.fecha)
+            if movimiento.producto_id != anterior.producto_id:
+                invalidar_cortes(movimiento.producto_id, anterior.fecha)
+            emitir('stock')
+    
+    def perform_destroy(self, instance):
+        from django.db import transaction
+        from .invalidacion import emitir
+        from .libro_stock import invalidar_cortes
+        from .resumenes import acumular_movimientos
+        from .valorizacion import corregir_inventario_diario
+        
+        _rechazar_en_modo_estricto()
+        with transaction.atomic():
+            acumular_movimientos([instance], signo=-1)
+            corregir_inventario_diario(instance, signo=-1)
+            instance.delete()
+            invalidar_cortes(instance.producto_id, instance.fecha)
+            emitir('stock')
     
     @action(detail=False, methods=['get'])
     def exportar_csv(self, request):
         """
         Exporta movimientos a CSV con optimización de queries
         Aplica filtros de la queryset actual para exportar solo datos relevantes
+        Con ?asincrono=1 encola la exportación (con los mismos filtros) y responde 202
         """
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="movimientos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Producto', 'Tipo', 'Cantidad', 'Fecha', 'Descripción'])
-        
-        # Optimización: usar select_related para evitar N+1 queries
-        # Aplicar filtros del request para exportar solo datos filtrados
-        movimientos = self.filter_queryset(self.get_queryset()).select_related('producto').order_by('-fecha')
-        tz_chile = pytz.timezone('America/Santiago')
-        
-        # Usar iterator() para manejar grandes datasets sin cargar todo en memoria
-        for mov in movimientos.iterator(chunk_size=1000):
-            # Convertir UTC a hora local de Chile
-            fecha_local = mov.fecha.astimezone(tz_chile)
-            
-            writer.writerow([
-                mov.id,
-                mov.producto.nombre,
-                mov.tipo,
-                mov.cantidad,
-                fecha_local.strftime('%Y-%m-%d %H:%M:%S'),
-                mov.descripcion
-            ])
-        
-        return response
+        from .exportacion import respuesta_csv, ENCABEZADO_MOVIMIENTOS, filas_movimientos
+        
+        if _en_segundo_plano(request):
+            return _encolar_tarea(request, 'EXPORTAR_MOVIMIENTOS', parametros=_parametros_consulta(request))
+        
+        # Aplicar filtros del request para exportar solo datos filtrados; las filas
+        # se leen con un cursor y se envían en bloques a medida que se generan
+        movimientos = self.filter_queryset(self.get_queryset()).order_by('-fecha')
+        return respuesta_csv('movimientos', ENCABEZADO_MOVIMIENTOS, filas_movimientos(movimientos))
+    
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """
+        Registra muchas entradas y salidas en una sola transacción (todo o nada)
+        
+        Body: {"movimientos": [{"producto": id, "tipo": "ENTRADA"|"SALIDA", "cantidad": n,
+        "descripcion": "..."}, ...]} (o directamente la lista)
+        
+        Returns:
+            201 con los movimientos creados (incluyen el stock resultante)
+        
+        Raises:
+            400: Con `errores` por ítem ({indice, error}) si alguno es inválido; no se aplica nada
+        """
+        from .lotes import LoteInvalido, MAX_ITEMS_LOTE, registrar_lote
+        from .serializers import MovimientoLoteSerializer
+        
+        items = request.data if isinstance(request.data, list) else request.data.get('movimientos')
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Se requiere una lista de movimientos'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > MAX_ITEMS_LOTE:
+            return Response(
+                {'error': f'El lote no puede superar {MAX_ITEMS_LOTE} movimientos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = MovimientoLoteSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            errores = [
+                {'indice': indice, 'error': error} for indice, error in enumerate(serializer.errors) if error
+            ]
+            return Response({'errores': errores}, status=status.HTTP_400_BAD_REQUEST)
+        
+        usuario_str = str(request.user) if request.user.is_authenticated else 'Anónimo'
+        try:
+            movimientos = registrar_lote(serializer.validated_data, usuario=usuario_str)
+        except LoteInvalido as e:
+            return Response({'errores': e.errores}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'movimientos': MovimientoSerializer(movimientos, many=True).data},
+            status=status.HTTP_201_CREATED
+        )
 
 class AlertaViewSet(viewsets.ModelViewSet):
     """
@@ -681,43 +728,98 @@ class AlertaViewSet(viewsets.ModelViewSet):
     ordering_fields = ['fecha_creacion', 'umbral']
     ordering = ['-fecha_creacion']
     
+    # Crear, editar o borrar alertas cambia las alertas activas y los conteos cacheados
+    def perform_create(self, serializer):
+        from .invalidacion import emitir
+        serializer.save()
+        emitir('alertas')
+    
+    def perform_update(self, serializer):
+        from .invalidacion import emitir
+        serializer.save()
+        emitir('alertas')
+    
+    def perform_destroy(self, instance):
+        from .invalidacion import emitir
+        instance.delete()
+        emitir('alertas')
+    
     @action(detail=False, methods=['get'])
     def activas(self, request):
         """
         Obtiene solo las alertas activas con caché de 5 minutos
         para reducir carga en la base de datos
         """
-        # Intentar obtener desde caché
-        cache_key = 'alertas_activas'
-        alertas_cached = cache.get(cache_key)
-        
-        if alertas_cached is not None:
-            return Response(alertas_cached)
-        
-        # Si no está en caché, consultar BD
-        alertas_activas = self.queryset.filter(activa=True)
-        serializer = self.get_serializer(alertas_activas, many=True)
-        
-        response_data = {
-            'total': alertas_activas.count(),
-            'alertas': serializer.data
-        }
-        
-        # Guardar en caché por 5 minutos
-        cache.set(cache_key, response_data, 300)
+        from .invalidacion import CLAVE_ALERTAS_ACTIVAS
+        from .cache_protegido import obtener_o_calcular
+        
+        def calcular():
+            alertas_activas = self.queryset.filter(activa=True)
+            serializer = self.get_serializer(alertas_activas, many=True)
+            return {
+                'total': alertas_activas.count(),
+                'alertas': serializer.data
+            }
         
-        return Response(response_data)
+        # Caché compartido con single-flight (se invalida con los eventos de alertas, stock y productos)
+        return Response(obtener_o_calcular(CLAVE_ALERTAS_ACTIVAS, calcular))
     
     @action(detail=True, methods=['post'])
     def resolver(self, request, pk=None):
         """Marca una alerta como resuelta (desactiva)"""
+        from .invalidacion import emitir
+        
         alerta = self.get_object()
         alerta.activa = False
         alerta.save()
+        emitir('alertas')
         serializer = self.get_serializer(alerta)
         return Response(serializer.data)
 
 
+class TareaViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet de solo lectura para las tareas en segundo plano
+    
+    Endpoints disponibles:
+    - GET /api/tareas/ - Lista las tareas (paginadas, más recientes primero)
+    - GET /api/tareas/{id}/ - Estado y avance de una tarea (para consultar periódicamente)
+    - GET /api/tareas/{id}/descargar/ - Descarga el archivo de resultado de una exportación
+    
+    Las tareas se crean con ?asincrono=1 en importar_csv, exportar_csv y exportar_reporte.
+    
+    Filtros disponibles:
+    - estado: PENDIENTE, EN_PROCESO, COMPLETADA, FALLIDA
+    - tipo: Tipo de tarea
+    """
+    queryset = Tarea.objects.all().order_by('-fecha_creacion')
+    serializer_class = TareaSerializer
+    pagination_class = PaginacionEstandar
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['estado', 'tipo']
+    
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        """Entrega el archivo generado por la tarea (409 si aún no termina)"""
+        tarea = self.get_object()
+        if tarea.estado != 'COMPLETADA':
+            return Response(
+                {'error': f'La tarea no ha terminado (estado: {tarea.estado})', 'progreso': tarea.progreso},
+                status=status.HTTP_409_CONFLICT
+            )
+        if not tarea.archivo_resultado:
+            return Response(
+                {'error': 'La tarea no generó un archivo para descargar'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return FileResponse(
+            tarea.archivo_resultado.open('rb'),
+            as_attachment=True,
+            filename=tarea.archivo_resultado.name.rsplit('/', 1)[-1],
+            content_type='text/csv; charset=utf-8'
+        )
+
+
 # ========== ENDPOINTS DE DESARROLLO - ELIMINAR EN PRODUCCIÓN ==========
 
 from .decoradores import solo_desarrollo, requiere_confirmacion, registrar_operacion
@@ -851,21 +953,24 @@ def analisis_inventario(request):
     # Productos críticos
     criticos = productos.filter(stock__lte=5).values('id', 'nombre', 'stock', 'categoria')
     
-    # Análisis de movimientos recientes (últimos 30 días)
-    hace_30_dias = timezone.now() - timedelta(days=30)
-    movimientos_recientes = Movimiento.objects.filter(fecha__gte=hace_30_dias)
+    # Análisis de movimientos recientes (últimos 30 días) desde el resumen diario
+    hace_30_dias = timezone.localdate() - timedelta(days=30)
+    resumenes_recientes = ResumenDiarioProducto.objects.filter(fecha__gte=hace_30_dias)
     
-    entradas_recientes = movimientos_recientes.filter(tipo='ENTRADA').count()
-    salidas_recientes = movimientos_recientes.filter(tipo='SALIDA').count()
+    totales_recientes = resumenes_recientes.aggregate(
+        entradas=Sum('entradas', default=0),
+        salidas=Sum('salidas', default=0)
+    )
+    entradas_recientes = totales_recientes['entradas']
+    salidas_recientes = totales_recientes['salidas']
     
     # Productos más movidos
-    from django.db.models import Count
-    productos_activos = movimientos_recientes.values('producto__nombre').annotate(
-        total_movimientos=Count('id')
+    from django.db.models import Count, F
+    productos_activos = resumenes_recientes.values('producto__nombre').annotate(
+        total_movimientos=Sum(F('entradas') + F('salidas'))
     ).order_by('-total_movimientos')[:10]
     
     # Análisis de valor
-    from django.db.models import F
     valor_inventario = productos.aggregate(
         total=Sum(F('stock') * F('precio'))
     )['total'] or 0
@@ -878,8 +983,9 @@ def analisis_inventario(request):
     ).order_by('-valor_categoria')
     
     # Productos sin movimientos
+    from django.db.models import Q
     productos_sin_movimiento = productos.filter(
-        movimientos__isnull=True
+        Q(resumen__isnull=True) | Q(resumen__movimientos=0)
     ).count()
     
     # Recomendaciones
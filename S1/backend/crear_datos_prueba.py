@@ -146,6 +146,10 @@ for producto in productos_creados:
 
 print(f"✓ {movimientos_count} movimientos creados")
 
+# Los movimientos se crearon directamente: recalcular los resúmenes del dashboard
+from core.resumenes import reconstruir_resumenes
+reconstruir_resumenes()
+
 print(f"\n✅ Proceso completado!")
 print(f"Total productos: {Producto.objects.count()}")
 print(f"Total movimientos: {Movimiento.objects.count()}")
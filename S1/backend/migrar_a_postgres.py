@@ -157,6 +157,9 @@ def importar_datos_postgres(datos):
             )
         print(f"  ✓ {len(datos['movimientos'])} movimientos importados")
         
+        from core.resumenes import reconstruir_resumenes
+        reconstruir_resumenes()
+        
         # Importar alertas
         print("  Importando alertas...")
         for a_data in datos['alertas']: